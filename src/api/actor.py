@@ -0,0 +1,144 @@
+'''Runs everything that touches a game's state one job at a time, on one task
+(see `Game.actor`).
+
+Websocket receivers, timers and HTTP routes don't change the game directly,
+they hand the actor a job (`call()`, `call_later()`) and the actor runs them
+in the order they arrived. While a job awaits (e.g. sends), no other job can
+change the game under it.'''
+import math
+import time
+import inspect
+import anyio
+
+from typing import Any, Callable, Dict, Tuple
+from anyio.abc import TaskGroup
+from terminal import Terminal
+
+class Job:
+    def __init__(self, fn: Callable, args: Tuple, kwargs: Dict[str, Any]) -> None:
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.queued = time.perf_counter()
+        self.done = anyio.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+class ActorStats:
+    '''How many jobs the actor ran, how long they waited for their turn and
+    how long they kept the game busy.'''
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.started = time.perf_counter()
+        self.jobs = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self.busy = 0.0
+        self.max_queued = 0
+
+    def add(self, wait: float, busy: float, queued: int) -> None:
+        self.jobs += 1
+        self.waited += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.busy += busy
+        self.max_queued = max(self.max_queued, queued)
+
+    def __str__(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        avg_wait = self.waited / self.jobs if self.jobs else 0
+        return (
+            f"{self.jobs} jobs ({self.jobs / elapsed:.1f}/s), waited {avg_wait * 1000:.2f} ms on average "
+            f"(max {self.max_wait * 1000:.2f} ms, {self.max_queued} queued), busy {self.busy / elapsed:.1%} of the time"
+        )
+
+class GameActor:
+    def __init__(self, name: str, t: Terminal) -> None:
+        self.name = name
+        self.t = t
+        self.stats = ActorStats()
+        self.send_jobs, self.receive_jobs = anyio.create_memory_object_stream(math.inf)
+        self.task_group: TaskGroup | None = None
+        self.task_id: int | None = None
+        self.stopped = False
+        # Bumped by every job, the game's state can't have changed if this didn't
+        self.jobs_run = 0
+
+    def running(self) -> bool:
+        return self.task_group is not None and not self.stopped
+
+    def in_actor(self) -> bool:
+        try:
+            return anyio.get_current_task().id == self.task_id
+        except RuntimeError: # not on the event loop
+            return False
+
+    async def run(self) -> None:
+        '''Runs jobs until `stop()`, pending `call_later()`s are dropped.'''
+        self.task_id = anyio.get_current_task().id
+        self.stats.reset()
+        try:
+            async with anyio.create_task_group() as task_group:
+                self.task_group = task_group
+                async with self.receive_jobs:
+                    async for job in self.receive_jobs:
+                        await self.run_job(job)
+                task_group.cancel_scope.cancel()
+        finally:
+            self.task_group = None
+            self.task_id = None
+
+    async def run_job(self, job: Job) -> None:
+        start = time.perf_counter()
+        self.jobs_run += 1
+        try:
+            job.result = job.fn(*job.args, **job.kwargs)
+            if inspect.isawaitable(job.result):
+                job.result = await job.result
+        except Exception as e:
+            job.error = e
+        finally:
+            self.stats.add(start - job.queued, time.perf_counter() - start, self.receive_jobs.statistics().current_buffer_used)
+            job.done.set()
+
+    async def call(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        '''Runs `fn(*args, **kwargs)` (sync or async) on the actor and returns its
+        result. Runs it right away when called from a job or when the actor
+        isn't running (scripts, replays, stopped games).'''
+        if self.in_actor() or not self.running():
+            result = fn(*args, **kwargs)
+            return await result if inspect.isawaitable(result) else result
+        job = Job(fn, args, kwargs)
+        self.send_jobs.send_nowait(job)
+        # The caller (e.g. a closing connection) may be cancelled, the job isn't
+        await job.done.wait()
+        if job.error:
+            raise job.error
+        return job.result
+
+    def call_later(self, delay: float, fn: Callable, *args: Any, sleep: Callable[[float], Any] = anyio.sleep) -> anyio.CancelScope:
+        '''Runs `fn(*args)` on the actor after `delay` seconds (slept with
+        `sleep`) without holding it up meanwhile, the actor must be running.
+        Cancelling the returned scope drops the call, even if it's already
+        queued. Errors are logged.'''
+        scope = anyio.CancelScope()
+        def run() -> Any:
+            if not scope.cancel_called:
+                return fn(*args)
+        async def later() -> None:
+            with scope:
+                await sleep(delay)
+            if scope.cancel_called:
+                return
+            try:
+                await self.call(run)
+            except Exception as e:
+                self.t.error(f"{self.name}: {getattr(fn, '__name__', fn)} failed: {e!r}")
+        self.task_group.start_soon(later)
+        return scope
+
+    def stop(self) -> None:
+        '''Lets the actor finish the jobs it has and exit.'''
+        self.stopped = True
+        self.send_jobs.close()
@@ -0,0 +1,103 @@
+import mmap
+import hashlib
+import tempfile
+import threading
+
+HANDLE_PREFIX = "arena:"
+INITIAL_SIZE = 16 * 1024 * 1024 # bytes
+
+def is_handle(v: str | None) -> bool:
+    return isinstance(v, str) and v.startswith(HANDLE_PREFIX)
+
+class ImageArena:
+    '''Per-process store for image data (data URIs) backed by a memory-mapped
+    temporary file.
+
+    Models keep a small handle (`arena:<hash>`) instead of the full data URI
+    and page the data back in with `get()`/`resolve()` when it is needed
+    (e.g. serializing an image for a client). The OS is free to evict the
+    mapped pages, so cold images (finished rounds) stop counting against
+    resident memory. Identical images share one entry, entries are reference
+    counted and the file is compacted once most of it is garbage.'''
+
+    def __init__(self, initial_size: int = INITIAL_SIZE) -> None:
+        self._lock = threading.Lock()
+        self._file = tempfile.TemporaryFile()
+        self._size = initial_size
+        self._file.truncate(self._size)
+        self._mm = mmap.mmap(self._file.fileno(), self._size)
+        self._end = 0
+        self._live = 0
+        # hash -> (offset, length, refs)
+        self._index: dict[str, list[int]] = {}
+
+    @staticmethod
+    def handle_of(data: str) -> str:
+        '''Returns the handle `data` has (or would have) in the arena.'''
+        if is_handle(data):
+            return data
+        return HANDLE_PREFIX + hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _ensure_capacity(self, n: int) -> None:
+        if self._end + n <= self._size:
+            return
+        while self._end + n > self._size:
+            self._size *= 2
+        self._mm.resize(self._size)
+
+    def put(self, data: str) -> str:
+        '''Moves `data` into the arena and returns its handle.'''
+        if is_handle(data):
+            return data
+        raw = data.encode("utf-8")
+        handle = HANDLE_PREFIX + hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            if handle in self._index:
+                self._index[handle][2] += 1
+                return handle
+            self._ensure_capacity(len(raw))
+            self._mm[self._end:self._end + len(raw)] = raw
+            self._index[handle] = [self._end, len(raw), 1]
+            self._end += len(raw)
+            self._live += len(raw)
+        return handle
+
+    def get(self, handle: str) -> str:
+        with self._lock:
+            offset, length, _ = self._index[handle]
+            return self._mm[offset:offset + length].decode("utf-8")
+
+    def resolve(self, v: str | None) -> str | None:
+        '''Returns the data behind `v` if it is a handle, otherwise `v`.'''
+        if is_handle(v):
+            return self.get(v)
+        return v
+
+    def release(self, handle: str) -> None:
+        '''Drops a reference taken by `put()`.'''
+        with self._lock:
+            entry = self._index.get(handle)
+            if not entry:
+                return
+            entry[2] -= 1
+            if entry[2] <= 0:
+                del self._index[handle]
+                self._live -= entry[1]
+            if self._end > INITIAL_SIZE and self._live < self._end // 2:
+                self._compact()
+
+    def _compact(self) -> None:
+        end = 0
+        for entry in sorted(self._index.values(), key=lambda e: e[0]):
+            offset, length, _ = entry
+            if offset != end:
+                self._mm.move(end, offset, length)
+                entry[0] = end
+            end += length
+        self._end = end
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"images": len(self._index), "live_bytes": self._live, "used_bytes": self._end, "size": self._size}
+
+image_arena = ImageArena()
@@ -0,0 +1,41 @@
+'''Immutable static assets served by the API (see the `/game/static` route).
+
+Assets are compressed once when registered and are linked to with their
+digest in the URL, so clients can cache them forever.'''
+import gzip
+import base64
+import hashlib
+
+from typing import Callable, Dict
+
+class StaticAsset:
+    def __init__(self, data: bytes, media_type: str) -> None:
+        self.data = data
+        self.media_type = media_type
+        self.etag = hashlib.sha256(data).hexdigest()[:16]
+        gzipped = gzip.compress(data, compresslevel=9)
+        # Already compressed formats (PNG, WebP) rarely get any smaller
+        self.gzipped = gzipped if len(gzipped) < len(data) else None
+
+    @classmethod
+    def from_data_uri(cls, dUri: str) -> "StaticAsset":
+        header, _, data = dUri.partition(",")
+        media_type = header.removeprefix("data:").split(";")[0]
+        return cls(base64.b64decode(data), media_type)
+
+static_assets: Dict[str, StaticAsset] = {}
+# Called with (name, asset) when an asset is registered and (name, None)
+# when it's unregistered, game workers forward their assets to the API with it
+asset_listener: Callable[[str, StaticAsset | None], None] | None = None
+
+def register_asset(name: str, asset: StaticAsset) -> str:
+    '''Registers `asset` under `name` and returns its path (relative to the API).'''
+    static_assets[name] = asset
+    if asset_listener:
+        asset_listener(name, asset)
+    return f"/game/static/{name}?v={asset.etag}"
+
+def unregister_asset(name: str) -> None:
+    static_assets.pop(name, None)
+    if asset_listener:
+        asset_listener(name, None)
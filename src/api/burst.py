@@ -0,0 +1,111 @@
+'''Measures how a game handles bursts of inbound messages, with and without
+the mailbox (see `Game.enqueue_message()`):
+
+    python burst.py [players] [mailbox tick]
+
+Every player sends a message at the same moment (a chat flurry, everyone
+voting on a poll, everyone submitting their drawing as the timer runs out),
+prints how long the game took to get through each burst, what it sent and
+the longest a message waited for the game's actor (see `actor.py`).
+'''
+import sys
+import time
+import anyio
+
+from typing import Any, Dict, List, Tuple
+from anyio.streams.memory import MemoryObjectReceiveStream
+from terminal import Terminal, TerminalOpts
+from broadcaster import Broadcast
+from player import create_player
+from game import Game, MessageSchema
+from codec import default_codec
+
+# 1x1 PNG, image size isn't what's being measured here
+PNG = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+
+class BurstWebSocket:
+    def __init__(self, inbox: MemoryObjectReceiveStream) -> None:
+        self.inbox = inbox
+        self.sent = 0
+        self.last_sent = 0.0
+
+    async def receive(self) -> Dict[str, Any]:
+        try:
+            return {"type": "websocket.receive", "text": await self.inbox.receive()}
+        except anyio.EndOfStream:
+            return {"type": "websocket.disconnect"}
+
+    async def send_text(self, data: str) -> None:
+        self.sent += 1
+        self.last_sent = time.perf_counter()
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.send_text("")
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        ...
+
+def create_game(players: int, tick: float) -> Game:
+    from main import game_name_map, GameName
+
+    t = Terminal(TerminalOpts(can_log=False, can_info=False, can_debug=False, can_warn=False))
+    g = game_name_map[GameName.CHAMPDUP](Broadcast("memory://"), t)
+    g.timers_armed = False
+    g.timer.armed = False
+    g.config.public = {**g.config.public, "max_players": players}
+    g.config.private = {**g.config.private, "mailbox_tick": tick, "rate_limits": {}}
+    g.max_players = players
+    for i in range(players):
+        g.join(create_player(f"player{i}", 0, "#fff"))
+    return g
+
+async def burst(g: Game, messages: Dict[str | int, List[Tuple[str, Any]]]) -> Tuple[float, int, float]:
+    '''Connects everyone, has them send their `messages` at once and waits
+    until the game is done with them. Returns (seconds, frames sent, longest
+    wait for the actor in seconds).'''
+    sockets: Dict[str | int, BurstWebSocket] = {}
+    inboxes = {}
+    for username in [0, *g.players]:
+        send, receive = anyio.create_memory_object_stream(100)
+        sockets[username] = BurstWebSocket(receive)
+        inboxes[username] = send
+    g.ws_map.update(sockets)
+    g.actor.stats.reset()
+    start = time.perf_counter()
+    async with anyio.create_task_group() as tg:
+        for username, ws in sockets.items():
+            tg.start_soon(g.ws_receiver, ws, str(username), username)
+        for username, msgs in messages.items():
+            for type, value in msgs:
+                await inboxes[username].send(default_codec.encode(MessageSchema(type=type, value=value, author=0)))
+        for inbox in inboxes.values():
+            await inbox.aclose()
+    g.ws_map.clear()
+    end = max([start, *(ws.last_sent for ws in sockets.values())])
+    return end - start, sum(ws.sent for ws in sockets.values()), g.actor.stats.max_wait
+
+async def run(players: int, tick: float) -> List[Tuple[str, float, int, float]]:
+    g = create_game(players, tick)
+    rows = []
+    usernames = list(g.players)
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(g.actor.run)
+        await g.actor.call(g.process_message, None, MessageSchema(type="STATUS", value="RUNNING", author=0), 0)
+        rows.append(("chat", *await burst(g, {u: [("CHAT", f"gg {u}")] for u in usernames})))
+        await g.actor.call(g.process_message, None, MessageSchema(type="CHAT", value="/poll Was that fun?", author=0), 0)
+        rows.append(("poll votes", *await burst(g, {u: [("POLL_VOTE", "yes" if i % 2 else "no")] for i, u in enumerate(usernames)})))
+        rows.append(("submissions", *await burst(g, {u: [("IMAGE", {"dUri": PNG, "title": u})] for u in usernames})))
+        g.actor.stop()
+    return rows
+
+async def main() -> None:
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    tick = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    results = {"no mailbox": await run(players, 0), f"{tick * 1000:g} ms ticks": await run(players, tick)}
+    print(f"{players} players")
+    print(f"{'burst':<14}" + "".join(f"{name + ' ms':>22}{'frames':>8}{'wait ms':>9}" for name in results))
+    for i, (name, *_) in enumerate(next(iter(results.values()))):
+        print(f"{name:<14}" + "".join(f"{rows[i][1] * 1000:>22.1f}{rows[i][2]:>8}{rows[i][3] * 1000:>9.1f}" for rows in results.values()))
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -0,0 +1,49 @@
+'''Reassembles messages that clients send in pieces (`CHUNK` messages, see
+`Game.ws_receiver()`), so large drawings don't need one huge frame.
+
+A chunked message is an encoded frame split into `{"data": <piece>, "last":
+<bool>}` values, sent in order. Pieces are text for JSON and bytes for
+MessagePack clients.'''
+from typing import List
+from typing_extensions import TypedDict
+from result import Result
+
+class Chunk(TypedDict):
+    data: str | bytes
+    last: bool
+
+class ChunkBuffer:
+    '''A connection's partially received message, bounded by `max_size`.'''
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.pieces: List[str | bytes] = []
+        self.size = 0
+
+    def clear(self) -> None:
+        self.pieces = []
+        self.size = 0
+
+    def add(self, chunk: Chunk) -> Result[str | bytes | None]:
+        '''Buffers a chunk, the result's data is the whole message once its
+        last chunk arrived (`None` until then). Chunks that would make the
+        message too large fail and discard it.'''
+        r = Result()
+        data = chunk["data"]
+        if self.pieces and type(data) != type(self.pieces[0]):
+            self.clear()
+            r.Fail("Chunks of a message must all be text or all be binary.")
+            return r
+        if self.size + len(data) > self.max_size:
+            size = self.size + len(data)
+            self.clear()
+            r.Fail(f"Chunked message is too large ({size} > {self.max_size}).")
+            return r
+        self.pieces.append(data)
+        self.size += len(data)
+        if not chunk["last"]:
+            r.Ok(None)
+            return r
+        message = "".join(self.pieces) if type(data) == str else b"".join(self.pieces)
+        self.clear()
+        r.Ok(message)
+        return r
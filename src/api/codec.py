@@ -0,0 +1,146 @@
+'''Encodes outbound messages and decodes inbound frames for `Game`.
+
+`OrjsonCodec` is used when orjson is installed, otherwise games fall back to
+the stdlib decoder. Compare pydantic/orjson encoding and stdlib/orjson
+decoding on a recorded game:
+
+    python codec.py journals/<journal dir> [repeat]
+'''
+import sys
+import json
+import base64
+import time
+import anyio
+
+from typing import Any, Callable, Dict, List, Tuple
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK = "msgpack" # subprotocol/`?protocol=` clients opt into MessagePack with
+DATA_URI_EXT = 1 # MessagePack extension type for images
+
+class Codec:
+    '''pydantic's serializer and the stdlib decoder.'''
+    name = "json"
+    binary = False # whether frames are sent as binary (`bytes`) or text
+
+    def encode(self, msg: BaseModel, context: Dict[str, Any] | None = None) -> str:
+        '''`context` is passed to pydantic (see `Game.get_serialization_context()`).'''
+        return msg.model_dump_json(context=context)
+
+    def decode(self, data: str | bytes) -> Any:
+        return json.loads(data)
+
+class OrjsonCodec(Codec):
+    '''Decodes with orjson, 2-3x faster than the stdlib on our frames.
+
+    Encoding stays with pydantic: its serializer handles our models and sets
+    natively. Dumping models and handing them to orjson only pulled ahead on
+    some large frames and was ~2x slower on the small, high rate ones.'''
+    name = "orjson"
+
+    def decode(self, data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+class MsgpackCodec(Codec):
+    '''MessagePack framing for clients that opt in. Base64 data URIs (images)
+    are sent as raw bytes in an extension (type `DATA_URI_EXT`, data is
+    `<mime type>\\0<bytes>`) and turned back into data URIs when received.'''
+    name = MSGPACK
+    binary = True
+
+    @staticmethod
+    def _pack_data_uris(obj: Any) -> Any:
+        if isinstance(obj, str):
+            if obj.startswith("data:"):
+                header, _, data = obj.partition(",")
+                if header.endswith(";base64"):
+                    mime = header.removeprefix("data:").removesuffix(";base64")
+                    return msgpack.ExtType(DATA_URI_EXT, mime.encode("utf-8") + b"\0" + base64.b64decode(data))
+            return obj
+        if isinstance(obj, dict):
+            return {k: MsgpackCodec._pack_data_uris(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [MsgpackCodec._pack_data_uris(v) for v in obj]
+        return obj
+
+    @staticmethod
+    def _unpack_data_uri(code: int, data: bytes) -> Any:
+        if code != DATA_URI_EXT:
+            return msgpack.ExtType(code, data)
+        mime, _, raw = data.partition(b"\0")
+        return f"data:{mime.decode('utf-8')};base64,{base64.b64encode(raw).decode('utf-8')}"
+
+    def encode(self, msg: BaseModel, context: Dict[str, Any] | None = None) -> bytes:
+        return msgpack.packb(self._pack_data_uris(msg.model_dump(mode="json", context=context)))
+
+    def decode(self, data: str | bytes) -> Any:
+        if isinstance(data, str):
+            return default_codec.decode(data)
+        return msgpack.unpackb(data, ext_hook=self._unpack_data_uri)
+
+default_codec: Codec = OrjsonCodec() if orjson else Codec()
+
+def negotiate_codec(subprotocols: List[str], protocol: str | None) -> Codec | None:
+    '''Returns the codec a client asked for (via its websocket subprotocols or
+    the `protocol` query parameter), `None` means the game's default.'''
+    if msgpack and (MSGPACK in subprotocols or protocol == MSGPACK):
+        return MsgpackCodec()
+    return None
+
+async def main() -> None:
+    from wsstats import replay_connected
+
+    # type -> every (message, context) encoded while replaying
+    messages: Dict[str, List[Tuple[BaseModel, Dict[str, Any] | None]]] = {}
+    class RecordingCodec(Codec):
+        def encode(self, msg: BaseModel, context: Dict[str, Any] | None = None) -> str:
+            messages.setdefault(getattr(msg.type, "value", msg.type), []).append((msg, context))
+            return super().encode(msg, context)
+
+    await replay_connected(sys.argv[1], RecordingCodec())
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    def orjson_encode(msg: BaseModel, context: Dict[str, Any] | None) -> bytes:
+        def default(obj: Any) -> Any:
+            if isinstance(obj, BaseModel):
+                return obj.model_dump(mode="json", context=context)
+            if isinstance(obj, (set, frozenset)):
+                return list(obj)
+            raise TypeError
+        return orjson.dumps(dict(msg), default=default, option=orjson.OPT_NON_STR_KEYS)
+
+    def per_msg(f: Callable[[], Any], n: int) -> float:
+        '''Microseconds per message.'''
+        start = time.perf_counter()
+        for _ in range(repeat):
+            f()
+        return (time.perf_counter() - start) / repeat / n * 1e6
+
+    codec = Codec()
+    columns = ["pydantic enc us", "json dec us"]
+    if orjson:
+        columns += ["orjson enc us", "orjson dec us"]
+    print(f"{'type':<16}{'msgs':>6}{'avg KB':>8}" + "".join(f"{c:>16}" for c in columns))
+    for type, msgs in sorted(messages.items(), key=lambda kv: -len(kv[1])):
+        frames = [codec.encode(msg, context) for msg, context in msgs]
+        row = [
+            per_msg(lambda: [codec.encode(msg, context) for msg, context in msgs], len(msgs)),
+            per_msg(lambda: [json.loads(frame) for frame in frames], len(msgs)),
+        ]
+        if orjson:
+            row += [
+                per_msg(lambda: [orjson_encode(msg, context) for msg, context in msgs], len(msgs)),
+                per_msg(lambda: [orjson.loads(frame) for frame in frames], len(msgs)),
+            ]
+        print(f"{type:<16}{len(msgs):>6}{sum(map(len, frames)) / len(frames) / 1024:>8.1f}" + "".join(f"{v:>16.1f}" for v in row))
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -4,6 +4,21 @@ from pydantic import BaseModel
 class Config(BaseModel):
     simulate_http_lag: bool = False # Only effective if in DEBUG mode
     simulate_ws_lag: bool = False # Only effective if in DEBUG mode
+    snapshots_enabled: bool = True # Restore live games after a restart
+    snapshot_interval: float = 2 # seconds
+    journals_enabled: bool = True # Journal every game for crash recovery/replays
+    journal_fsync_interval: float = 1 # seconds
+    image_variants_enabled: bool = True # Send phones/the host downsized drawings
+    image_variant_workers: int = 2 # processes rendering image variants
+    ws_per_message_deflate: bool = True # Negotiate permessage-deflate with clients (python main.py/gunicorn_worker.py)
+    ws_max_message_size: int = 4 * 1024 * 1024 # bytes, larger inbound frames are refused
+    ws_max_chunked_message_size: int = 16 * 1024 * 1024 # bytes, see chunks.py
+    game_workers: int = 0 # processes hosting games, 0 hosts them in the API process (see workers.py)
+    game_worker_shm_size: int = 64 * 1024 * 1024 # bytes of shared memory per worker and direction
+
+    def uvicorn_kwargs(self) -> dict:
+        '''Server settings uvicorn has to be started with.'''
+        return {"ws_per_message_deflate": self.ws_per_message_deflate, "ws_max_size": self.ws_max_message_size}
 
     def save_config(self, config_path: str) -> None:
         with open(config_path, mode="w") as f:
@@ -1,16 +1,24 @@
 import threading
+import datetime
 import hashlib
 import random
 import string
 import anyio
+import anyio.to_thread
+import anyio.from_thread
+import anyio.lowlevel
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+import heapq
+import inspect
 import json
+import time
 
-from typing import TYPE_CHECKING, Dict, List, Any, Union, TypeVar, Literal, Generic, Callable, Tuple, Coroutine
+from typing import TYPE_CHECKING, Dict, List, Any, Union, TypeVar, Literal, Generic, Callable, Tuple, Coroutine, Iterable, Type
 from terminal import Terminal
 from player import Player, create_player, ConnectionStatus, get_author_as_host
 from result import Result
 from utils import gen_rand_hex_color, gen_rand_str
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from enum import Enum
 from metaenum import MetaEnum
 from broadcaster import Broadcast
@@ -19,13 +27,31 @@ from starlette.websockets import WebSocketState
 from colorama import init, Fore
 from globals import SIMULATE_LAG_MIN, SIMULATE_LAG_MAX, DEBUG, CONFIG_PATH
 from config import Config
+from journal import Journal
+from codec import Codec, default_codec
+from ratelimit import RateLimiter, RateLimits, ANY_FRAME
+from chunks import Chunk, ChunkBuffer
+from actor import GameActor
 
 init(autoreset=True)
 global_config = Config.load_config(CONFIG_PATH)
 
 HOST_USERNAME = 0
+# Frames smaller than this aren't worth deflating, see `Game.is_compressible()`
+COMPRESSIBLE_MIN_SIZE = 512 # bytes
+# seconds between the broadcasts a single message produces
+BROADCAST_SPACING = 0.05
+# Frames queued for an audience member, more are dropped until it catches up
+AUDIENCE_QUEUE_SIZE = 32
+# `tick_outbox` target of frames for the whole audience
+TO_AUDIENCE = "audience"
 
 Author = Union[Player, Literal[0]]
+
+# Groups every game keeps up to date (see `Game.send_to_group()`)
+GROUP_ALL = "all"
+GROUP_HOST = "host"
+GROUP_PLAYERS = "players"
 PublicConfig = Dict[str, Any]
 PrivateConfig = Dict[str, Any]
 
@@ -45,6 +71,106 @@ def create_threaded_async_action(
 
     return wrapper
 
+class Clock:
+    '''Source of time for games.
+
+    `time()` returns epoch seconds anchored to the monotonic clock at startup,
+    so deadlines never jump with wall-clock adjustments but can still be
+    serialized (see `to_iso`) and compared across restarts.'''
+
+    def __init__(self) -> None:
+        self._wall0 = time.time()
+        self._mono0 = time.monotonic()
+
+    def time(self) -> float:
+        return self._wall0 + (time.monotonic() - self._mono0)
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.time())
+
+    def deadline(self, seconds: float) -> float:
+        '''Returns the timestamp `seconds` from now.'''
+        return self.time() + seconds
+
+    def remaining(self, deadline: float) -> float:
+        return max(0.0, deadline - self.time())
+
+    async def sleep(self, seconds: float) -> None:
+        await anyio.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    '''A `Clock` that only moves when told to. Used by tests and benchmarks
+    to run whole games without actually waiting on timers.
+
+    Each sleeper waits on an `anyio.Event` of its own event loop, which
+    `advance()` sets once the sleeper's deadline has been reached. Sleepers
+    may live on other threads (timers run their own event loops), those are
+    woken through their loop.'''
+
+    def __init__(self, start: datetime.datetime | None = None) -> None:
+        self._lock = threading.Lock()
+        self._now = (start or datetime.datetime(2000, 1, 1)).timestamp()
+        # (deadline, counter, (event, its loop's token, its loop's thread id))
+        self._sleepers: list[tuple[float, int, tuple[anyio.Event, Any, int]]] = []
+        self._ctr = 0
+
+    def time(self) -> float:
+        with self._lock:
+            return self._now
+
+    def advance(self, seconds: float) -> None:
+        '''Moves virtual time forward, waking any sleeper whose deadline passed.'''
+        with self._lock:
+            self._now += max(0.0, seconds)
+            due = []
+            while self._sleepers and self._sleepers[0][0] <= self._now:
+                due.append(heapq.heappop(self._sleepers)[2])
+        # Outside the lock, a sleeper's loop may be waiting on it
+        for woken, token, thread in due:
+            if thread == threading.get_ident():
+                woken.set()
+                continue
+            try:
+                anyio.from_thread.run_sync(woken.set, token=token)
+            except RuntimeError: # its loop is gone
+                pass
+
+    def advance_to_next_deadline(self) -> bool:
+        '''Jumps to the earliest pending sleeper deadline. Returns `False` if
+        nothing is sleeping.'''
+        with self._lock:
+            if not self._sleepers:
+                return False
+            target = self._sleepers[0][0]
+        self.advance(target - self.time())
+        return True
+
+    async def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            await anyio.sleep(0)
+            return
+        woken = anyio.Event()
+        with self._lock:
+            self._ctr += 1
+            id = self._ctr
+            heapq.heappush(self._sleepers, (self._now + seconds, id, (woken, anyio.lowlevel.current_token(), threading.get_ident())))
+        try:
+            await woken.wait()
+        finally:
+            if not woken.is_set(): # cancelled, forget the sleeper
+                with self._lock:
+                    self._sleepers = [s for s in self._sleepers if s[1] != id]
+                    heapq.heapify(self._sleepers)
+
+def to_iso(timestamp: float | None) -> str | None:
+    '''Serializes a `Clock` timestamp for the frontend.'''
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp).isoformat()
+
+default_clock = Clock()
+
 class GameStatus(str, Enum, metaclass=MetaEnum):
     WAITING = "WAITING"
     RUNNING = "RUNNING"
@@ -61,6 +187,13 @@ class ConfigField(BaseModel):
     type: ConfigFieldType
     value: Union[int, str, list]
 
+CONFIG_FIELD_TYPES = {
+    bool: ConfigFieldType.BOOL,
+    int: ConfigFieldType.NUMBER,
+    str: ConfigFieldType.STRING,
+    list: ConfigFieldType.SELECT,
+}
+
 
 class GenericGameConfig(BaseModel):
     '''A generic game config.
@@ -73,19 +206,13 @@ class GenericGameConfig(BaseModel):
 
     def transpile_public_fields(self) -> list[ConfigField]:
         '''Converts all public fields to `ConfigField`s, which
-        help the frontend determine what the type of a field is.'''
-        type_fieldtype_map = {
-            bool: ConfigFieldType.BOOL,
-            int: ConfigFieldType.NUMBER,
-            str: ConfigFieldType.STRING,
-            list: ConfigFieldType.SELECT,
-        }
+        help the frontend determine what the type of a field is.
+        Fields of other types are left out.'''
         fields: list[ConfigField] = []
         for k, v in self.public.items():
-            k: str = k # type hints don't wanna work!
-            for fieldtype in type_fieldtype_map:
-                if type(v) == fieldtype:
-                    fields.append(ConfigField(name=k, type=type_fieldtype_map[fieldtype], value=v))
+            fieldtype = CONFIG_FIELD_TYPES.get(type(v))
+            if fieldtype:
+                fields.append(ConfigField(name=k, type=fieldtype, value=v))
         return fields
 
 
@@ -97,6 +224,7 @@ class DefaultMessageTypes(str, Enum, metaclass=MetaEnum):
     STATE = "STATE",
     STATUS = "STATUS",
     PING = "PING",
+    CHUNK = "CHUNK" # a piece of a larger message, see chunks.py
 
 T = TypeVar("T")
 
@@ -146,21 +274,81 @@ class Game(Generic[T]):
     
     All derivative classes must override `get_game_state()`,
     `process_host_message()`, and `process_plyr_message()`.'''
-    def __init__(self, b: Broadcast, t: Terminal) -> None:
+    # Message types that are never worth compressing (tiny and/or high rate),
+    # only used to measure traffic (see `is_compressible()`)
+    incompressible_types: set[str] = {
+        DefaultMessageTypes.PING,
+        DefaultMessageTypes.CONNECT,
+        DefaultMessageTypes.DISCONNECT,
+        DefaultMessageTypes.HOST_CONNECT,
+        DefaultMessageTypes.HOST_DISCONNECT,
+    }
+    # Inbound values of these types are validated before they're processed
+    # (see `parse_message()`), values of other types are passed on as is.
+    value_validators: Dict[str, TypeAdapter] = {
+        DefaultMessageTypes.STATUS: TypeAdapter(str),
+        DefaultMessageTypes.CHUNK: TypeAdapter(Chunk),
+    }
+    # Published messages of these types are also sent to the audience (see `watch()`)
+    audience_types: set[str] = {
+        DefaultMessageTypes.STATUS,
+    }
+    # Broadcasts of these types carry the whole of some state, so when the
+    # mailbox is on only the last one of a tick is sent, if the game is still
+    # in the same phase (see `process_tick()`)
+    coalesced_types: set[str] = set()
+    # A new game's `config`, its defaults are what the lobby is shown (see
+    # `public_config_fields()`)
+    config_type: Type[GenericGameConfig] = GenericGameConfig
+
+    def __init__(self, b: Broadcast, t: Terminal, clock: Clock = default_clock, seed: int | None = None) -> None:
         self.t = t
+        self.clock = clock
+        # Games draw all randomness from `rng` so journals replay deterministically
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
+        self.journal: Journal | None = None
+        # Set to False while replaying a journal, timer fires are replayed instead
+        self.timers_armed = True
         self.log = self.t.log
         self.debug = self.t.debug
         self.info = self.t.info
         self.warn = self.t.warn
         self.error = self.t.error
         self._gen_id()
+        # Everything that changes the game runs on its actor, see `actor.py`
+        self.actor = GameActor(f"Game {self.id}", t)
         self.players: Dict[str, Player] = {}
-        self.config: GenericGameConfig = GenericGameConfig()
+        self.config: GenericGameConfig = self.config_type()
         self.max_players = -1
         self.status = GameStatus.WAITING
         self.host_connected = False
         self.broadcast = b
         self.ws_map: dict[str | int, WebSocket] = {}
+        self.codec: Codec = default_codec
+        # id(ws) -> codec, for connections that negotiated their own
+        self.ws_codecs: dict[int, Codec] = {}
+        # message type -> [frames, bytes, bytes worth compressing]
+        self.send_stats: dict[str, list[int]] = {}
+        # message type -> inbound messages dropped by the rate limiter
+        self.drop_stats: dict[str, int] = {}
+        # username -> bytes of partially received (chunked) messages
+        self.inbound_buffered: dict[str | int, int] = {}
+        # audience member id -> websocket, see `watch()`
+        self.audience: dict[str, WebSocket] = {}
+        # audience member id -> frames waiting for its sender, see `publish_to_audience()`
+        self.audience_queues: dict[str, MemoryObjectSendStream] = {}
+        self.audience_dropped = 0 # frames dropped for slow audience members
+        self.reset_groups()
+        # Inbound messages waiting for the next tick, see `enqueue_message()`
+        self.mailbox: list[Tuple[WebSocket, MessageSchema, str | int, Callable]] = []
+        self.mailbox_draining = False
+        # Actions deferred to the end of the tick being processed (`None` outside of ticks)
+        self.tick_actions: dict[Callable[[], Coroutine], None] | None = None
+        # Frames of the tick being processed in the order they were produced:
+        # (phase, ws, msg, encoded), broadcasts have no ws and frames for the
+        # audience go to `TO_AUDIENCE` (`None` outside of ticks)
+        self.tick_outbox: list[Tuple[Any, WebSocket | str | None, MessageSchema, Dict[Any, str] | None]] | None = None
     
     def get_game_state(self, username: str | int) -> Dict[str, Any]:
         """OVERRIDE! Retrieves the current game state which is sent to
@@ -186,6 +374,15 @@ class Game(Generic[T]):
     
     def get_player_list(self) -> List[Player]:
         return list(self.players.values())
+
+    def get_leaderboard(self) -> List[Player]:
+        return sorted(self.players.values(), key=lambda x: x.points, reverse=True)
+
+    def get_status(self) -> GameStatus:
+        return self.status
+
+    def get_public_config(self) -> PublicConfig:
+        return self.config.public
     
     def _gen_id(self) -> None:
         id = gen_rand_str(6, string.ascii_uppercase)
@@ -208,6 +405,9 @@ class Game(Generic[T]):
             r.Fail("Username taken")
             return r
         self.players[p.username] = p
+        self.add_to_group(GROUP_ALL, p.username)
+        self.add_to_group(GROUP_PLAYERS, p.username)
+        self.record("join", player=p.model_dump())
         r.Ok(p)
         return r
     
@@ -218,18 +418,66 @@ class Game(Generic[T]):
             return r
         p = self.players[u]
         del self.players[u]
+        for group in self.memberships.pop(u, set()):
+            self.groups.get(group, set()).discard(u)
+        self.record("leave", username=u)
         r.Ok(p)
         return r
     
+    def reset_groups(self) -> None:
+        # group name -> usernames, and username -> the groups they're in
+        self.groups: dict[str, set[str | int]] = {}
+        self.memberships: dict[str | int, set[str]] = {}
+        self.add_to_group(GROUP_ALL, HOST_USERNAME)
+        self.add_to_group(GROUP_HOST, HOST_USERNAME)
+
+    def add_to_group(self, group: str, username: str | int) -> None:
+        self.groups.setdefault(group, set()).add(username)
+        self.memberships.setdefault(username, set()).add(group)
+
+    def remove_from_group(self, group: str, username: str | int) -> None:
+        self.groups.get(group, set()).discard(username)
+        self.memberships.get(username, set()).discard(group)
+
+    def set_group(self, group: str, usernames: Iterable[str | int]) -> None:
+        '''Replaces the group's members.'''
+        self.clear_group(group)
+        for username in usernames:
+            self.add_to_group(group, username)
+
+    def clear_group(self, group: str) -> None:
+        for username in self.groups.pop(group, set()):
+            self.memberships.get(username, set()).discard(group)
+
+    def get_group(self, group: str) -> set[str | int]:
+        '''The group's members, don't modify the returned set.'''
+        return self.groups.get(group, set())
+
+    async def send_to_group(self, group: str, msg: MessageSchema, exclude: Iterable[str | int] = (), encoded: Dict[Any, str] | None = None) -> None:
+        '''Sends `msg` to the group's connected members (except `exclude`),
+        encoding it once per codec and serialization context.'''
+        encoded = {} if encoded is None else encoded
+        exclude = set(exclude)
+        for username in list(self.get_group(group)):
+            ws = self.ws_map.get(username)
+            if ws is not None and username not in exclude:
+                await self.send(ws, msg, encoded=encoded)
+
     def get_public_config_fields(self) -> List[ConfigField]:
         return self.config.transpile_public_fields()
+
+    @classmethod
+    def public_config_fields(cls) -> List[ConfigField]:
+        '''The fields of a new game's public config, without creating one
+        (see `gametypes.py`).'''
+        return cls.config_type().transpile_public_fields()
     
     def load_public_config(self, pub: PublicConfig) -> List[Tuple[str, str]]:
         '''Can be overridden if values need to be validated.'''
         self.config.public = pub
         return []
     
-    async def publish(self, type: Union[DefaultMessageTypes, T], value: Any, author: Author) -> None:
+    async def publish(self, type: Union[DefaultMessageTypes, T], value: Any, author: Author, encoded: Dict[Any, str] | None = None) -> None:
         """Wrapper around `Game.broadcast.publish`.
         
         If `author` is 0, the message will be interpreted as a server message
@@ -237,14 +485,29 @@ class Game(Generic[T]):
         # TODO: add logging.
         msg = MessageSchema(type=type, value=value, author=author)
         self.debug(f"Broadcasting @{self.gameId}")
+        encoded = {} if encoded is None else encoded
         for ws in self.ws_map.values():
-            await self.send(ws, msg)
+            await self.send(ws, msg, encoded=encoded)
+        if type in self.audience_types:
+            await self.publish_to_audience(msg, encoded)
         '''await self.broadcast.publish(
             channel=self.gameId,
             message=msg,
         )'''
     
-    async def send(self, ws: WebSocket, msg: MessageSchema, show_ping: bool = True) -> None:
+    async def send(self, ws: WebSocket, msg: MessageSchema, show_ping: bool = True, encoded: Dict[Any, str] | None = None) -> None:
+        '''Sends `msg` to `ws`. When sending the same message to several clients,
+        pass the same `encoded` dict to every call so the message is only
+        encoded once per distinct codec and serialization context.'''
+        if self.tick_outbox is not None:
+            # Sent in order with the rest of the tick, encoded now so later
+            # messages of the tick can't change it
+            if msg.author == 0:
+                msg.author = get_author_as_host()
+            encoded = {} if encoded is None else encoded
+            self.encode_for(ws, msg, encoded)
+            self.tick_outbox.append((None, ws, msg, encoded))
+            return
         async def do_send():
             try:
                 if msg.author == 0:
@@ -254,10 +517,13 @@ class Game(Generic[T]):
                     await anyio.sleep(lag/1000)
                     if show_ping:
                         msg.ping = lag
-                    await ws.send_text(msg.json())
+                codec, data = self.encode_for(ws, msg, None if DEBUG and global_config.simulate_ws_lag else encoded)
+                self.count_sent(msg.type, len(data))
+                if codec.binary:
+                    await ws.send_bytes(data)
                 else:
-                    await ws.send_text(msg.json())
-            except RuntimeError:
+                    await ws.send_text(data)
+            except (RuntimeError, WebSocketDisconnect):
                 self.debug(f"{ws} is closed, consider removing from self.ws_map :: SKIPPING SEND")
         
         # Due to lag simulation, the server in DEBUG mode only with lag_simulation=True
@@ -271,71 +537,355 @@ class Game(Generic[T]):
         else:
             await do_send()
     
-    async def handle_ws(self, ws: WebSocket, username: Union[str, int], wsId: str) -> None:
+    def encode_for(self, ws: WebSocket, msg: MessageSchema, encoded: Dict[Any, str] | None = None) -> Tuple[Codec, str | bytes]:
+        '''Encodes `msg` the way it's sent to `ws`, reusing (and filling) `encoded`.'''
+        codec = self.ws_codecs.get(id(ws), self.codec)
+        context = self.get_serialization_context(ws)
+        key = (codec.name, *sorted(context.items()))
+        if encoded is not None and key in encoded:
+            return codec, encoded[key]
+        data = codec.encode(msg, context)
+        if encoded is not None:
+            encoded[key] = data
+        return codec, data
+
+    def pre_encode(self, msg: MessageSchema, sockets: Iterable[WebSocket]) -> Dict[Any, str]:
+        '''Encodes `msg` ahead of time for every codec and serialization
+        context among `sockets`, pass the result to `send()` (as `encoded`)
+        when it's sent.'''
+        if msg.author == 0:
+            msg.author = get_author_as_host()
+        encoded = {}
+        for ws in sockets:
+            self.encode_for(ws, msg, encoded)
+        return encoded
+
+    async def publish_to_audience(self, msg: MessageSchema, encoded: Dict[Any, str] | None = None) -> None:
+        '''Queues `msg` for every audience member, encoding it once per codec.
+        Members are sent their frames by their own `audience_sender()`, a
+        frame for one whose queue is full is dropped so a slow member never
+        holds up the game.'''
+        encoded = {} if encoded is None else encoded
+        if msg.author == 0:
+            msg.author = get_author_as_host()
+        if self.tick_outbox is not None:
+            for ws in self.audience.values():
+                self.encode_for(ws, msg, encoded)
+            self.tick_outbox.append((None, TO_AUDIENCE, msg, encoded))
+            return
+        for member, ws in list(self.audience.items()):
+            self.queue_for_audience(member, ws, msg, encoded)
+
+    def queue_for_audience(self, member: str, ws: WebSocket, msg: MessageSchema, encoded: Dict[Any, str] | None = None) -> None:
+        queue = self.audience_queues.get(member)
+        if queue is None:
+            return
+        _, data = self.encode_for(ws, msg, encoded)
+        try:
+            queue.send_nowait(data)
+        except anyio.WouldBlock:
+            self.audience_dropped += 1
+            return
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            return
+        self.count_sent(msg.type, len(data))
+
+    async def audience_sender(self, ws: WebSocket, frames: MemoryObjectReceiveStream) -> None:
+        '''Sends an audience member the frames queued for it, in order.'''
+        async with frames:
+            async for data in frames:
+                try:
+                    await (ws.send_bytes(data) if isinstance(data, bytes) else ws.send_text(data))
+                except (RuntimeError, WebSocketDisconnect):
+                    return
+
+    def is_compressible(self, type: Union[DefaultMessageTypes, T], size: int) -> bool:
+        '''Whether a frame of `type` and `size` (bytes) is worth deflating:
+        large structured frames (STATE etc.) are, tiny or high rate ones
+        aren't. Measurement only, permessage-deflate compresses every frame of
+        a connection that negotiated it (ASGI can't skip single frames), this
+        only splits up `send_stats` and `wsstats.py`'s numbers.'''
+        return size >= COMPRESSIBLE_MIN_SIZE and type not in self.incompressible_types
+
+    def count_sent(self, type: Union[DefaultMessageTypes, T], size: int) -> None:
+        stats = self.send_stats.setdefault(getattr(type, "value", type), [0, 0, 0])
+        stats[0] += 1
+        stats[1] += size
+        if self.is_compressible(type, size):
+            stats[2] += size
+
+    def get_serialization_context(self, ws: WebSocket) -> Dict[str, Any]:
+        '''Passed to pydantic when serializing a message for `ws`, lets models
+        tailor themselves to the screen they're sent to.'''
+        return {"is_host": self.ws_map.get(HOST_USERNAME) is ws}
+
+    async def handle_ws(self, ws: WebSocket, username: Union[str, int], wsId: str, codec: Codec | None = None) -> None:
         self.log(f"Handling websocket {wsId}..")
+        if not await self.actor.call(self.connect, ws, username, codec):
+            return
+
+        async with anyio.create_task_group() as task_group:
+
+            async def run_ws_receiver():
+                await self.ws_receiver(ws, wsId, username)
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(run_ws_receiver)
+            #self.debug("STARTING SENDER")
+            #await self.ws_sender(ws, wsId, username)
+        with anyio.CancelScope(shield=True):
+            await self.actor.call(self.close_ws, ws, username)
+        self.log(f"Finished handling {wsId}")
+
+    async def connect(self, ws: WebSocket, username: Union[str, int], codec: Codec | None = None) -> bool:
+        '''Adds a connection to the game and sends it the game state, returns
+        whether its messages should be handled.'''
         isHost = username == HOST_USERNAME
         self.ws_map[username] = ws
+        if codec:
+            self.ws_codecs[id(ws)] = codec
 
         if isHost:
+            self.host_connected = True
             await self.publish(DefaultMessageTypes.HOST_CONNECT, self.get_player_list(), 0)
         else:
             if not username in self.players:
                 self.debug(f"{username} could not be found in player map. Did they disconnect in the lobby?")
                 await ws.close(reason="PLAYER NOT FOUND (DISCONNECTED?)")
-                return
+                return False
             self.players[username].connection_status = ConnectionStatus.CONNECTED
             await self.publish(DefaultMessageTypes.CONNECT, {"players": self.get_player_list(), "target": self.get_player(username).data}, 0)
         await self.send(ws, MessageSchema(type=DefaultMessageTypes.STATE, value=self.get_game_state(username), author=0))
 
         if not isHost:
             await self.on_player_connect(username)
+        return True
 
-        async with anyio.create_task_group() as task_group:
-
-            async def run_ws_receiver():
-                await self.ws_receiver(ws, wsId, username)
-                task_group.cancel_scope.cancel()
-
-            task_group.start_soon(run_ws_receiver)
-            #self.debug("STARTING SENDER")
-            #await self.ws_sender(ws, wsId, username)
+    async def close_ws(self, ws: WebSocket, username: Union[str, int]) -> None:
         await self.disconnect(username)
         del self.ws_map[username]
-        self.log(f"Finished handling {wsId}")
+        self.ws_codecs.pop(id(ws), None)
+
+    async def ws_receiver(self, ws: WebSocket, wsId: str, username: str, process: Callable[[WebSocket, MessageSchema, Any], Coroutine] | None = None) -> None:
+        """Handles incoming messages from a websocket, `process` defaults to
+        `process_message()`."""
+        process = process or self.process_message
+        codec = self.ws_codecs.get(id(ws), self.codec)
+        limiter = RateLimiter(self.get_rate_limits())
+        throttled: set[str] = set() # types being dropped right now
+        chunks = ChunkBuffer(global_config.ws_max_chunked_message_size)
 
-    async def ws_receiver(self, ws: WebSocket, wsId: str, username: str) -> None:
-        """Handles incoming messages from a websocket.
+        async def allow(type: str) -> bool:
+            if limiter.allow(type):
+                throttled.discard(type)
+                return True
+            self.drop_stats[type] = self.drop_stats.get(type, 0) + 1
+            if type not in throttled:
+                throttled.add(type)
+                self.warn(f"Rate limiting {type} messages from {wsId}")
+                await self.on_rate_limited(ws, type, username)
+            return False
 
-        TODO: Add msg processing, currently just a msg broadcaster."""
         try:
-            async for msg in ws.iter_json():
-                ### Verify valid attributes
-                if not "type" in msg or not "value" in msg:
-                    self.log(f"Unprocessable message from {wsId} with msg={msg}")
-                    await self.send_error(ws)
+            while True:
+                frame = await ws.receive()
+                if frame["type"] == "websocket.disconnect":
+                    break
+                data = frame["bytes"] if frame.get("bytes") is not None else frame["text"]
+                # Floods are dropped before paying for the decode
+                if not await allow(ANY_FRAME):
+                    continue
+                r = self.parse_message(data, codec, username)
+                if r.success and r.data.type == DefaultMessageTypes.CHUNK:
+                    if not await allow(r.data.type):
+                        continue
+                    r = chunks.add(r.data.value)
+                    self.inbound_buffered[username] = chunks.size
+                    if r.success and r.data is None:
+                        continue
+                    if r.success:
+                        r = self.parse_message(r.data, codec, username, global_config.ws_max_chunked_message_size)
+                        if r.success and r.data.type == DefaultMessageTypes.CHUNK:
+                            r.Fail("Chunks can't be chunked.")
+                if not r.success:
+                    self.warn(f"Dropped message from {wsId}: {r.reason}")
+                    continue
+                if not await allow(r.data.type):
+                    continue
+                if self.get_mailbox_tick() > 0:
+                    await self.enqueue_message(ws, r.data, username, process)
                 else:
-                    msg = MessageSchema(**msg, author=username if username == 0 else self.get_player(username).data)
-                    await self.process_message(ws, msg, username)
+                    await self.actor.call(process, ws, r.data, username)
         except RuntimeError as e:
             self.warn(f"{wsId} is closed. Error: {e}")
-    
-    async def process_message(self, ws: WebSocket, msg: MessageSchema, username: Union[str, int]) -> None:
-        is_host = username == 0
-        if is_host:
-            pm = await self.process_host_message(ws, msg, username)
+        finally:
+            self.inbound_buffered.pop(username, None)
+
+    def get_rate_limits(self) -> RateLimits:
+        '''Inbound rate limits per connection, set by the server operator in
+        the private config (`rate_limits`, see `ratelimit.py`).'''
+        return self.config.private.get("rate_limits", {})
+
+    def get_mailbox_tick(self) -> float:
+        '''Seconds inbound messages are collected for before they're processed
+        together (`mailbox_tick` in the private config), 0 processes each one
+        as it arrives.'''
+        return self.config.private.get("mailbox_tick", 0)
+
+    async def enqueue_message(self, ws: WebSocket, msg: MessageSchema, username: str | int, process: Callable[[WebSocket, MessageSchema, Any], Coroutine]) -> None:
+        '''Puts a message in the mailbox. The first message of a tick waits
+        `get_mailbox_tick()` seconds, then processes everything that arrived
+        meanwhile (and since) with `process_tick()`.'''
+        self.mailbox.append((ws, msg, username, process))
+        if self.mailbox_draining:
+            return
+        self.mailbox_draining = True
+        # The connection that started the tick may disconnect while it's processed
+        with anyio.CancelScope(shield=True):
+            try:
+                await self.clock.sleep(self.get_mailbox_tick())
+                while self.mailbox:
+                    batch, self.mailbox = self.mailbox, []
+                    await self.actor.call(self.process_tick, batch)
+            finally:
+                self.mailbox_draining = False
+
+    async def process_tick(self, batch: List[Tuple[WebSocket, MessageSchema, str | int, Callable]]) -> None:
+        '''Applies a tick's messages to the game in the order they arrived,
+        then sends everything they produced (replies, broadcasts and what
+        was sent directly) in that same order, so frames never cross a phase
+        change. Only the last broadcast of each of `coalesced_types` is sent,
+        and not at all if a later message moved the game to another phase.
+        Actions deferred with `coalesce()` run once each afterwards.'''
+        processed: list[ProcessedMessage] = []
+        outbox: list[Tuple[Any, WebSocket | str | None, MessageSchema, Dict[Any, str] | None]] = []
+        self.tick_actions = {}
+        self.tick_outbox = outbox
+        try:
+            for ws, msg, username, process in batch:
+                if process != self.process_message:
+                    await process(ws, msg, username)
+                    continue
+                pm = await self.apply_message(ws, msg, username)
+                author = self.get_message_author(username)
+                outbox += [(None, ws, MessageSchema(type=m.type, value=m.value, author=author), None) for m in pm.msgs_to_send]
+                outbox += [(self.get_phase(), None, MessageSchema(type=m.type, value=m.value, author=author), None) for m in pm.msgs_to_broadcast]
+                processed.append(pm)
+        finally:
+            actions, self.tick_actions = self.tick_actions, None
+            self.tick_outbox = None
+        phase = self.get_phase()
+        last = {m.type: i for i, (_, ws, m, _) in enumerate(outbox) if ws is None and m.type in self.coalesced_types}
+        for i, (p, ws, m, encoded) in enumerate(outbox):
+            if ws is TO_AUDIENCE:
+                await self.publish_to_audience(m, encoded)
+            elif ws is not None:
+                await self.send(ws, m, encoded=encoded)
+            elif m.type not in last or (last[m.type] == i and p == phase):
+                await self.publish(m.type, m.value, m.author)
+        for action in actions:
+            await action()
+        for pm in processed:
+            if pm.action:
+                await self.run_later(pm.action_delay, pm.action)
+
+    def get_phase(self) -> Any:
+        '''OVERRIDE! Identifies the part of the game being played, state
+        broadcast in one phase is stale once the game moves on.'''
+        return self.status
+
+    async def run_later(self, delay: float, fn: Callable, *args: Any) -> None:
+        '''Runs `fn(*args)` `delay` seconds (game clock) from now. On a
+        running actor it's queued with `call_later()` so the game keeps
+        processing meanwhile, otherwise (scripts, replays) it sleeps first.'''
+        if delay <= 0:
+            result = fn(*args)
+        elif self.actor.running():
+            self.actor.call_later(delay, fn, *args, sleep=self.clock.sleep)
+            return
         else:
-            pm = await self.process_plyr_message(ws, msg, username)
-        for msg in pm.msgs_to_send:
+            await self.clock.sleep(delay)
+            result = fn(*args)
+        if inspect.isawaitable(result):
+            await result
+
+    async def coalesce(self, action: Callable[[], Coroutine]) -> None:
+        '''Runs `action` now, or once at the end of the tick being processed
+        however many of its messages asked for it.'''
+        if self.tick_actions is not None:
+            self.tick_actions[action] = None
+            return
+        await action()
+
+    async def on_rate_limited(self, ws: WebSocket, type: str, username: str | int) -> None:
+        '''OVERRIDE! Called once when a connection starts getting its `type`
+        messages dropped, e.g. to tell them to slow down.'''
+        pass
+
+    def parse_message(self, data: str | bytes, codec: Codec, username: str | int, max_size: int | None = None) -> Result[MessageSchema]:
+        '''Decodes and checks an inbound frame (or reassembled message).
+        Messages over `max_size` (defaults to `ws_max_message_size`) are
+        rejected before they're decoded and only values with a validator (see
+        `value_validators`) are validated, the message is built without
+        revalidating the author.'''
+        r = Result()
+        max_size = max_size or global_config.ws_max_message_size
+        if len(data) > max_size:
+            r.Fail(f"Message is too large ({len(data)} > {max_size}).")
+            return r
+        try:
+            msg = codec.decode(data)
+        except ValueError as e:
+            r.Fail(f"Could not decode frame: {e}")
+            return r
+        if type(msg) != dict or type(msg.get("type")) != str or not "value" in msg:
+            r.Fail(f"Unprocessable message: {str(msg)[:100]}")
+            return r
+        value = msg["value"]
+        validator = self.value_validators.get(msg["type"])
+        if validator:
+            try:
+                value = validator.validate_python(value)
+            except ValidationError as e:
+                r.Fail(f"Invalid {msg['type']} value: {e.errors(include_url=False, include_input=False)[:1]}")
+                return r
+        # Audience members have no player
+        author = username if username == 0 else self.players.get(username)
+        r.Ok(MessageSchema.model_construct(type=msg["type"], value=value, author=author, ping=None))
+        return r
+
+    def record(self, kind: str, **data: Any) -> None:
+        '''Appends a record to the game's journal (if it has one).'''
+        if self.journal:
+            self.journal.append(kind, self.clock.time(), **data)
+
+    def journaled_value(self, msg: MessageSchema) -> Any:
+        '''What of `msg.value` is journaled, only what replaying it needs.'''
+        return msg.value
+
+    async def apply_message(self, ws: WebSocket, msg: MessageSchema, username: Union[str, int]) -> ProcessedMessage:
+        '''Journals `msg` and applies it to the game, returns what to send.'''
+        self.record("msg", username=username, type=msg.type, value=self.journaled_value(msg))
+        if username == 0:
+            return await self.process_host_message(ws, msg, username)
+        return await self.process_plyr_message(ws, msg, username)
+
+    def get_message_author(self, username: Union[str, int]) -> Author:
+        return username if username == 0 else self.get_player(username).data
+
+    async def process_message(self, ws: WebSocket, msg: MessageSchema, username: Union[str, int]) -> None:
+        pm = await self.apply_message(ws, msg, username)
+        while pm.msgs_to_send:
             m = pm.pop_next_msg_to_send()
-            await self.send(ws, MessageSchema(type=m.type, value=m.value, author=username if username == 0 else self.get_player(username).data))
-        for msg in pm.msgs_to_broadcast:
-            m = pm.pop_next_msg_to_broadcast()
-            await self.publish(m.type, m.value, username if username == 0 else self.get_player(username).data)
-            await anyio.sleep(0.05)
+            await self.send(ws, MessageSchema(type=m.type, value=m.value, author=self.get_message_author(username)))
+        # A message's broadcasts are spaced out, the game's other messages
+        # are processed in between
+        author = self.get_message_author(username)
+        for i, m in enumerate(pm.msgs_to_broadcast):
+            await self.run_later(i * BROADCAST_SPACING, self.publish, m.type, m.value, author)
+        pm.msgs_to_broadcast = []
         if pm.action:
-            if pm.action_delay > 0:
-                await anyio.sleep(pm.action_delay)
-            pm.action()
+            await self.run_later(pm.action_delay, pm.action)
     
     async def process_host_message(self, ws: WebSocket, msg: MessageSchema, username: int) -> ProcessedMessage:
         raise NotImplementedError("process_host_message :: You must override this method in your custom game!")
@@ -351,24 +901,71 @@ class Game(Generic[T]):
         r.Fail(f"Could not find player with username '{username}'.")
         return r
     
-    async def host(self, ws: WebSocket) -> None:
+    async def host(self, ws: WebSocket, codec: Codec | None = None) -> None:
         self.log(f"Now being hosted by WS {ws}")
         wsId = hashlib.sha256(str(ws).encode('utf-8')).hexdigest()
         try:
-            self.host_connected = True
-            await self.handle_ws(ws, 0, wsId)
+            await self.handle_ws(ws, 0, wsId, codec)
         except WebSocketDisconnect:
             self.host_connected = False
-            await self.disconnect(0)
+            await self.actor.call(self.disconnect, 0)
         
-    async def play(self, ws: WebSocket, username: str) -> None:
+    async def play(self, ws: WebSocket, username: str, codec: Codec | None = None) -> None:
         self.log(f"Attempting to join {username}..")
         wsId = hashlib.sha256(str(ws).encode('utf-8')).hexdigest()
         try:
-            await self.handle_ws(ws, username, wsId)
+            await self.handle_ws(ws, username, wsId, codec)
         except WebSocketDisconnect:
-            await self.disconnect(username)
+            await self.actor.call(self.disconnect, username)
     
+    async def watch(self, ws: WebSocket, codec: Codec | None = None) -> None:
+        '''Handles an audience member: a lightweight connection without a
+        `Player` (not in `players`/`ws_map`) that's sent `audience_types`
+        messages and whose messages go to `process_audience_message()`.'''
+        member = gen_rand_str(16)
+        wsId = hashlib.sha256(str(ws).encode('utf-8')).hexdigest()
+        queue, frames = anyio.create_memory_object_stream(AUDIENCE_QUEUE_SIZE)
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(self.audience_sender, ws, frames)
+            try:
+                await self.actor.call(self.connect_audience, ws, member, codec, queue)
+                await self.ws_receiver(ws, wsId, member, self.process_audience_message)
+            except WebSocketDisconnect:
+                pass
+            finally:
+                with anyio.CancelScope(shield=True):
+                    await self.actor.call(self.close_audience, ws, member)
+                task_group.cancel_scope.cancel()
+
+    def connect_audience(self, ws: WebSocket, member: str, codec: Codec | None, queue: MemoryObjectSendStream) -> None:
+        self.audience[member] = ws
+        self.audience_queues[member] = queue
+        if codec:
+            self.ws_codecs[id(ws)] = codec
+        self.queue_for_audience(member, ws, MessageSchema(type=DefaultMessageTypes.STATE, value=self.get_audience_state(), author=get_author_as_host()))
+
+    def close_audience(self, ws: WebSocket, member: str) -> None:
+        self.audience.pop(member, None)
+        self.ws_codecs.pop(id(ws), None)
+        queue = self.audience_queues.pop(member, None)
+        if queue:
+            queue.close()
+
+    def get_audience_state(self) -> Dict[str, Any]:
+        '''The game state sent to audience members, the host's by default.'''
+        return self.get_game_state(HOST_USERNAME)
+
+    async def process_audience_message(self, ws: WebSocket, msg: MessageSchema, member: str) -> None:
+        '''OVERRIDE! Handles a message from an audience member, ignored by default.'''
+        pass
+
+    def get_max_audience(self) -> int:
+        '''Set by the server operator in the private config (`max_audience`).'''
+        return self.config.private.get("max_audience", 0)
+
+    def can_watch(self) -> bool:
+        return self.status != GameStatus.STOPPED and len(self.audience) < self.get_max_audience()
+
     def can_join(self) -> bool:
         self.debug(f"{len(self.players)}, {self.get_max_players()}")
         return (
@@ -408,6 +1005,58 @@ class Game(Generic[T]):
         )
         self.log(f"Player '{player.username}' has left")
     
+    def snapshot(self) -> Dict[str, Any]:
+        '''Returns a JSON-compatible dump of the game's state, used to bring the
+        game back after a restart (see `restore()`). Custom games with extra
+        state should override this and extend the result of `super().snapshot()`.'''
+        return {
+            "id": self.id,
+            "status": self.status,
+            "config": {"public": self.config.public, "private": self.config.private},
+            "max_players": self.max_players,
+            "players": [p.model_dump() for p in self.players.values()],
+            "rng": self.rng.getstate(),
+            "taken_at": self.clock.time(),
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        '''Loads a dump created by `snapshot()`. Everyone (including the host)
+        is treated as disconnected until they reconnect with their ticket.'''
+        self.id = data["id"]
+        self.gameId = data["id"]
+        self.status = GameStatus(data["status"])
+        self.config.public = data["config"]["public"]
+        self.config.private = data["config"]["private"]
+        self.max_players = data["max_players"]
+        self.players = {}
+        self.reset_groups()
+        for p in data["players"]:
+            plr = Player(**p)
+            plr.connection_status = ConnectionStatus.DISCONNECTED
+            self.players[plr.username] = plr
+            self.add_to_group(GROUP_ALL, plr.username)
+            self.add_to_group(GROUP_PLAYERS, plr.username)
+        version, state, gauss = data["rng"]
+        self.rng.setstate((version, tuple(state), gauss))
+
+    async def resume(self) -> None:
+        '''Called once a restored game is live again, override to re-arm
+        any timers.'''
+        ...
+
+    def close(self) -> None:
+        '''Called once the game has stopped for good, release any resources here.'''
+        ...
+
+    def shift_deadlines(self, delta: float) -> None:
+        '''Moves every deadline/timestamp forward by `delta` seconds, used to
+        pause a game across a restart. Override if the game keeps deadlines.'''
+        ...
+
+    async def replay_timer(self, callback: str, args: list) -> None:
+        '''Replays a journaled timer fire, override if the game uses timers.'''
+        raise NotImplementedError("replay_timer :: You must override this method if your game uses timers!")
+
     async def kill(self) -> None:
         self.status = GameStatus.STOPPED
         await self.publish(DefaultMessageTypes.STATUS, value=self.status, author=0)
@@ -1,4 +1,3 @@
-import datetime
 import hashlib
 import inspect
 import anyio
@@ -7,18 +6,23 @@ import random
 import math
 import os
 
-from game import Game, GenericGameConfig, PublicConfig, MessageSchema, ProcessedMessage, GameStatus, create_threaded_async_action
+from game import Game, GenericGameConfig, PublicConfig, PrivateConfig, MessageSchema, ProcessedMessage, GameStatus, Clock, default_clock, to_iso, create_threaded_async_action, global_config, HOST_USERNAME, GROUP_HOST, GROUP_PLAYERS
 from result import Result
 from broadcaster import Broadcast
 from fastapi import WebSocket
 from enum import Enum
 from metaenum import MetaEnum
 from terminal import Terminal
-from typing import Literal, List, Dict, Union, Any, Coroutine, Callable, Tuple
-from pydantic import BaseModel
-from globals import MAX_USERNAME_LENGTH, DEBUG
+from actor import GameActor
+from typing import Literal, List, Dict, Union, Any, Coroutine, Callable, Tuple, Iterator, Iterable
+from typing_extensions import TypedDict
+from pydantic import BaseModel, PrivateAttr, FieldSerializationInfo, field_serializer, TypeAdapter
+from globals import MAX_USERNAME_LENGTH, DEBUG, API_BASE_URL
 from fuzzywuzzy import fuzz
 from player import Player
+from arena import image_arena, is_handle, HANDLE_PREFIX
+from variants import request_variants, variant_for
+from assets import StaticAsset, register_asset, unregister_asset
 
 DEFAULT_PUBLIC_ATTRS = {
     "max_players": 10,
@@ -29,34 +33,74 @@ DEFAULT_PUBLIC_ATTRS = {
     "enable_private_messages": True,
     "draw_duration": 120,
     "vote_duration": 10,
+    "parallel_matchups": 1, # matchups voted on at once, each by part of the room
     "force_next_event_after_all_images_received": True,
     "custom_prompts": "",
     "custom_prompts_only": False, 
 }
 
+DEFAULT_PRIVATE_ATTRS = {
+    "max_audience": 2000, # read-only voters, see `Game.watch()`
+    "mailbox_tick": 0, # seconds inbound messages are batched for, see `Game.enqueue_message()`
+    # message type -> [messages per second, burst] per connection (see ratelimit.py)
+    "rate_limits": {
+        "*": [50, 100], # every frame, whatever its type
+        "CHUNK": [40, 80],
+        "CHAT": [1, 5],
+        "PM": [1, 5],
+        "POLL_VOTE": [2, 4],
+        "PATH": [20, 40],
+        "CLEAR": [2, 5],
+        "IMAGE": [1, 3],
+        "IMAGE_SWAP": [1, 3],
+        "MATCHUP_VOTE": [4, 8],
+    },
+}
+
 task_threads = []
 task_threads_lock = threading.Lock()
 
 class Timer:
-    def __init__(self, name: str, t: Terminal, callback: Union[Coroutine, Callable, None] = None) -> None:
+    '''Calls `callback` at a deadline. Timers of a game whose actor is running
+    fire on the actor, otherwise on a thread of their own. Restarting or
+    killing a timer cancels the wait it had pending.'''
+    def __init__(self, name: str, t: Terminal, callback: Union[Coroutine, Callable, None] = None, clock: Clock = default_clock, actor: GameActor | None = None) -> None:
         self.name = name
         self.callback = callback
         self.finished = False
         self.t = t
         self.log = t.log
-
-    async def run(self, ends: datetime.datetime, *args: Tuple) -> None:
-        duration = (ends - datetime.datetime.now()).total_seconds()
+        self.clock = clock
+        self.ends: float | None = None
+        self.args: Tuple = ()
+        # A disarmed timer only records its deadline (used when replaying journals)
+        self.armed = True
+        self.on_fire: Callable[["Timer"], None] | None = None
+        self.actor = actor
+        # The pending wait on the actor
+        self.scope: anyio.CancelScope | None = None
+        # A threaded wait only fires if no start/kill came after it
+        self.threaded = False
+        self.generation = 0
+
+    async def run(self, generation: int, ends: float, *args: Tuple) -> None:
+        '''Waits on a thread, `ends` is a `self.clock` timestamp.'''
+        duration = self.clock.remaining(ends)
         self.log(f"Sleeping for {duration} seconds")
-        with task_threads_lock:
-            self.finished = False
-        await anyio.sleep(duration)
+        await self.clock.sleep(duration)
         self.log(f"Finished sleeping")
         with task_threads_lock:
-            if self.finished: # killed at some point before duration was reached
+            if self.generation != generation: # killed or restarted meanwhile
                 return
-            if not self.finished:
-                self.finished = True
+            self.threaded = False
+            self.finished = True
+        await self.fire(*args)
+
+    async def fire(self, *args: Tuple) -> None:
+        self.finished = True
+        self.scope = None
+        if self.on_fire and self.callback:
+            self.on_fire(self)
         if self.callback:
             if inspect.iscoroutinefunction(self.callback):
                 self.log("Awaiting callback")
@@ -67,17 +111,71 @@ class Timer:
                 self.callback(*args)
         self.log("Timer finished.")
 
-    async def start(self, ends: datetime.datetime, *args: Tuple) -> None:
+    def cancel_wait(self) -> None:
+        if self.scope:
+            self.scope.cancel()
+            self.scope = None
+        if self.threaded:
+            with task_threads_lock:
+                self.generation += 1
+            self.threaded = False
+
+    async def start(self, ends: float, *args: Tuple) -> None:
+        self.cancel_wait()
+        self.finished = False
+        self.ends = ends
+        self.args = args
+        if not self.armed:
+            return
+        if self.actor and self.actor.running():
+            self.log(f"Sleeping for {self.clock.remaining(ends)} seconds")
+            self.scope = self.actor.call_later(self.clock.remaining(ends), self.fire, *args, sleep=self.clock.sleep)
+            return
         with task_threads_lock:
-            self.finished = False
-        create_threaded_async_action(self.run, (ends, *args))()
+            self.threaded = True
+            generation = self.generation
+        create_threaded_async_action(self.run, (generation, ends, *args))()
 
     def kill(self) -> None:
-        with task_threads_lock:
-            self.finished = True
+        self.cancel_wait()
+        self.finished = True
 
 class ChampdUpConfig(GenericGameConfig):
     public: PublicConfig = DEFAULT_PUBLIC_ATTRS
+    private: PrivateConfig = DEFAULT_PRIVATE_ATTRS
+
+# : Public config validators, see `ChampdUp.load_public_config()`
+# They return (parsed value, None) or (value, error)
+PublicFieldValidator = Callable[[Any], Tuple[Any, str | None]]
+
+def int_field(error: str, minimum: int, minimum_error: str | None = None) -> PublicFieldValidator:
+    '''Whole numbers of at least `minimum`.'''
+    def validate(v: Any) -> Tuple[Any, str | None]:
+        try:
+            v = int(v)
+        except (TypeError, ValueError):
+            return v, error
+        if v < minimum:
+            return v, minimum_error or error
+        return v, None
+    return validate
+
+def bool_field(error: str) -> PublicFieldValidator:
+    def validate(v: Any) -> Tuple[Any, str | None]:
+        try:
+            return bool(v), None
+        except Exception:
+            return v, error
+    return validate
+
+def prompts_field(error: str) -> PublicFieldValidator:
+    '''Prompts separated by semi-colons.'''
+    def validate(v: Any) -> Tuple[Any, str | None]:
+        try:
+            return str(v).split(";"), None
+        except Exception:
+            return v, error
+    return validate
 
 # : MessageTypes
 class MessageType(str, Enum, metaclass=MetaEnum):
@@ -99,20 +197,70 @@ class MessageType(str, Enum, metaclass=MetaEnum):
     MATCHUP_VOTE = "MATCHUP_VOTE"
     MATCHUP_RESULT = "MATCHUP_RESULT"
     MATCHUP_START = "MATCHUP_START"
+    VOTE_ACK = "VOTE_ACK" # tells a voter their (matchup/poll) vote was counted
+    PREFETCH = "PREFETCH" # image URLs of the next matchups, for clients to download ahead of time
 
 class NotifyType(str, Enum, metaclass=MetaEnum):
     SUCCESS = "SUCCESS"
     FAIL = "FAIL"
     INFO = "INFO"
 
+class AudienceVotes:
+    '''The audience's votes on a matchup/poll. Counts are kept up to date
+    as votes come in, so tallying doesn't depend on the audience's size.'''
+    def __init__(self, votes: Dict[str, str] | None = None) -> None:
+        self.votes: Dict[str, str] = {} # member -> option
+        self.counts: Dict[str, int] = {}
+        for member, option in (votes or {}).items():
+            self.add(member, option)
+
+    def add(self, member: str, option: str) -> bool:
+        '''Returns whether the tally changed.'''
+        previous = self.votes.get(member)
+        if previous == option:
+            return False
+        if previous is not None:
+            self.counts[previous] -= 1
+        self.votes[member] = option
+        self.counts[option] = self.counts.get(option, 0) + 1
+        return True
+
+    def count(self, option: str) -> int:
+        return self.counts.get(option, 0)
+
+    def close(self) -> None:
+        '''Forgets who voted for what once votes can't change, keeps the counts.'''
+        self.votes = {}
+
 class Poll(BaseModel):
-    ends: str
+    ends: float
     prompt: str
     yes: set[str]
     no: set[str]
+    _audience: AudienceVotes = PrivateAttr(default_factory=AudienceVotes)
 
-    def is_active(self) -> bool:
-        return datetime.datetime.fromisoformat(self.ends) > datetime.datetime.now()
+    @classmethod
+    def create(cls, prompt: str, duration: float, clock: Clock) -> "Poll":
+        return cls(ends=clock.deadline(duration), prompt=prompt, yes=set(), no=set())
+
+    def is_active(self, clock: Clock = default_clock) -> bool:
+        return self.ends > clock.time()
+
+    @field_serializer("ends", when_used="json")
+    def serialize_ends(self, ends: float) -> str:
+        return to_iso(ends)
+
+    @field_serializer("yes", "no", when_used="json")
+    def serialize_votes(self, votes: set[str], info: FieldSerializationInfo) -> int:
+        return len(votes) + self._audience.count(info.field_name)
+
+def is_placeholder(dUri: str | None) -> bool:
+    return dUri in PLACEHOLDER_URLS
+
+def hash_image_data(dUri: str | None) -> str:
+    '''Hashes an image's data (not the whole model), spilled images reuse
+    the hash from their arena handle.'''
+    return image_arena.handle_of(dUri or "").removeprefix(HANDLE_PREFIX)
 
 class Image(BaseModel):
     title: str
@@ -120,7 +268,47 @@ class Image(BaseModel):
     dUri: str | None = None
     artists: list[Player]
     prompt: str
-    last_changed: str | None = None
+    last_changed: float | None = None
+    _data_hash: str | None = PrivateAttr(default=None)
+    # Smaller renditions by name (see variants.py), shared by every image with the same data
+    _variants: Dict[str, str] = PrivateAttr(default_factory=dict)
+    # Static asset URLs of the variants, once they're prefetched (see `ImageRegistry.publish()`)
+    _urls: Dict[str, str] = PrivateAttr(default_factory=dict)
+
+    def touch(self, clock: Clock) -> None:
+        self.last_changed = clock.time()
+
+    @field_serializer("last_changed", when_used="json")
+    def serialize_last_changed(self, last_changed: float | None) -> str | None:
+        return to_iso(last_changed)
+
+    @field_serializer("dUri", when_used="json")
+    def serialize_dUri(self, dUri: str | None, info: FieldSerializationInfo) -> str | None:
+        if is_placeholder(dUri):
+            return PLACEHOLDER_URLS[dUri]
+        # Clients get the variant for their screen once it's ready, by URL
+        # once they've been told to prefetch it
+        name = variant_for(info.context)
+        url = self._urls.get(name)
+        if url:
+            return url
+        variant = self._variants.get(name)
+        if variant:
+            return variant
+        # Spilled images are paged back in from the arena
+        return image_arena.resolve(dUri)
+
+    def data_hash(self) -> str:
+        '''Hash of the image data, only computed once per image.'''
+        if self._data_hash is None:
+            self._data_hash = hash_image_data(self.dUri)
+        return self._data_hash
+
+    def same_data(self, other: "Image") -> bool:
+        '''Compares image data whether or not either image has been spilled.'''
+        if self.dUri is None or other.dUri is None:
+            return self.dUri == other.dUri
+        return self.data_hash() == other.data_hash()
 
 class AwardName(str, Enum, metaclass=MetaEnum):
     DOMINATION = "DOMINATION"
@@ -141,6 +329,15 @@ class ImageMatchup(BaseModel):
     rightVotes: set[str]
     initial_leader: str | None = None
     started: bool = False
+    _audience: AudienceVotes = PrivateAttr(default_factory=AudienceVotes)
+
+    @field_serializer("leftVotes", "rightVotes", when_used="json")
+    def serialize_votes(self, votes: set[str]) -> int:
+        '''Only counts are sent, voters are revealed in `MATCHUP_RESULT`.'''
+        return len(votes)
+
+    def artist_usernames(self) -> set[str]:
+        return {a.username for a in (*self.left.artists, *self.right.artists)}
 
     def add_vote(self, username: str, target: Literal["left", "right"]):
         if not self.initial_leader:
@@ -159,11 +356,49 @@ class ImageMatchup(BaseModel):
 
 # : Managers
 
+TALLY_INTERVAL = 0.1 # seconds, vote counts are broadcast at most this often
+AUDIENCE_SAMPLE_INTERVAL = 1 # seconds, the audience is sent vote counts at most this often
+AUDIENCE_VOTE_WEIGHT = 1 # votes the audience's favourite gets in a matchup
+
+class VoteTally:
+    '''Coalesces vote count broadcasts. A vote after a quiet period is
+    broadcast right away, votes within `TALLY_INTERVAL` of a broadcast are
+    all picked up by the next one.'''
+    def __init__(self, clock: Clock, broadcast: Callable[[], Coroutine], actor: GameActor | None = None) -> None:
+        self.clock = clock
+        self.broadcast = broadcast
+        self.actor = actor
+        self.pending = False
+        self.last = 0.0
+
+    async def changed(self) -> None:
+        if self.pending:
+            return
+        self.pending = True
+        delay = max(0, self.last + TALLY_INTERVAL - self.clock.time())
+        # Waiting on the actor would hold up the whole game
+        if delay > 0 and self.actor and self.actor.running():
+            self.actor.call_later(delay, self.flush, sleep=self.clock.sleep)
+            return
+        # The voter that scheduled the broadcast may disconnect while waiting
+        with anyio.CancelScope(shield=True):
+            await self.clock.sleep(delay)
+            await self.flush()
+
+    async def flush(self) -> None:
+        self.pending = False
+        self.last = self.clock.time()
+        await self.broadcast()
+
 class MatchupManager:
     def __init__(self) -> None:
         self._idx = -1
         self.matchups: List[ImageMatchup] = []
         self.voting_enabled = False
+        # How many matchups are voted on at once, `_idx` is the first of them
+        self.width = 1
+        # username -> index of the matchup they see (see `assign_voters()`)
+        self.assignments: Dict[str, int] = {}
     
     def has_started(self) -> bool:
         return self._idx != -1
@@ -179,11 +414,48 @@ class MatchupManager:
     
     def next_matchup(self):
         '''Disables voting'''
-        self._idx += 1
+        self._idx = 0 if self._idx == -1 else self._idx + self.width
         self.voting_enabled = False
     
     def get_matchup(self):
         return self.matchups[self._idx]
+
+    def get_batch(self) -> List[int]:
+        '''Indices of the matchups being voted on, just the current one
+        unless matchups run in parallel.'''
+        return list(range(self._idx, min(self._idx + self.width, len(self.matchups))))
+
+    def get_matchup_for(self, username: str | int) -> ImageMatchup:
+        '''The matchup `username` sees, the host (and audience) see the first.'''
+        return self.matchups[self.assignments.get(username, self._idx)]
+
+    def assign_voters(self, usernames: List[str]) -> None:
+        '''Splits the players between the current matchups. Artists see
+        their own matchup (and can't vote), everyone else is dealt out in
+        turn so each matchup gets an even share of the voters.'''
+        self.assignments = {}
+        if self.width == 1:
+            return
+        batch = self.get_batch()
+        voters = []
+        for username in usernames:
+            own = [i for i in batch if username in self.matchups[i].artist_usernames()]
+            if own:
+                self.assignments[username] = own[0]
+            else:
+                voters.append(username)
+        for n, username in enumerate(voters):
+            self.assignments[username] = batch[n % len(batch)]
+
+    def vote_scale(self, idx: int, players: int) -> float:
+        '''How many eligible players (everyone but its artists) each vote on
+        matchup `idx` stands for, so matchups voted on by part of the room
+        score like ones the whole room voted on.'''
+        if self.width == 1:
+            return 1
+        artists = self.matchups[idx].artist_usernames()
+        voters = sum(1 for u, i in self.assignments.items() if i == idx and u not in artists)
+        return (players - len(artists)) / voters if voters else 1
     
     def add_matchup(self, left: Image, right: Image):
         self.matchups.append(ImageMatchup(left=left, right=right, leftVotes=set(), rightVotes=set()))
@@ -191,6 +463,8 @@ class MatchupManager:
     def reset(self):
         self._idx = -1
         self.matchups = []
+        self.width = 1
+        self.assignments = {}
     
 dirname = os.path.dirname(__file__)
 with open(f"{dirname}/champdup-prompts.txt", mode="r") as f:
@@ -200,12 +474,21 @@ with open(f"{dirname}/champdup-default-titles.txt", mode="r") as f:
 with open(f"{dirname}/champdup-didnt-draw.txt", mode="r") as f:
     didnt_draw_data_uri = f.read()
 
-def get_random_title(username: str) -> str:
-    t = random.choice(titles).replace("$USERNAME$", username)
+# Placeholder images only hold a sentinel, clients are sent the URL of its
+# static (cached) copy instead of the image itself
+DIDNT_DRAW = "placeholder:didnt-draw"
+PLACEHOLDER_URLS = {
+    DIDNT_DRAW: API_BASE_URL + register_asset("champdup-didnt-draw.png", StaticAsset.from_data_uri(didnt_draw_data_uri)),
+}
+
+def get_random_title(username: str, rng: random.Random = random) -> str:
+    t = rng.choice(titles).replace("$USERNAME$", username)
     return t
 
 class DrawManager:
-    def __init__(self, player_list: List[Player]) -> None:
+    def __init__(self, player_list: List[Player], clock: Clock = default_clock, rng: random.Random = random) -> None:
+        self.clock = clock
+        self.rng = rng
         self.images: Dict[str, Image] = {}
         self.prompt_pool = prompts.copy()
         self.prompts: Dict[str, str] = {}
@@ -213,7 +496,7 @@ class DrawManager:
         self.reset()
     
     def add_image(self, username: str, img: Image):
-        img.last_changed = datetime.datetime.now().isoformat()
+        img.touch(self.clock)
         self.images[username] = img
     
     def get_images(self) -> List[Image]:
@@ -234,14 +517,14 @@ class DrawManager:
         for player in self.players:
             if len(pcopy) == 0:
                 pcopy = self.prompt_pool.copy()
-            prompt = random.choice(pcopy)
+            prompt = self.rng.choice(pcopy)
             pcopy.remove(prompt)
             self.prompts[player.username] = prompt
-            self.images[player.username] = Image(title=get_random_title(player.username), dUri=didnt_draw_data_uri, artists=[player], prompt=prompt)
+            self.images[player.username] = Image(title=get_random_title(player.username, self.rng), dUri=DIDNT_DRAW, artists=[player], prompt=prompt)
 
     def create_counters(self) -> Dict[str, Image]:
         plrs = self.players
-        offset = random.randint(1, len(plrs) - 1)
+        offset = self.rng.randint(1, len(plrs) - 1)
         # Get counters by applying an offset to each player
         # (1 <= offset < len(plrs))
         ctrs = [plrs[(plrs.index(plr) + offset) % len(plrs)].username for plr in plrs]
@@ -251,7 +534,9 @@ class DrawManager:
         return ctrImgMap
 
 class CounterManager:
-    def __init__(self, ctr_img_map: Dict[str, Image], player_list: List[Player]) -> None:
+    def __init__(self, ctr_img_map: Dict[str, Image], player_list: List[Player], clock: Clock = default_clock, rng: random.Random = random) -> None:
+        self.clock = clock
+        self.rng = rng
         self.ctr_img_map: Dict[str, Image] = ctr_img_map
         self.ctrs: Dict[str, Image] = {}
         self.players = player_list
@@ -259,18 +544,18 @@ class CounterManager:
     def set_ctr_img_map(self, map: Dict[str, Image]):
         self.ctr_img_map = map
         for player in self.players:
-            self.ctrs[player.username] = Image(title=get_random_title(player.username), dUri=didnt_draw_data_uri, artists=[player], prompt=random.choice(prompts))
+            self.ctrs[player.username] = Image(title=get_random_title(player.username, self.rng), dUri=DIDNT_DRAW, artists=[player], prompt=self.rng.choice(prompts))
 
     def get_matchups(self) -> List[ImageMatchup]:
         '''Returns a shuffled version of the matchups.'''
         matchups = []
         for og, ctr in zip(self.ctr_img_map.values(), self.ctrs.values()):
             matchups.append(ImageMatchup(left=og, right=ctr, leftVotes=set(), rightVotes=set()))
-        random.shuffle(matchups)
+        self.rng.shuffle(matchups)
         return matchups
     
     def set_ctr(self, username: str, img: Image):
-        img.last_changed = datetime.datetime.now().isoformat()
+        img.touch(self.clock)
         self.ctrs[username] = img
         
     def reset(self):
@@ -299,50 +584,149 @@ class StoreImage(BaseModel):
     image: Image
     image_hash: str
 
+class SwapCandidate(TypedDict):
+    '''One of an artist's earlier images they may swap in, sent instead of
+    the image itself. IMAGE_SWAP sends back its `image_hash`.'''
+    image_hash: str
+    title: str
+    src: str | None # what to show, the phone variant's URL once it's ready
+
+class ImageRegistry:
+    '''Interns image data per game, keyed by content hash, so each distinct
+    drawing is held once however many managers, matchups and leaderboard
+    entries reference it. Once spilled, the game holds a single arena
+    reference per drawing.'''
+
+    def __init__(self) -> None:
+        # hash -> data URI (or arena handle once spilled)
+        self.data: Dict[str, str] = {}
+        self.variants: Dict[str, Dict[str, str]] = {}
+        self.variants_requested: set[str] = set()
+        # hash -> variant name -> static asset URL
+        self.urls: Dict[str, Dict[str, str]] = {}
+        self.assets: set[str] = set()
+
+    def intern(self, img: Image) -> Image:
+        if img.dUri is None or is_placeholder(img.dUri):
+            return img
+        h = img.data_hash()
+        img._variants = self.variants.setdefault(h, {})
+        img._urls = self.urls.setdefault(h, {})
+        known = self.data.get(h)
+        if known is None or (is_handle(img.dUri) and not is_handle(known)):
+            # Handles are adopted along with their arena reference (restores)
+            self.data[h] = img.dUri
+        else:
+            img.dUri = known
+        return img
+
+    def spill(self, img: Image) -> None:
+        '''Moves the image's data into the arena (once per drawing).'''
+        if img.dUri is None or is_placeholder(img.dUri):
+            return
+        h = self.intern(img).data_hash()
+        if not is_handle(self.data[h]):
+            self.data[h] = image_arena.put(self.data[h])
+        img.dUri = self.data[h]
+
+    def make_variants(self, img: Image) -> None:
+        '''Renders the image's variants in the background (once per drawing).'''
+        if img.dUri is None or is_placeholder(img.dUri):
+            return
+        h = self.intern(img).data_hash()
+        if h in self.variants_requested:
+            return
+        self.variants_requested.add(h)
+        request_variants(image_arena.resolve(img.dUri), self.variants[h].update, global_config.image_variant_workers)
+
+    def publish(self, img: Image, prefix: str) -> Dict[str, str]:
+        '''Serves the image's (ready) variants as static assets, clients are
+        sent their URLs instead of their data from then on. Returns variant
+        name -> URL.'''
+        if img.dUri is None or is_placeholder(img.dUri):
+            return {}
+        h = self.intern(img).data_hash()
+        urls = self.urls[h]
+        for name, dUri in list(self.variants[h].items()):
+            if name not in urls:
+                asset = f"{prefix}-{h}-{name}"
+                urls[name] = API_BASE_URL + register_asset(asset, StaticAsset.from_data_uri(dUri))
+                self.assets.add(asset)
+        return urls
+
+    def release(self) -> None:
+        for data in self.data.values():
+            if is_handle(data):
+                image_arena.release(data)
+        self.data = {}
+        for asset in self.assets:
+            unregister_asset(asset)
+        self.assets = set()
+
 class PlayerImageStore:
+    '''Every image a player has submitted, keyed by event name.
+
+    Images are hashed once (by their data) when added and indexed by player
+    and hash (players can submit the same data, e.g. the didn't-draw
+    placeholder), swap candidates (hash and title only) are cached per
+    player until that player submits again.'''
     store: Dict[str, Dict[str, StoreImage]]
 
     def __init__(self) -> None:
         self.store = {}
+        # username -> image hash -> the player's (latest) image with that data
+        self.index: Dict[str, Dict[str, StoreImage]] = {}
+        self._candidates: Dict[str, Dict[Tuple[str, ...], List[Tuple[str, str]]]] = {}
     
     def add_plr_img(self, p: Player, img: Image, event_name: str) -> None:
         if p.username not in self.store:
             self.store[p.username] = {}
-        self.store[p.username][event_name] = StoreImage(image=img, image_hash=hashlib.sha256(str(img).encode("utf-8")).hexdigest())
+        si = StoreImage(image=img, image_hash=img.data_hash())
+        self.store[p.username][event_name] = si
+        self.index[p.username] = {s.image_hash: s for s in self.store[p.username].values()}
+        self._candidates.pop(p.username, None)
     
     def get_store(self) -> Dict[str, List[Image]]:
         return self.store
     
     def get_plr_store(self, p: Player, event_blacklist: List[str] = []) -> List[StoreImage]:
-        if p.username not in self.store:
-            return []
-        store = []
-        for event_name in self.store[p.username]:
-            if event_name in event_blacklist:
-                continue
-            if self.store[p.username][event_name]:
-                store.append(self.store[p.username][event_name])
-        return store
+        '''Returns the player's images (excluding any from `event_blacklist`).'''
+        return [
+            si for event_name, si in self.store.get(p.username, {}).items()
+            if event_name not in event_blacklist and si
+        ]
+
+    def get_swap_candidates(self, p: Player, event_blacklist: List[str] = []) -> List[Tuple[str, str]]:
+        '''Returns (image hash, title) of the player's images (excluding any
+        from `event_blacklist`), resolve one with `get_plr_image_from_hash()`.
+        The returned list is cached, do not modify it.'''
+        key = tuple(event_blacklist)
+        cache = self._candidates.setdefault(p.username, {})
+        if key not in cache:
+            cache[key] = [(si.image_hash, si.image.title) for si in self.get_plr_store(p, event_blacklist)]
+        return cache[key]
     
     def get_plr_image_from_hash(self, username: str, hash: str) -> Union[Image, None]:
-        if username not in self.store:
-            return None
-        for event_name in self.store[username]:
-            if self.store[username][event_name].image_hash == hash:
-                return self.store[username][event_name].image
-        return None
+        si = self.index.get(username, {}).get(hash)
+        return si.image if si else None
     
     def reset(self) -> None:
         '''CAREFUL! Will forget all previously stored player images!'''
         self.store = {}
+        self.index = {}
+        self._candidates = {}
 
 class Event(BaseModel):
     name: str
     timed: bool
-    ends: Union[str, None] = None
+    ends: Union[float, None] = None
+
+    def is_active(self, clock: Clock = default_clock) -> bool:
+        return self.ends is not None and self.ends > clock.time()
 
-    def is_active(self) -> bool:
-        return datetime.datetime.fromisoformat(self.ends) > datetime.datetime.now()
+    @field_serializer("ends", when_used="json")
+    def serialize_ends(self, ends: float | None) -> str | None:
+        return to_iso(ends)
 
 class LeaderboardImage(BaseModel):
     image: Image
@@ -358,6 +742,18 @@ TIMED_EVENTS = ["D1", "C1", "D2", "C2", "BD", "BC"]
 
 IVR_TIMEOUT = 10 # seconds
 
+# Groups (see `Game.send_to_group()`) kept for the matchups being voted on
+GROUP_ARTISTS = "artists"
+GROUP_VOTERS = "voters"
+
+def matchup_group(idx: int) -> str:
+    '''Everyone shown matchup `idx` (its artists and voters).'''
+    return f"matchup:{idx}"
+
+def team_group(team_id: int) -> str:
+    return f"team:{team_id}"
+MIN_PARTITION_VOTERS = 2 # voters each of the matchups run in parallel gets at least
+
 TEAM_ID = int
 TEAMS = dict[TEAM_ID, list[str]]
 PLAYER_TEAMS_MAP = dict[str, TEAM_ID]
@@ -365,7 +761,9 @@ PLAYER_TEAMS_MAP = dict[str, TEAM_ID]
 class TeamsManager:
     '''The game must have at least 4 players
     for the bonus round to work.'''
-    def __init__(self) -> None:
+    def __init__(self, clock: Clock = default_clock, rng: random.Random = random) -> None:
+        self.clock = clock
+        self.rng = rng
         self.players: List[Player] = []
         self.teams: TEAMS = {}
         self.p_team_map: PLAYER_TEAMS_MAP = {}
@@ -426,7 +824,7 @@ class TeamsManager:
                 return plr
     
     def add_image(self, username: str, img: Image) -> None:
-        img.last_changed = datetime.datetime.now().isoformat()
+        img.touch(self.clock)
         team_id = self.get_player_team_id_by_username(username)
         team_players = [self.get_player(uname) for uname in self.get_team_by_id(team_id)]
         img.artists = team_players
@@ -439,21 +837,21 @@ class TeamsManager:
 
     def create_counters(self) -> None:
         team_ids = list(self.teams.keys())
-        offset = random.randint(1, len(team_ids) - 1)
+        offset = self.rng.randint(1, len(team_ids) - 1)
         ctr_team_ids = [((tid + offset) % len(team_ids)) for tid in team_ids]
         print(team_ids, ctr_team_ids)
         for team_id, c_team_id in zip(team_ids, ctr_team_ids):
             self.team_ctr_map[team_id] = c_team_id
             self.ctrs[team_id] = Image(
-                title=get_random_title("This team"),
-                dUri=didnt_draw_data_uri,
+                title=get_random_title("This team", self.rng),
+                dUri=DIDNT_DRAW,
                 artists=self.get_players_from_team(team_id),
                 prompt=self.images[c_team_id].prompt,
-                last_changed=datetime.datetime.now().isoformat(),
             )
+            self.ctrs[team_id].touch(self.clock)
     
     def add_counter(self, username: str, img: Image) -> None:
-        img.last_changed = datetime.datetime.now().isoformat()
+        img.touch(self.clock)
         team_id = self.get_player_team_id_by_username(username)
         team_players = [self.get_player(uname) for uname in self.get_team_by_id(team_id)]
         img.artists = team_players
@@ -466,7 +864,7 @@ class TeamsManager:
             og_team_id = self.team_ctr_map[c_team_id]
             og_img = self.images[og_team_id]
             matchups.append(ImageMatchup(left=og_img, right=img, leftVotes=set(), rightVotes=set()))
-        random.shuffle(matchups)
+        self.rng.shuffle(matchups)
         return matchups
 
     
@@ -484,7 +882,7 @@ class TeamsManager:
         there are an odd number of players, the final player that is left
         out will join the most recently created team.'''
         self.players = players.copy()
-        random.shuffle(self.players)
+        self.rng.shuffle(self.players)
         plen = len(self.players)
         ctr = 0
         players_added = set()
@@ -510,7 +908,7 @@ class TeamsManager:
         
         for plr in self.players:
             if not plr.username in players_added:
-                team_id = random.choice(self.teams.keys())
+                team_id = self.rng.choice(self.teams.keys())
                 self.teams[team_id].append(plr.username)
                 self.p_team_map[plr.username] = team_id
                 
@@ -519,10 +917,10 @@ class TeamsManager:
         for team_id in self.teams:
             if len(pcopy) == 0:
                 pcopy = self.prompt_pool.copy()
-            prompt = random.choice(pcopy)
+            prompt = self.rng.choice(pcopy)
             pcopy.remove(prompt)
             self.prompts[team_id] = prompt
-            self.images[team_id] = Image(title=get_random_title("This team"), dUri=didnt_draw_data_uri, artists=self.get_players_from_team(team_id), prompt=prompt)
+            self.images[team_id] = Image(title=get_random_title("This team", self.rng), dUri=DIDNT_DRAW, artists=self.get_players_from_team(team_id), prompt=prompt)
     
     def reset_team_path_stores(self) -> None:
         for team_id in self.teams:
@@ -546,36 +944,113 @@ class IVRMode(str, Enum, metaclass=MetaEnum):
     Grace = "grace"
     Result = "result"
 
+class ImageSubmission(TypedDict):
+    dUri: str
+    title: str
+
+class PathStroke(TypedDict):
+    path: Any
+    dUri: str
+
+class AudienceMatchupVote(TypedDict):
+    '''An audience vote on one of a batch's matchups (by its `idx`).'''
+    vote: Literal["left", "right"]
+    idx: int
+
 # : Core
 class ChampdUp(Game):
     poll: None | Poll
-
-    def __init__(self, b: Broadcast, t: Terminal) -> None:
-        super().__init__(b, t)
-        self.config = ChampdUpConfig()
+    incompressible_types = Game.incompressible_types | {
+        MessageType.PATH,
+        MessageType.CLEAR,
+        MessageType.MATCHUP_VOTE,
+        MessageType.POLL_VOTE,
+        MessageType.IMAGE_SUBMITS,
+        MessageType.NOTIFY,
+        MessageType.VOTE_ACK,
+        MessageType.PREFETCH,
+    }
+    coalesced_types = Game.coalesced_types | {
+        MessageType.IMAGE_SUBMITS,
+    }
+    audience_types = Game.audience_types | {
+        MessageType.POLL,
+        MessageType.MATCHUP,
+        MessageType.MATCHUP_RESULT,
+        MessageType.IMAGE_SWAP,
+    }
+    value_validators = Game.value_validators | {
+        MessageType.CHAT: TypeAdapter(str),
+        MessageType.PM: TypeAdapter(str),
+        MessageType.POLL_VOTE: TypeAdapter(str),
+        MessageType.IMAGE: TypeAdapter(ImageSubmission),
+        MessageType.IMAGE_SWAP: TypeAdapter(str),
+        MessageType.PATH: TypeAdapter(PathStroke),
+        MessageType.MATCHUP_VOTE: TypeAdapter(Union[Literal["left", "right"], AudienceMatchupVote]),
+    }
+    config_type = ChampdUpConfig
+    # Public config keys the host sets are parsed/checked by these, keys
+    # without one are taken as they are (see `load_public_config()`)
+    public_field_validators: Dict[str, PublicFieldValidator] = {
+        "max_players": int_field("Max players must be a number", 3, "Max players must be at least 3 (a minimum of 3 players are required to play)."),
+        "poll_duration": int_field("Poll duration must be a whole number > 5", 5),
+        "bonus_round_enabled": bool_field("Value must be true/false"),
+        "polls_enabled": bool_field("Value must be true/false"),
+        "host_only_polls": bool_field("Value must be true/false"),
+        "draw_duration": int_field("Value must be an integer", 10, "Value must be at least 10 (seconds)"),
+        "vote_duration": int_field("Value must be an integer", 10, "Value must be at least 10 (seconds)"),
+        "parallel_matchups": int_field("Parallel matchups must be a whole number", 1, "Parallel matchups must be at least 1"),
+        "force_next_event_after_all_images_received": bool_field("Value must be a boolean value"),
+        "custom_prompts": prompts_field("Value must be a string and each prompt must be separated by a semi-colon (;)"),
+        "custom_prompts_only": bool_field("Value must be a boolean value"),
+    }
+
+    def __init__(self, b: Broadcast, t: Terminal, clock: Clock = default_clock, seed: int | None = None) -> None:
+        super().__init__(b, t, clock, seed)
         self.poll = None
         self.event_idx = -1
         self.events: list[Event] = []
         for event_name in RUNNING_EVENTS:
             self.events.append(Event(name=event_name, timed=event_name in TIMED_EVENTS))
-        self.teams_manager = TeamsManager()
-        self.draw_manager = DrawManager([])
-        self.ctr_manager = CounterManager({}, [])
+        self.teams_manager = TeamsManager(clock, self.rng)
+        self.draw_manager = DrawManager([], clock, self.rng)
+        self.ctr_manager = CounterManager({}, [], clock, self.rng)
         self.ready_manager = ReadyManager()
         self.matchup_manager = MatchupManager()
+        self.matchup_tally = VoteTally(clock, self.broadcast_matchup_votes, self.actor)
+        self.poll_tally = VoteTally(clock, self.broadcast_poll_votes, self.actor)
+        # message type -> when the audience was last sent it, see `sample_to_audience()`
+        self.audience_sampled: dict[str, float] = {}
         self.player_img_store = PlayerImageStore()
+        self.image_registry = ImageRegistry()
         self.leaderboard: list[Player] = []
         self.leaderboard_images: list[LeaderboardImage] = []
-        self.timer = Timer("ChampdUp Timer", t, self.iter_game_events)
+        # (title, data hash) of every leaderboard image
+        self.leaderboard_keys: set[Tuple[str, str]] = set()
+        self.timer = self._new_timer(self.iter_game_events)
         self.ivr_mode : IVRMode | None = None
+        # matchup index -> (fingerprint, encoded MATCHUP frames), see `prepare_next_batch()`
+        self.prepared: dict[int, Tuple[Any, dict]] = {}
     
     
     def get_public_field(self, key: str) -> Any:
         return self.config.public[key]
-    
+
+    def journaled_value(self, msg: MessageSchema) -> Any:
+        # Strokes carry the whole canvas, replaying them only needs the path
+        if msg.type == MessageType.PATH and type(msg.value) == dict and "dUri" in msg.value:
+            return {**msg.value, "dUri": ""}
+        return msg.value
+
+    def _new_timer(self, callback: Callable | Coroutine | None) -> Timer:
+        timer = Timer("ChampdUp Timer", self.t, callback, self.clock, self.actor)
+        timer.armed = self.timers_armed
+        timer.on_fire = lambda timer: self.record("timer", callback=timer.callback.__name__, args=list(timer.args))
+        return timer
+
     def create_new_timer(self, callback: Callable | Coroutine | None = None) -> None:
         self.timer.kill()
-        self.timer = Timer("ChampdUp Timer", self.t, callback)
+        self.timer = self._new_timer(callback)
     
     async def iter_game_events(self) -> None:
         self.debug("iter_game_events called")
@@ -595,10 +1070,14 @@ class ChampdUp(Game):
             return await self.iter_game_events()
         if event.name == "L":
             self.leaderboard = sorted(self.get_player_list(), key=lambda p: p.points, reverse=True)
+        if event.name in ("D2", "BD", "L"):
+            # Previous round is over, its images are now cold
+            self.spill_images()
         if event.name in ("D1", "D2", "BD"):
             if event.name == "BD":
                 self.teams_manager.reset()
                 self.teams_manager.create_teams(self.get_player_list())
+                self.update_team_groups()
                 self.teams_manager.process_custom_prompts(
                     self.get_public_field("custom_prompts"),
                     self.get_public_field("custom_prompts_only"),
@@ -629,17 +1108,27 @@ class ChampdUp(Game):
             else:
                 for matchup in self.ctr_manager.get_matchups():
                     self.matchup_manager.add_matchup(matchup.left, matchup.right)
+            self.matchup_manager.width = self.get_vote_width()
         if event.timed:
-            ends = (datetime.datetime.now() + datetime.timedelta(seconds=self.get_public_field("draw_duration")))
-            event.ends = ends.isoformat()
-            await self.timer.start(ends)
+            event.ends = self.clock.deadline(self.get_public_field("draw_duration"))
+            await self.timer.start(event.ends)
         for username in self.ws_map:
             await self.send(self.ws_map[username], MessageSchema(type=MessageType.STATE, value=self.get_game_state(username), author=0))
+        await self.publish_to_audience(MessageSchema(type=MessageType.STATE, value=self.get_audience_state(), author=0))
         if event.name in ("V1", "V2", "BV"):
             # Begin handling vote rounds
             await self.iter_vote_round()
     
-    async def filter_send(self, msg: MessageSchema, whitelist: list[str | int] = [], blacklist: list[str | int] = []):
+    def get_vote_width(self) -> int:
+        '''How many matchups are voted on at once: `parallel_matchups`, as
+        long as every matchup still gets `MIN_PARTITION_VOTERS` voters.'''
+        matchups = self.matchup_manager.matchups
+        if not matchups:
+            return 1
+        per_matchup = max(len(m.artist_usernames()) for m in matchups) + MIN_PARTITION_VOTERS
+        return max(1, min(int(self.get_public_field("parallel_matchups")), len(self.players) // per_matchup))
+
+    async def filter_send(self, msg: MessageSchema, whitelist: list[str | int] = [], blacklist: list[str | int] = [], encoded: dict | None = None):
         '''Filters who to send a message to.
         
         If `whitelist` and `blacklist` are empty lists,
@@ -651,16 +1140,18 @@ class ChampdUp(Game):
         If `blacklist` is specified (and `whitelist` isn't [racist!!!!1111!]),
         broadcast only to whoever isn't in the blacklist'''
 
+        encoded = {} if encoded is None else encoded
         if not whitelist and not blacklist:
-            await self.publish(msg.type, msg.value, msg.author)
+            return await self.publish(msg.type, msg.value, msg.author, encoded)
         if whitelist:
-            for username in self.ws_map:
-                if username in whitelist:
-                    await self.send(self.ws_map[username], msg)
+            for username in whitelist:
+                if username in self.ws_map:
+                    await self.send(self.ws_map[username], msg, encoded=encoded)
         else:
-            for username in self.ws_map:
+            blacklist = set(blacklist)
+            for username, ws in list(self.ws_map.items()):
                 if username not in blacklist:
-                    await self.send(self.ws_map[username], msg)
+                    await self.send(ws, msg, encoded=encoded)
     
     async def predicate_send(self, mType: MessageType, predicate: Callable[[str], Any]) -> None:
         '''Whatever `predicate(username)` returns will be sent to the client with the corresponding
@@ -668,18 +1159,113 @@ class ChampdUp(Game):
         for username in self.ws_map:
             value = predicate(username)
             await self.send(self.ws_map[username], MessageSchema(type=mType, value=predicate(username), author=0))
-    
+
+    async def send_per_matchup(self, mType: MessageType, value: Callable[[int], Any], idxs: List[int] | None = None, encoded: Dict[int, dict] | None = None, exclude: Iterable[str] = (), audience: bool | None = None) -> None:
+        '''Sends everyone shown a matchup (index `i`) `value(i)`, encoded once
+        per matchup (`encoded` can hold frames encoded ahead of time). When
+        matchups run in parallel, the host (and audience) are sent the first
+        one's value along with all of them as `"batch"`. `idxs` limits this
+        to some of the current matchups. The audience is sent it if `mType`
+        is one of `audience_types`, unless `audience` says otherwise.'''
+        mm = self.matchup_manager
+        encoded = encoded or {}
+        values = {i: value(i) for i in idxs or mm.get_batch()}
+        for i, v in values.items():
+            encoded[i] = encoded.get(i) or {}
+            await self.send_to_group(matchup_group(i), MessageSchema(type=mType, value=v, author=0), exclude, encoded[i])
+        first = next(iter(values))
+        if mm.width == 1:
+            overview, overview_encoded = MessageSchema(type=mType, value=values[first], author=0), encoded[first]
+        else:
+            overview, overview_encoded = MessageSchema(type=mType, value={**values[first], "batch": list(values.values())}, author=0), {}
+        await self.send_to_group(GROUP_HOST, overview, encoded=overview_encoded)
+        if audience is None:
+            audience = mType in self.audience_types
+        if audience:
+            await self.publish_to_audience(overview, overview_encoded)
+
+    def update_matchup_groups(self) -> None:
+        '''Regroups the players for the matchups being voted on.'''
+        mm = self.matchup_manager
+        for group in [g for g in self.groups if g.startswith("matchup:")]:
+            self.clear_group(group)
+        batch = mm.get_batch() if mm.has_started() and not mm.has_ended() else []
+        artists = {u for i in batch for u in mm.matchups[i].artist_usernames() if u in self.players}
+        for i in batch:
+            self.set_group(matchup_group(i), [u for u in self.get_group(GROUP_PLAYERS) if mm.assignments.get(u, mm._idx) == i])
+        self.set_group(GROUP_ARTISTS, artists)
+        self.set_group(GROUP_VOTERS, [u for i in batch for u in self.get_group(matchup_group(i)) if u not in artists])
+
+    def update_team_groups(self) -> None:
+        for group in [g for g in self.groups if g.startswith("team:")]:
+            self.clear_group(group)
+        for team_id, usernames in self.teams_manager.teams.items():
+            self.set_group(team_group(team_id), usernames)
+
+    def get_next_batch(self) -> List[int]:
+        mm = self.matchup_manager
+        return list(range(mm._idx + mm.width, min(mm._idx + 2 * mm.width, len(mm.matchups))))
+
+    async def prefetch_next_batch(self) -> None:
+        '''Tells clients to download the next matchups' images (the variant
+        for their screen) while this batch is voted on, so they're shown as
+        soon as their `MATCHUP` (which then only has their URLs) arrives.'''
+        urls: dict[str, list[str]] = {}
+        for i in self.get_next_batch():
+            matchup = self.matchup_manager.matchups[i]
+            for img in (matchup.left, matchup.right):
+                for name, url in self.image_registry.publish(img, self.id).items():
+                    urls.setdefault(name, []).append(url)
+        if not urls:
+            return
+        hints = {name: MessageSchema(type=MessageType.PREFETCH, value=u, author=0) for name, u in urls.items()}
+        encoded: dict[str, dict] = {name: {} for name in hints}
+        for ws in [*self.ws_map.values(), *self.audience.values()]:
+            name = variant_for(self.get_serialization_context(ws))
+            if name in hints:
+                await self.send(ws, hints[name], encoded=encoded[name])
+
+    def matchup_fingerprint(self, matchup: ImageMatchup) -> Tuple:
+        '''Changes whenever the matchup's `MATCHUP` frame would (points,
+        players' statuses, swapped images, variants/URLs becoming ready).'''
+        return (
+            matchup.model_dump(exclude={"left": {"dUri"}, "right": {"dUri"}}),
+            *((img.dUri, len(img._variants), len(img._urls)) for img in (matchup.left, matchup.right)),
+        )
+
+    def prepare_next_batch(self) -> None:
+        '''Encodes the next matchups' `MATCHUP` frames during the result
+        window (after points are awarded), see `take_prepared()`.'''
+        self.prepared = {}
+        sockets = [*self.ws_map.values(), *self.audience.values()]
+        for i in self.get_next_batch():
+            matchup = self.matchup_manager.matchups[i]
+            msg = MessageSchema(type=MessageType.MATCHUP, value={"matchup": matchup, "idx": i}, author=0)
+            self.prepared[i] = (self.matchup_fingerprint(matchup), self.pre_encode(msg, sockets))
+
+    def take_prepared(self, idx: int) -> dict:
+        '''The frames `prepare_next_batch()` encoded for matchup `idx`, unless
+        it has changed since.'''
+        fingerprint, encoded = self.prepared.pop(idx, (None, {}))
+        if fingerprint is None or fingerprint != self.matchup_fingerprint(self.matchup_manager.matchups[idx]):
+            return {}
+        return encoded
+
     async def grace_callback(self, advance_matchup: bool = True) -> None:
         if advance_matchup:
             self.matchup_manager.next_matchup()
         if self.matchup_manager.has_ended():
+            self.update_matchup_groups()
             self.ivr_mode = None
             self.timer.callback = self.iter_game_events
             return await self.iter_game_events()
         self.matchup_manager.disable_voting()
-        ends = datetime.datetime.now() + datetime.timedelta(seconds=IVR_TIMEOUT)
+        self.matchup_manager.assign_voters(list(self.players))
+        self.update_matchup_groups()
+        ends = self.clock.deadline(IVR_TIMEOUT)
         self.timer.callback = self.iter_vote_round
-        await self.filter_send(MessageSchema(type=MessageType.MATCHUP, value={"matchup": self.matchup_manager.get_matchup(), "idx": self.matchup_manager._idx}, author=0))
+        prepared = {i: self.take_prepared(i) for i in self.matchup_manager.get_batch()}
+        await self.send_per_matchup(MessageType.MATCHUP, lambda i: {"matchup": self.matchup_manager.matchups[i], "idx": i}, encoded=prepared)
         await self.timer.start(ends, IVRMode.Normal)
     
     async def iter_vote_round(self, mode: IVRMode = IVRMode.Grace):
@@ -693,170 +1279,196 @@ class ChampdUp(Game):
             # then there must have been a previous matchup that just ended. Broadcast
             # matchup winner
             self.matchup_manager.disable_voting()
-            matchup = self.matchup_manager.get_matchup()
-            llv = len(matchup.leftVotes)
-            lrv = len(matchup.rightVotes)
-
-            # Calculate points
-            lp, rp = 0, 0
-            if self.get_current_event().name == "BV":
-                scalar_w = int(1897 * 2.5)
-            else:
-                scalar_w = 1897 * int(self.get_current_event().name[1]) # either V1 or V2, we want points to be doubled during second round
-            scalar_l = 949
-
-            # We want at least (roughly) 50% of eligible players to have voted for a bonus
-            # to be awarded. Note that an eligible player is any player that isn't one of the
-            # picassos behind the image candidates.
-            can_bonus = (llv + lrv) > math.floor((len(self.players) - len(matchup.left.artists) - len(matchup.right.artists)) / 2)
-            dominated = 0 in (llv, lrv) and (llv, lrv).count(0) == 1
-            on_fire = not dominated and (llv > 2 * lrv or lrv > 2 * llv)
-            D = can_bonus * dominated * 250 * len(self.players)
-            F = can_bonus * on_fire * 125 * max(lrv, lrv)
-            B = ((llv + lrv) == 0) * 1
-            winner: Image = matchup.left
-
-            def award_points_to_artists(im: Image, inc: int) -> None:
-                im.points += inc
-                for artist in im.artists:
-                    self.players[artist.username].points += inc
-
-            if llv == lrv:
-                # Because right image countered left image,
-                # left image is given a slight bonus in points
-                lp += scalar_w * llv + 100 + B
-                rp += scalar_l * lrv + B
-                award_points_to_artists(matchup.left, lp)
-                award_points_to_artists(matchup.right, rp)
-            elif llv > lrv:
-                lp += scalar_w * llv + D + F
-                rp += scalar_l * lrv
-                award_points_to_artists(matchup.left, lp)
-                award_points_to_artists(matchup.right, rp)
-            else:
-                winner = matchup.right
-                lp += scalar_l * llv
-                rp += scalar_w * lrv + D + F
-                award_points_to_artists(matchup.left, lp)
-                award_points_to_artists(matchup.right, rp)
-            
-            awards: list[Award] = []
-            if dominated:
-                awards.append(Award(name=AwardName.DOMINATION, bonus=D))
-            if on_fire:
-                awards.append(Award(name=AwardName.ON_FIRE, bonus=F))
-            if (llv + lrv) == 0:
-                awards.append(Award(name=AwardName.BRUH, bonus=B))
-            
-            # Now we evaluate any image that doesn't require the image to be a winner
-            # (though it can still be e.g. comeback award) nor any specific amount of
-            # players to have voted
-
-            # Note that awards are only shown on the winners, though points are still awarded
-            # to losers for awards that can be achieved without winning (e.g. PRIDE award)
-
-            # :: PRIDE award
-            # title has the word 'gay' in it
-            pride = False
-            pride_points = 100
-            if matchup.left.title.lower().startswith("gay") or " gay " in matchup.left.title.lower():
-                award_points_to_artists(matchup.left, pride_points)
-                if winner == matchup.left:
-                    pride = True
-            if matchup.right.title.lower().startswith("gay") or " gay " in matchup.right.title.lower():
-                award_points_to_artists(matchup.right, pride_points)
-                if winner == matchup.right:
-                    pride = True
-            if pride:
-                awards.append(Award(name=AwardName.PRIDE, bonus=pride_points))
-            
-            # :: Comeback award
-            # winner started off losing but won in the end
-            comeback_points = 300
-            if matchup.initial_leader == "left" and winner == matchup.right or \
-                matchup.initial_leader == "right" and winner == matchup.left:
-                awards.append(Award(name=AwardName.COMEBACK, bonus=comeback_points))
-                award_points_to_artists(winner, comeback_points)
-            
-            # :: Fast award
-            # the last change is within the first quarter of the round
-            fast_points = 500
-            if not winner.last_changed:
-                # artists (somehow) won with a blank image)
-                awards.append(Award(name=AwardName.FAST, bonus=fast_points))
-                award_points_to_artists(winner, fast_points)
-            else:
-                winner_submitted = datetime.datetime.fromisoformat(winner.last_changed)
-                if winner == matchup.left:
-                    if self.get_current_event().name == "BV":
-                        event_ends = self.events[6].ends
-                    else:
-                        draw_event_name = self.get_current_event().name.replace("V", "D")
-                        event_ends = self.events[0 if draw_event_name == "D1" else 3].ends
-                else:
-                    if self.get_current_event().name == "BV":
-                        event_ends = self.events[7].ends
-                    else:
-                        ctr_event_name = self.get_current_event().name.replace("V", "C")
-                        event_ends = self.events[1 if ctr_event_name == "C1" else 4].ends
-                event_ends = datetime.datetime.fromisoformat(event_ends)
-                event_starts = event_ends - datetime.timedelta(seconds=self.get_public_field("draw_duration"))
-                if winner_submitted < event_ends:
-                    t0 = event_starts.timestamp()
-                    t1 = winner_submitted.timestamp() - t0 
-                    t2 = event_ends.timestamp() - t0
-                    if t1/t2 < 1/3:
-                        # image was submitted during first third of the event
-                        awards.append(Award(name=AwardName.FAST, bonus=fast_points))
-                        award_points_to_artists(winner, fast_points)
-
-            # Since images can now be swapped, we don't want two of the same image to show on the end screen.
-            # As such we need to check if any leaderboard image previously saved has the same title and
-            # dUri as our current image. If so, do not add this image as this image was swapped in (still
-            # award points though.)
-            image_was_swapped = False
-            for leaderboard_image in self.leaderboard_images:
-                if leaderboard_image.image.title == winner.title and leaderboard_image.image.dUri == winner.dUri:
-                    image_was_swapped = True
-                    break
-            if not image_was_swapped:
-                self.leaderboard_images.append(LeaderboardImage(image=winner, awards=awards))
-            ends = (datetime.datetime.now() + datetime.timedelta(seconds=IVR_TIMEOUT))
-            await self.filter_send(MessageSchema(
-                type=MessageType.MATCHUP_RESULT,
-                value={
-                    "winner": winner,
-                    "points": lp if llv >= lrv else rp,
-                    "left_points": lp,
-                    "right_points": rp,
-                    "awards": awards,
-                    "ends": ends.isoformat(),
-                },
-                author=0,
-            ))
+            ends = self.clock.deadline(IVR_TIMEOUT)
+            results = {i: {**self.score_matchup(i), "ends": to_iso(ends)} for i in self.matchup_manager.get_batch()}
+            await self.send_per_matchup(MessageType.MATCHUP_RESULT, results.get)
+            self.prepare_next_batch()
             return await self.timer.start(ends, IVRMode.Grace)
 
         self.matchup_manager.enable_voting()
-        ends = (datetime.datetime.now() + datetime.timedelta(seconds=self.get_public_field("vote_duration")))
-        matchup = self.matchup_manager.get_matchup()
-        def predicate(username: str) -> bool:
-            default = {"matchup": self.matchup_manager.get_matchup(), "idx": self.matchup_manager._idx, "ends": ends}
-            if self.get_current_event().name != "V2":
-                return default
-            for i, artist_pool in enumerate((matchup.left.artists, matchup.right.artists)):
-                for artist in artist_pool:
-                    if username == artist.username:
-                        is_left = i == 0
-                        blacklist = ["D2", "C2"]
-                        default["swap_candidates"] = self.player_img_store.get_plr_store(self.get_player(username).data, blacklist)
-            return default
-        
-        await self.predicate_send(
-            MessageType.MATCHUP_START,
-            predicate,
-        )
+        ends = self.clock.deadline(self.get_public_field("vote_duration"))
+        wall_ends = to_iso(ends)
+        mm = self.matchup_manager
+        def value(i: int) -> dict[str, Any]:
+            return {"matchup": mm.matchups[i], "idx": i, "ends": wall_ends}
+        # Artists in these matchups may swap in one of their earlier images
+        swap_candidates: Dict[str, List[SwapCandidate]] = {}
+        if self.get_current_event().name == "V2":
+            for username in self.get_group(GROUP_ARTISTS):
+                refs = self.player_img_store.get_swap_candidates(self.players[username], ["D2", "C2"])
+                swap_candidates[username] = [self.swap_candidate(username, h, title) for h, title in refs]
+        await self.send_per_matchup(MessageType.MATCHUP_START, value, exclude=swap_candidates, audience=True)
+        for username, candidates in swap_candidates.items():
+            if username in self.ws_map:
+                await self.send(self.ws_map[username], MessageSchema(
+                    type=MessageType.MATCHUP_START,
+                    value={**value(mm.assignments.get(username, mm._idx)), "swap_candidates": candidates},
+                    author=0,
+                ))
+        await self.prefetch_next_batch()
         await self.timer.start(ends, IVRMode.Result)
     
+    def swap_candidate(self, username: str, image_hash: str, title: str) -> SwapCandidate:
+        '''A swap candidate with a preview, its variants are served as static
+        assets (see `ImageRegistry.publish()`) so only their URL is sent.'''
+        img = self.player_img_store.get_plr_image_from_hash(username, image_hash)
+        self.image_registry.publish(img, self.id)
+        src = img.model_dump(mode="json", include={"dUri"}, context={"is_host": False})["dUri"]
+        return {"image_hash": image_hash, "title": title, "src": src}
+
+    def score_matchup(self, idx: int) -> dict[str, Any]:
+        '''Awards points for matchup `idx` (once voting on it is over) and
+        returns its `MATCHUP_RESULT`.'''
+        matchup = self.matchup_manager.matchups[idx]
+        matchup._audience.close()
+        llv = len(matchup.leftVotes)
+        lrv = len(matchup.rightVotes)
+        # Points are worked out from the votes the whole room would have
+        # cast, in case only part of it voted on this matchup
+        scale = self.matchup_manager.vote_scale(idx, len(self.players))
+        slv, srv = llv * scale, lrv * scale
+        audience_left, audience_right = matchup._audience.count("left"), matchup._audience.count("right")
+        if audience_left > audience_right:
+            llv += AUDIENCE_VOTE_WEIGHT
+            slv += AUDIENCE_VOTE_WEIGHT
+        elif audience_right > audience_left:
+            lrv += AUDIENCE_VOTE_WEIGHT
+            srv += AUDIENCE_VOTE_WEIGHT
+
+        # Calculate points
+        lp, rp = 0, 0
+        if self.get_current_event().name == "BV":
+            scalar_w = int(1897 * 2.5)
+        else:
+            scalar_w = 1897 * int(self.get_current_event().name[1]) # either V1 or V2, we want points to be doubled during second round
+        scalar_l = 949
+
+        # We want at least (roughly) 50% of eligible players to have voted for a bonus
+        # to be awarded. Note that an eligible player is any player that isn't one of the
+        # picassos behind the image candidates.
+        can_bonus = (slv + srv) > math.floor((len(self.players) - len(matchup.left.artists) - len(matchup.right.artists)) / 2)
+        dominated = 0 in (llv, lrv) and (llv, lrv).count(0) == 1
+        on_fire = not dominated and (llv > 2 * lrv or lrv > 2 * llv)
+        D = can_bonus * dominated * 250 * len(self.players)
+        F = can_bonus * on_fire * round(125 * max(srv, srv))
+        B = ((llv + lrv) == 0) * 1
+        winner: Image = matchup.left
+
+        def award_points_to_artists(im: Image, inc: int) -> None:
+            im.points += inc
+            for artist in im.artists:
+                self.players[artist.username].points += inc
+
+        if llv == lrv:
+            # Because right image countered left image,
+            # left image is given a slight bonus in points
+            lp += round(scalar_w * slv) + 100 + B
+            rp += round(scalar_l * srv) + B
+            award_points_to_artists(matchup.left, lp)
+            award_points_to_artists(matchup.right, rp)
+        elif llv > lrv:
+            lp += round(scalar_w * slv) + D + F
+            rp += round(scalar_l * srv)
+            award_points_to_artists(matchup.left, lp)
+            award_points_to_artists(matchup.right, rp)
+        else:
+            winner = matchup.right
+            lp += round(scalar_l * slv)
+            rp += round(scalar_w * srv) + D + F
+            award_points_to_artists(matchup.left, lp)
+            award_points_to_artists(matchup.right, rp)
+
+        awards: list[Award] = []
+        if dominated:
+            awards.append(Award(name=AwardName.DOMINATION, bonus=D))
+        if on_fire:
+            awards.append(Award(name=AwardName.ON_FIRE, bonus=F))
+        if (llv + lrv) == 0:
+            awards.append(Award(name=AwardName.BRUH, bonus=B))
+
+        # Now we evaluate any image that doesn't require the image to be a winner
+        # (though it can still be e.g. comeback award) nor any specific amount of
+        # players to have voted
+
+        # Note that awards are only shown on the winners, though points are still awarded
+        # to losers for awards that can be achieved without winning (e.g. PRIDE award)
+
+        # :: PRIDE award
+        # title has the word 'gay' in it
+        pride = False
+        pride_points = 100
+        if matchup.left.title.lower().startswith("gay") or " gay " in matchup.left.title.lower():
+            award_points_to_artists(matchup.left, pride_points)
+            if winner == matchup.left:
+                pride = True
+        if matchup.right.title.lower().startswith("gay") or " gay " in matchup.right.title.lower():
+            award_points_to_artists(matchup.right, pride_points)
+            if winner == matchup.right:
+                pride = True
+        if pride:
+            awards.append(Award(name=AwardName.PRIDE, bonus=pride_points))
+
+        # :: Comeback award
+        # winner started off losing but won in the end
+        comeback_points = 300
+        if matchup.initial_leader == "left" and winner == matchup.right or \
+            matchup.initial_leader == "right" and winner == matchup.left:
+            awards.append(Award(name=AwardName.COMEBACK, bonus=comeback_points))
+            award_points_to_artists(winner, comeback_points)
+
+        # :: Fast award
+        # the last change is within the first quarter of the round
+        fast_points = 500
+        if winner.last_changed is None:
+            # artists (somehow) won with a blank image)
+            awards.append(Award(name=AwardName.FAST, bonus=fast_points))
+            award_points_to_artists(winner, fast_points)
+        else:
+            winner_submitted = winner.last_changed
+            if winner == matchup.left:
+                if self.get_current_event().name == "BV":
+                    event_ends = self.events[6].ends
+                else:
+                    draw_event_name = self.get_current_event().name.replace("V", "D")
+                    event_ends = self.events[0 if draw_event_name == "D1" else 3].ends
+            else:
+                if self.get_current_event().name == "BV":
+                    event_ends = self.events[7].ends
+                else:
+                    ctr_event_name = self.get_current_event().name.replace("V", "C")
+                    event_ends = self.events[1 if ctr_event_name == "C1" else 4].ends
+            event_starts = event_ends - self.get_public_field("draw_duration")
+            if winner_submitted < event_ends:
+                t1 = winner_submitted - event_starts
+                t2 = event_ends - event_starts
+                if t1/t2 < 1/3:
+                    # image was submitted during first third of the event
+                    awards.append(Award(name=AwardName.FAST, bonus=fast_points))
+                    award_points_to_artists(winner, fast_points)
+
+        # Since images can now be swapped, we don't want two of the same image to show on the end screen.
+        # As such we need to check if any leaderboard image previously saved has the same title and
+        # data as our current image. If so, do not add this image as this image was swapped in (still
+        # award points though.)
+        leaderboard_key = (winner.title, winner.data_hash())
+        if leaderboard_key not in self.leaderboard_keys:
+            self.leaderboard_keys.add(leaderboard_key)
+            self.leaderboard_images.append(LeaderboardImage(image=winner, awards=awards))
+        return {
+            "idx": idx,
+            "winner": winner,
+            "points": lp if llv >= lrv else rp,
+            "left_points": lp,
+            "right_points": rp,
+            "awards": awards,
+            "leftVotes": sorted(matchup.leftVotes),
+            "rightVotes": sorted(matchup.rightVotes),
+            "audience": {"left": audience_left, "right": audience_right},
+        }
+
+    def get_phase(self) -> Any:
+        return (self.status, self.event_idx, self.matchup_manager._idx)
+
     def get_current_event(self) -> Event:
         return self.events[self.event_idx]
     
@@ -884,8 +1496,10 @@ class ChampdUp(Game):
         if self.get_current_event().name in ("V1", "V2", "BV"):
             if self.matchup_manager.has_started():
                 event_data = {
-                    "matchup": self.matchup_manager.get_matchup(),
+                    "matchup": self.matchup_manager.get_matchup_for(username),
                 }
+                if username == HOST_USERNAME and self.matchup_manager.width > 1:
+                    event_data["batch"] = [self.matchup_manager.matchups[i] for i in self.matchup_manager.get_batch()]
         if self.get_current_event().name in ("BD", "BC"):
             if username != 0:
                 self.error("HELLO")
@@ -909,6 +1523,236 @@ class ChampdUp(Game):
             "via": username,
         }
     
+    def snapshot(self) -> dict[str, Any]:
+        data = super().snapshot()
+        # Images are shared between managers, matchups and the leaderboard, so
+        # each one is dumped once and referenced by key to keep that sharing
+        # intact on restore. Artists (and manager player lists) are usernames.
+        images: dict[str, dict] = {}
+        def ref(img: Image | None) -> str | None:
+            if img is None:
+                return None
+            key = str(id(img))
+            if key not in images:
+                images[key] = img.model_dump(exclude={"artists"})
+                images[key]["artists"] = [a.username for a in img.artists]
+            return key
+        def unames(players: List[Player]) -> list[str]:
+            return [p.username for p in players]
+        mm = self.matchup_manager
+        tm = self.teams_manager
+        timer = None
+        if not self.timer.finished and self.timer.ends is not None and self.timer.callback:
+            timer = {"callback": self.timer.callback.__name__, "ends": self.timer.ends, "args": list(self.timer.args)}
+        data.update({
+            "event_idx": self.event_idx,
+            "events": [e.model_dump() for e in self.events],
+            "ivr_mode": self.ivr_mode,
+            "poll": None if not self.poll else {**self.poll.model_dump(), "yes": list(self.poll.yes), "no": list(self.poll.no), "audience": self.poll._audience.votes},
+            "draw_manager": {
+                "players": unames(self.draw_manager.players),
+                "images": {u: ref(img) for u, img in self.draw_manager.images.items()},
+                "prompt_pool": self.draw_manager.prompt_pool,
+                "prompts": self.draw_manager.prompts,
+            },
+            "ctr_manager": {
+                "players": unames(self.ctr_manager.players),
+                "ctr_img_map": {u: ref(img) for u, img in self.ctr_manager.ctr_img_map.items()},
+                "ctrs": {u: ref(img) for u, img in self.ctr_manager.ctrs.items()},
+            },
+            "ready_manager": {
+                "players": unames(self.ready_manager.players),
+                "ready": list(self.ready_manager.ready),
+            },
+            "matchup_manager": {
+                "idx": mm._idx,
+                "voting_enabled": mm.voting_enabled,
+                "width": mm.width,
+                "assignments": mm.assignments,
+                "matchups": [{
+                    "left": ref(m.left),
+                    "right": ref(m.right),
+                    "leftVotes": list(m.leftVotes),
+                    "rightVotes": list(m.rightVotes),
+                    "initial_leader": m.initial_leader,
+                    "started": m.started,
+                    "audience": m._audience.votes,
+                } for m in mm.matchups],
+            },
+            "player_img_store": {
+                u: {e: ref(si.image) for e, si in events.items()}
+                for u, events in self.player_img_store.store.items()
+            },
+            "teams_manager": {
+                "players": unames(tm.players),
+                "teams": tm.teams,
+                "p_team_map": tm.p_team_map,
+                "prompt_pool": tm.prompt_pool,
+                "prompts": tm.prompts,
+                "team_path_store": tm.team_path_store,
+                "images": {tid: ref(img) for tid, img in tm.images.items()},
+                "team_ctr_map": tm.team_ctr_map,
+                "ctrs": {tid: ref(img) for tid, img in tm.ctrs.items()},
+            },
+            "leaderboard": unames(self.leaderboard),
+            "leaderboard_images": [{"image": ref(li.image), "awards": [a.model_dump() for a in li.awards]} for li in self.leaderboard_images],
+            "timer": timer,
+        })
+        data["images"] = images
+        return data
+
+    def restore(self, data: dict[str, Any]) -> None:
+        super().restore(data)
+        def players(usernames: list[str]) -> List[Player]:
+            return [self.players[u] for u in usernames if u in self.players]
+        images: dict[str, Image] = {}
+        def deref(key: str | None) -> Image | None:
+            if key is None:
+                return None
+            if key not in images:
+                raw = data["images"][key]
+                images[key] = self.image_registry.intern(Image(**{**raw, "artists": players(raw["artists"])}))
+            return images[key]
+        def team_ids(d: dict) -> dict:
+            # JSON object keys are always strings
+            return {int(k): v for k, v in d.items()}
+
+        self.event_idx = data["event_idx"]
+        self.events = [Event(**e) for e in data["events"]]
+        self.ivr_mode = None if data["ivr_mode"] is None else IVRMode(data["ivr_mode"])
+        self.poll = None
+        if data["poll"]:
+            self.poll = Poll(**{**data["poll"], "yes": set(data["poll"]["yes"]), "no": set(data["poll"]["no"])})
+            self.poll._audience = AudienceVotes(data["poll"].get("audience"))
+
+        dm = data["draw_manager"]
+        self.draw_manager.players = players(dm["players"])
+        self.draw_manager.images = {u: deref(k) for u, k in dm["images"].items()}
+        self.draw_manager.prompt_pool = dm["prompt_pool"]
+        self.draw_manager.prompts = dm["prompts"]
+
+        cm = data["ctr_manager"]
+        self.ctr_manager.players = players(cm["players"])
+        self.ctr_manager.ctr_img_map = {u: deref(k) for u, k in cm["ctr_img_map"].items()}
+        self.ctr_manager.ctrs = {u: deref(k) for u, k in cm["ctrs"].items()}
+
+        self.ready_manager.reset(players(data["ready_manager"]["players"]))
+        self.ready_manager.ready = set(data["ready_manager"]["ready"])
+
+        mm = data["matchup_manager"]
+        self.matchup_manager.reset()
+        self.matchup_manager._idx = mm["idx"]
+        self.matchup_manager.voting_enabled = mm["voting_enabled"]
+        self.matchup_manager.width = mm.get("width", 1)
+        self.matchup_manager.assignments = mm.get("assignments", {})
+        for m in mm["matchups"]:
+            matchup = ImageMatchup(
+                left=deref(m["left"]),
+                right=deref(m["right"]),
+                leftVotes=set(m["leftVotes"]),
+                rightVotes=set(m["rightVotes"]),
+                initial_leader=m["initial_leader"],
+                started=m["started"],
+            )
+            matchup._audience = AudienceVotes(m.get("audience"))
+            self.matchup_manager.matchups.append(matchup)
+
+        self.player_img_store.reset()
+        for u, events in data["player_img_store"].items():
+            for e, k in events.items():
+                self.player_img_store.add_plr_img(self.players[u], deref(k), e)
+
+        tm = data["teams_manager"]
+        self.teams_manager.players = players(tm["players"])
+        self.teams_manager.teams = team_ids(tm["teams"])
+        self.teams_manager.p_team_map = tm["p_team_map"]
+        self.teams_manager.prompt_pool = tm["prompt_pool"]
+        self.teams_manager.prompts = team_ids(tm["prompts"])
+        self.teams_manager.team_path_store = team_ids(tm["team_path_store"])
+        self.teams_manager.images = {tid: deref(k) for tid, k in team_ids(tm["images"]).items()}
+        self.teams_manager.team_ctr_map = {tid: int(c) for tid, c in team_ids(tm["team_ctr_map"]).items()}
+        self.teams_manager.ctrs = {tid: deref(k) for tid, k in team_ids(tm["ctrs"]).items()}
+
+        self.leaderboard = players(data["leaderboard"])
+        self.leaderboard_images = [LeaderboardImage(image=deref(li["image"]), awards=li["awards"]) for li in data["leaderboard_images"]]
+        self.leaderboard_keys = {(li.image.title, li.image.data_hash()) for li in self.leaderboard_images}
+        self.update_team_groups()
+        self.update_matchup_groups()
+        # The timer is only set up here, `resume()` starts it
+        self.timer.kill()
+        if data["timer"]:
+            self.create_new_timer(getattr(self, data["timer"]["callback"]))
+            self.timer.ends = data["timer"]["ends"]
+            self.timer.args = self._timer_args(self.timer.callback, data["timer"]["args"])
+            self.timer.finished = False
+        self.shift_deadlines(self.clock.time() - data["taken_at"])
+        for img in self.iter_images():
+            self.make_variants(img)
+        self.spill_images()
+
+    def shift_deadlines(self, delta: float) -> None:
+        def shift(t: float | None) -> float | None:
+            return None if t is None else t + delta
+        for event in self.events:
+            event.ends = shift(event.ends)
+        if self.poll:
+            self.poll.ends = shift(self.poll.ends)
+        if self.timer.ends is not None:
+            self.timer.ends = shift(self.timer.ends)
+        for img in self.iter_images():
+            img.last_changed = shift(img.last_changed)
+
+    def iter_images(self) -> Iterator[Image]:
+        '''Yields every distinct image the game holds.'''
+        mm = self.matchup_manager
+        sources = (
+            self.draw_manager.images.values(),
+            self.ctr_manager.ctr_img_map.values(),
+            self.ctr_manager.ctrs.values(),
+            self.teams_manager.images.values(),
+            self.teams_manager.ctrs.values(),
+            (si.image for events in self.player_img_store.store.values() for si in events.values()),
+            (img for m in mm.matchups for img in (m.left, m.right)),
+            (li.image for li in self.leaderboard_images),
+        )
+        seen = set()
+        for source in sources:
+            for img in source:
+                if id(img) not in seen:
+                    seen.add(id(img))
+                    yield img
+
+    def spill_images(self) -> None:
+        '''Moves image data into the process' image arena, leaving handles in
+        the models. Called once rounds finish, spilled images are paged back
+        in whenever they're serialized.'''
+        for img in self.iter_images():
+            self.image_registry.spill(img)
+
+    def make_variants(self, img: Image) -> None:
+        # Variants don't change the game, no need to render them while replaying
+        if self.timers_armed and global_config.image_variants_enabled:
+            self.image_registry.make_variants(img)
+
+    def close(self) -> None:
+        self.image_registry.release()
+
+    def _timer_args(self, callback: Callable, args: list) -> list:
+        if callback == self.iter_vote_round:
+            return [IVRMode(a) for a in args]
+        return args
+
+    async def resume(self) -> None:
+        if self.timer.finished or self.timer.ends is None or self.status != GameStatus.RUNNING:
+            return
+        self.timer.armed = True
+        await self.timer.start(self.timer.ends, *self.timer.args)
+
+    async def replay_timer(self, callback: str, args: list) -> None:
+        self.timer.kill()
+        cb = getattr(self, callback)
+        await cb(*self._timer_args(cb, args))
+
     def get_max_players(self) -> int:
         return self.get_public_field("max_players")
     
@@ -918,57 +1762,11 @@ class ChampdUp(Game):
             if k not in DEFAULT_PUBLIC_ATTRS:
                 errors.append((k, "Unrecognized key"))
                 continue
-            if k == "max_players":
-                try:
-                    v = int(v)
-                except ValueError:
-                    errors.append((k, "Max players must be a number"))
-                    continue
-                if v < 3:
-                    errors.append((k, "Max players must be at least 3 (a minimum of 3 players are required to play)."))
-                    continue
-            if k == "poll_duration":
-                try:
-                    v = int(v)
-                except ValueError:
-                    errors.append((k, "Poll duration must be a whole number > 5"))
-                    continue
-                if v < 5:
-                    errors.append((k, "Poll duration must be a whole number > 5"))
-                    continue
-            if k in ("bonus_round_enabled", "polls_enabled", "host_only_polls"):
-                try:
-                    v = bool(v)
-                except ValueError:
-                    errors.append((k, "Value must be true/false"))
-                    continue
-            if k in ("draw_duration", "vote_duration"):
-                try:
-                    v = int(v)
-                except ValueError:
-                    errors.append((k, "Value must be an integer"))
-                    continue
-                if v < 10:
-                    errors.append((k, "Value must be at least 10 (seconds)"))
-                    continue
-            if k == "force_next_event_after_all_images_received":
-                try:
-                    v = bool(v)
-                except Exception:
-                    errors.append((k, "Value must be a boolean value"))
-                    continue
-            if k == "custom_prompts":
-                try:
-                    v = str(v)
-                    v = v.split(";")
-                except Exception:
-                    errors.append((k, "Value must be a string and each prompt must be separated by a semi-colon (;)"))
-                    continue
-            if k == "custom_prompts_only":
-                try:
-                    v = bool(v)
-                except Exception:
-                    errors.append((k, "Value must be a boolean value"))
+            validate = self.public_field_validators.get(k)
+            if validate:
+                v, error = validate(v)
+                if error:
+                    errors.append((k, error))
                     continue
             self.config.public[k] = v
         self.max_players = self.get_public_field("max_players")
@@ -979,7 +1777,7 @@ class ChampdUp(Game):
         return type(msg.value) == str
     
     def validate_poll_msg(self, msg: MessageSchema) -> bool:
-        if self.poll and not self.poll.is_active():
+        if self.poll and not self.poll.is_active(self.clock):
             self.poll = None
         if self.poll:
             return False
@@ -994,7 +1792,7 @@ class ChampdUp(Game):
         return False
     
     def validate_sponsor_msg(self, msg: MessageSchema) -> bool:
-        if self.poll and self.poll.is_active():
+        if self.poll and self.poll.is_active(self.clock):
             return False
         if type(msg.value) != str:
             return False
@@ -1002,7 +1800,7 @@ class ChampdUp(Game):
         return text.strip() == "/sponsor"
     
     def validate_quahog_msg(self, msg: MessageSchema) -> bool:
-        if self.poll and self.poll.is_active():
+        if self.poll and self.poll.is_active(self.clock):
             return False
         if type(msg.value) != str:
             return False
@@ -1021,21 +1819,16 @@ class ChampdUp(Game):
     
     def prepare_poll_broadcast(self, text: str, author: int | str) -> ProcessedMessage:
         pm = ProcessedMessage()
-        self.poll = Poll(
-            ends=(datetime.datetime.now() + datetime.timedelta(seconds=self.get_public_field("poll_duration"))).isoformat(),
-            prompt=text.removeprefix("/poll "),
-            yes=set(),
-            no=set(),
-        )
+        self.poll = Poll.create(text.removeprefix("/poll "), self.get_public_field("poll_duration"), self.clock)
         if author == 0:
             pm.add_broadcast(MessageType.POLL, self.poll, author)
         else:
             pm.add_broadcast(MessageType.POLL, self.poll, self.get_player(author).data)
         return pm
     
-    def handle_poll_vote(self, vote: Literal["Yes"] | Literal["No"], author: str | int) -> ProcessedMessage:
+    async def handle_poll_vote(self, vote: Literal["Yes"] | Literal["No"], author: str | int) -> ProcessedMessage:
         pm = ProcessedMessage()
-        if not self.poll or vote not in ("yes", "no") or not self.poll.is_active():
+        if not self.poll or vote not in ("yes", "no") or not self.poll.is_active(self.clock):
             return pm
         author_name = author
         if type(author) == int:
@@ -1047,12 +1840,66 @@ class ChampdUp(Game):
             self.poll.yes.add(author_name)
         else:
             self.poll.no.add(author_name)
-        if author == 0:
-            pm.add_broadcast(MessageType.POLL_VOTE, self.poll, author)
-        else:
-            pm.add_broadcast(MessageType.POLL_VOTE, self.poll, self.get_player(author).data)
+        pm.add_msg(MessageType.VOTE_ACK, {"type": MessageType.POLL_VOTE, "vote": vote}, 0)
+        await self.coalesce(self.poll_tally.changed)
         return pm
+
+    async def broadcast_poll_votes(self) -> None:
+        if self.poll and self.poll.is_active(self.clock):
+            await self.publish(MessageType.POLL_VOTE, self.poll, 0)
+            await self.sample_to_audience(MessageType.POLL_VOTE, self.poll)
+
+    async def broadcast_matchup_votes(self) -> None:
+        if self.matchup_manager.voting_enabled:
+            def votes(i: int) -> dict[str, Any]:
+                matchup = self.matchup_manager.matchups[i]
+                return {
+                    "idx": i,
+                    "left": len(matchup.leftVotes),
+                    "right": len(matchup.rightVotes),
+                    "audience": {"left": matchup._audience.count("left"), "right": matchup._audience.count("right")},
+                }
+            if self.matchup_manager.width == 1:
+                await self.publish(MessageType.MATCHUP_VOTE, votes(self.matchup_manager._idx), 0)
+            else:
+                await self.send_per_matchup(MessageType.MATCHUP_VOTE, votes)
+            await self.sample_to_audience(MessageType.MATCHUP_VOTE, votes(self.matchup_manager._idx))
+
+    async def sample_to_audience(self, type: MessageType, value: Any) -> None:
+        '''Sends the audience `value` unless they were sent a `type` message in
+        the last `AUDIENCE_SAMPLE_INTERVAL` seconds. Counts they miss at the end
+        of a matchup come with its result.'''
+        if not self.audience or self.clock.time() - self.audience_sampled.get(type, 0) < AUDIENCE_SAMPLE_INTERVAL:
+            return
+        self.audience_sampled[type] = self.clock.time()
+        await self.publish_to_audience(MessageSchema(type=type, value=value, author=0))
+
+    async def process_audience_message(self, ws: WebSocket, msg: MessageSchema, member: str) -> None:
+        if msg.type == MessageType.MATCHUP_VOTE:
+            mm = self.matchup_manager
+            # The audience is sent every matchup of a batch, a plain "left" or
+            # "right" counts towards the first one (the one its frames lead with)
+            vote, idx = msg.value, mm._idx
+            if type(msg.value) == dict:
+                vote, idx = msg.value.get("vote"), msg.value.get("idx")
+            if not mm.has_started() or not mm.voting_enabled or vote not in ("left", "right") or idx not in mm.get_batch():
+                return
+            self.record("audience", member=member, type=msg.type, value=msg.value)
+            if mm.matchups[idx]._audience.add(member, vote):
+                await self.send(ws, MessageSchema(type=MessageType.VOTE_ACK, value={"type": msg.type, "vote": vote, "idx": idx}, author=0))
+                await self.coalesce(self.matchup_tally.changed)
+        if msg.type == MessageType.POLL_VOTE:
+            vote = msg.value.lower()
+            if not self.poll or not self.poll.is_active(self.clock) or vote not in ("yes", "no"):
+                return
+            self.record("audience", member=member, type=msg.type, value=vote)
+            if self.poll._audience.add(member, vote):
+                await self.send(ws, MessageSchema(type=MessageType.VOTE_ACK, value={"type": msg.type, "vote": vote}, author=0))
+                await self.coalesce(self.poll_tally.changed)
     
+    async def on_rate_limited(self, ws: WebSocket, type: str, username: str | int) -> None:
+        await self.send(ws, MessageSchema(type=MessageType.NOTIFY, value={"type": NotifyType.FAIL, "msg": "You're doing that too fast, slow down!"}, author=0))
+
     async def handle_private_message(self, sender: str | int, command: str):
         if not self.get_public_field("enable_private_messages"):
             return False
@@ -1124,7 +1971,7 @@ class ChampdUp(Game):
                 pm.add_broadcast(msg.type, msg.value, 0)
         if msg.type == MessageType.POLL_VOTE:
             if msg.value.lower() in ("yes", "no"):
-                return self.handle_poll_vote(msg.value.lower(), username)
+                return await self.handle_poll_vote(msg.value.lower(), username)
         if self.get_current_event().name in ("V1", "V2", "BV"):
             if msg.type == MessageType.MATCHUP_START:
                 # check if we can skip
@@ -1160,7 +2007,7 @@ class ChampdUp(Game):
                     pm.add_broadcast(msg.type, msg.value, self.get_player(username).data)
         if msg.type == MessageType.POLL_VOTE:
             if msg.value.lower() in ("yes", "no"):
-                return self.handle_poll_vote(msg.value.lower(), username)
+                return await self.handle_poll_vote(msg.value.lower(), username)
         
         MAX_TITLE_LENGTH = 64
         if self.get_current_event().name in ("D1", "D2", "BD"):
@@ -1169,15 +2016,16 @@ class ChampdUp(Game):
                 if type(msg.value) == dict and "dUri" in msg.value and type(msg.value["dUri"]) == str and "title" in msg.value and type(msg.value["title"]) == str and len(msg.value["title"]) <= MAX_TITLE_LENGTH:
                     title = msg.value["title"]
                     if not title:
-                        title = get_random_title(username)
+                        title = get_random_title(username, self.rng)
                     artists = [self.get_player(username).data]
                     prompt = self.draw_manager.prompts[username]
                     if self.get_current_event().name == "BD":
-                        title = get_random_title("This team")
+                        title = get_random_title("This team", self.rng)
                         team_id = self.teams_manager.get_player_team_id_by_username(username)
                         artists = self.teams_manager.get_players_from_team(team_id)
                         prompt = self.teams_manager.get_player_prompt_by_username(username)
-                    im = Image(title=title, dUri=msg.value["dUri"], artists=artists, prompt=prompt, last_changed=datetime.datetime.now().isoformat())
+                    im = self.image_registry.intern(Image(title=title, dUri=msg.value["dUri"], artists=artists, prompt=prompt))
+                    self.make_variants(im)
                     if self.get_current_event().name == "BD":
                         self.teams_manager.add_image(username, im)
                     else:
@@ -1199,15 +2047,16 @@ class ChampdUp(Game):
                 if type(msg.value) == dict and "dUri" in msg.value and type(msg.value["dUri"]) == str and "title" in msg.value and type(msg.value["title"]) == str and len(msg.value["title"]) <= MAX_TITLE_LENGTH:
                     title = msg.value["title"]
                     if not title:
-                        title = get_random_title(username)
+                        title = get_random_title(username, self.rng)
                     artists = [self.get_player(username).data]
                     prompt = self.draw_manager.prompts[username]
                     if self.get_current_event().name == "BC":
-                        title = get_random_title("This team")
+                        title = get_random_title("This team", self.rng)
                         team_id = self.teams_manager.get_player_team_id_by_username(username)
                         artists = self.teams_manager.get_players_from_team(team_id)
                         prompt = self.teams_manager.get_player_prompt_by_username(username)
-                    im = Image(title=title, dUri=msg.value["dUri"], artists=artists, prompt=prompt, last_changed=datetime.datetime.now().isoformat())
+                    im = self.image_registry.intern(Image(title=title, dUri=msg.value["dUri"], artists=artists, prompt=prompt))
+                    self.make_variants(im)
                     if self.get_current_event().name == "BC":
                         self.teams_manager.add_counter(username, im)
                     else:
@@ -1227,49 +2076,43 @@ class ChampdUp(Game):
         if self.get_current_event().name in ("BD", "BC"):
             if msg.type == MessageType.PATH and type(msg.value) == dict and "path" in msg.value and "dUri" in msg.value:
                 if not msg.value["dUri"]:
-                    msg.value["dUri"] = didnt_draw_data_uri
+                    msg.value["dUri"] = PLACEHOLDER_URLS[DIDNT_DRAW]
                 team_id = self.teams_manager.get_player_team_id_by_username(username)
-                team = self.teams_manager.get_team_by_id(team_id).copy()
-                team.remove(username)
                 # store path
                 self.teams_manager.add_player_path_to_team(username, msg.value["path"])
-                await self.filter_send(
+                await self.send_to_group(
+                    team_group(team_id),
                     MessageSchema(
                         type=MessageType.PATH,
                         value=msg.value,
-                        author=self.get_player(username).data
+                        author=self.players[username]
                     ),
-                    team,
+                    exclude=(username,),
                 )
                 return pm
             if msg.type == MessageType.CLEAR:
                 team_id = self.teams_manager.get_player_team_id_by_username(username)
-                team = self.teams_manager.get_team_by_id(team_id).copy()
-                team.remove(username)
                 # Set team img to empty dUri?
-                await self.filter_send(
+                await self.send_to_group(
+                    team_group(team_id),
                     MessageSchema(
                         type=MessageType.CLEAR,
                         value=None,
-                        author=self.get_player(username).data
+                        author=self.players[username]
                     ),
-                    team,
+                    exclude=(username,),
                 )
 
         if self.get_current_event().name in ("V1", "V2", "BV"):
             if msg.type == MessageType.MATCHUP_VOTE:
                 if not self.matchup_manager.has_started() or not self.matchup_manager.voting_enabled:
                     return pm
-                m = self.matchup_manager.get_matchup()
-                artists = [x.username for x in m.left.artists] + [x.username for x in m.right.artists]
-                if username in artists:
+                if username in self.get_group(GROUP_ARTISTS):
                     return pm
                 if msg.value in ("left", "right"):
-                    self.matchup_manager.get_matchup().add_vote(username, msg.value)
-                    pm.add_broadcast(MessageType.MATCHUP_VOTE, {
-                        "left": self.matchup_manager.get_matchup().leftVotes,
-                        "right": self.matchup_manager.get_matchup().rightVotes,
-                    }, 0)
+                    self.matchup_manager.get_matchup_for(username).add_vote(username, msg.value)
+                    pm.add_msg(MessageType.VOTE_ACK, {"type": MessageType.MATCHUP_VOTE, "vote": msg.value}, 0)
+                    await self.coalesce(self.matchup_tally.changed)
             if msg.type == MessageType.IMAGE_SWAP and self.get_current_event().name == "V2":
                 # We don't want the 2P1B vote round to be included in this (when it's implemented,
                 # hence the double-check atm) nor do we want swaps during the first round.
@@ -1277,7 +2120,7 @@ class ChampdUp(Game):
                     return pm
                 # Figure out if they're in the matchup
                 
-                matchup = self.matchup_manager.get_matchup()
+                matchup = self.matchup_manager.get_matchup_for(username)
                 p = self.get_player(username).data
                 is_left = p in matchup.left.artists
                 is_right = p in matchup.right.artists
@@ -1289,19 +2132,19 @@ class ChampdUp(Game):
                 swap_img = self.player_img_store.get_plr_image_from_hash(username, msg.value)
                 if not swap_img:
                     return pm
-                if swap_img.title in (matchup.left.title, matchup.right.title) and \
-                    swap_img.dUri in (matchup.left.dUri, matchup.right.dUri):
+                if (swap_img.title, swap_img.data_hash()) in ((matchup.left.title, matchup.left.data_hash()), (matchup.right.title, matchup.right.data_hash())):
                     pm.add_msg(MessageType.NOTIFY, {"type": NotifyType.FAIL, "msg": "You cannot swap in the same image!"}, 0)
                     return pm
                 if is_left:
                     matchup.left = swap_img
                 else:
                     matchup.right = swap_img
-                await self.filter_send(MessageSchema(
-                    type=MessageType.IMAGE_SWAP,
-                    value={"target": "left" if is_left else "right", "matchup": matchup},
-                    author=0
-                ))
+                idx = self.matchup_manager.assignments.get(username, self.matchup_manager._idx)
+                await self.send_per_matchup(
+                    MessageType.IMAGE_SWAP,
+                    lambda i: {"target": "left" if is_left else "right", "matchup": matchup, "idx": i},
+                    [idx],
+                )
         return pm
 
 # : Clean
@@ -1,6 +1,4 @@
 from game import GenericGameConfig, Game, PublicConfig, PrivateConfig
-from broadcaster import Broadcast
-from terminal import Terminal
 from typing import Any
 
 DEFAULT_PUBLIC_ATTRS = {
@@ -19,10 +17,8 @@ class Config(GenericGameConfig):
     private: PrivateConfig = DEFAULT_PRIVATE_ATTRS
 
 class MyCustomGame(Game):
-    def __init__(self, b: Broadcast, t: Terminal) -> None:
-        super().__init__(b, t)
-        self.config = Config()
-    
+    config_type = Config
+
     def get_game_state(self, username: str | int) -> dict[str, Any]:
         return {
             "host_connected": self.host_connected,
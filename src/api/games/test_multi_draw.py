@@ -1,5 +1,3 @@
-import datetime
-
 from game import Game, ProcessedMessage, MessageSchema
 from fastapi import WebSocket
 from broadcaster import Broadcast
@@ -52,7 +50,7 @@ class TestMultiDraw(Game):
             v = msg.value
             if "title" in v and "path" in v and "dUri" in v:
                 self.last_data_uri = v["dUri"]
-                v["timestamp"] = datetime.datetime.now().isoformat()
+                v["timestamp"] = self.clock.now().isoformat()
                 for u in self.ws_map:
                     if u == username:
                         continue
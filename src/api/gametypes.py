@@ -0,0 +1,34 @@
+'''The types of game the API hosts and what the lobby needs to know about them
+(`/game/names`, `/game/fields/{name}`). It's worked out once when a type is
+registered, requests are answered with the already encoded responses.'''
+from typing import Dict, List, Type
+from fastapi.responses import JSONResponse
+from game import Game, ConfigField
+
+class GameType:
+    def __init__(self, name: str, game: Type[Game]) -> None:
+        self.name = name
+        self.game = game
+        self.fields: List[ConfigField] = game.public_config_fields()
+        # Body of the `/fields` response
+        self.fields_json = JSONResponse([f.model_dump(mode="json") for f in self.fields]).body
+
+class GameTypeRegistry:
+    def __init__(self, games: Dict[str, Type[Game]] | None = None) -> None:
+        self.types: Dict[str, GameType] = {}
+        # Body of the `/names` response
+        self.names_json = JSONResponse([]).body
+        for name, game in (games or {}).items():
+            self.register(name, game)
+
+    def register(self, name: str, game: Type[Game]) -> GameType:
+        game_type = GameType(name, game)
+        self.types[name] = game_type
+        self.names_json = JSONResponse(self.names()).body
+        return game_type
+
+    def get(self, name: str) -> GameType | None:
+        return self.types.get(name)
+
+    def names(self) -> List[str]:
+        return list(self.types)
@@ -10,6 +10,10 @@ ROOT_PATH = os.path.dirname(__file__)
 ENV_PATH = os.path.join(ROOT_PATH, ".env")
 CONFIG_PATH = os.path.join(ROOT_PATH, "config.json")
 CONFIG_TEST_PATH = os.path.join(ROOT_PATH, "config.test.json") # Config for test.py
+SNAPSHOT_PATH = os.path.join(ROOT_PATH, "snapshots") # Live game snapshots, see snapshot.py
+JOURNAL_PATH = os.path.join(ROOT_PATH, "journals") # Game journals, see journal.py
+
+API_BASE_URL = "https://www.gaybaby.ca/api" # "http://localhost:8000"
 
 MAX_USERNAME_LENGTH = 18
 
@@ -0,0 +1,12 @@
+'''Gunicorn worker starting uvicorn with the websocket settings in
+`config.json` (permessage-deflate, max message size), which plain
+`uvicorn.workers.UvicornWorker` leaves at uvicorn's defaults:
+
+    gunicorn -k gunicorn_worker.CrackboxWorker -b localhost:8000 main:app
+'''
+from uvicorn.workers import UvicornWorker
+from config import Config
+from globals import CONFIG_PATH
+
+class CrackboxWorker(UvicornWorker):
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, **Config.load_config(CONFIG_PATH).uvicorn_kwargs()}
@@ -0,0 +1,131 @@
+'''Measures how many games the HTTP routes can create, and how many players
+they can join, per second:
+
+    python httpbench.py [games] [players per game] [concurrent requests]
+
+Requests are sent straight to the ASGI app (no sockets, no HTTP client) with
+snapshots and journals off. Prints each phase's throughput, its slowest
+request and the longest the event loop went without getting to run a task.
+'''
+import io
+import os
+import sys
+import time
+import json
+import base64
+import random
+import anyio
+
+from typing import Any, Awaitable, Callable, List, Tuple
+from urllib.parse import quote
+from PIL import Image
+
+async def request(app: Callable, method: str, path: str, body: Any = None) -> Tuple[int, Any]:
+    '''Sends one request to `app`, returns (status, decoded JSON body).'''
+    raw = json.dumps(body).encode("utf-8") if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": quote(path).encode(),
+        "root_path": "", "query_string": b"", "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode())],
+    }
+    sent = False
+    async def receive() -> dict:
+        nonlocal sent
+        if sent:
+            await anyio.sleep_forever()
+        sent = True
+        return {"type": "http.request", "body": raw, "more_body": False}
+    status, chunks = 0, []
+    async def send(message: dict) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+    await app(scope, receive, send)
+    data = b"".join(chunks)
+    return status, json.loads(data) if data else None
+
+async def run_phase(name: str, jobs: List[Callable[[], Awaitable[int]]], concurrency: int) -> None:
+    '''Runs `jobs` (which return the status they got), `concurrency` at a
+    time, while watching how late the event loop gets to a 1 ms sleep.'''
+    limiter = anyio.CapacityLimiter(concurrency)
+    slowest = 0.0
+    failed = 0
+    stall = 0.0
+    done = anyio.Event()
+
+    async def watch_loop() -> None:
+        nonlocal stall
+        while not done.is_set():
+            start = time.perf_counter()
+            await anyio.sleep(0.001)
+            stall = max(stall, time.perf_counter() - start - 0.001)
+
+    async def run(job: Callable[[], Awaitable[int]]) -> None:
+        nonlocal slowest, failed
+        async with limiter:
+            start = time.perf_counter()
+            if await job() >= 400:
+                failed += 1
+            slowest = max(slowest, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(watch_loop)
+        async with anyio.create_task_group() as jobs_tg:
+            for job in jobs:
+                jobs_tg.start_soon(run, job)
+        done.set()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>16}{len(jobs) / elapsed:>10.0f}{slowest * 1000:>12.1f}{stall * 1000:>12.1f}{failed:>8}")
+
+def avatar_data_url() -> str:
+    im = Image.frombytes("RGB", (128, 128), random.randbytes(128 * 128 * 3))
+    buf = io.BytesIO()
+    im.save(buf, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+
+async def main() -> None:
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    import main as api
+    api.config.snapshots_enabled = api.config.journals_enabled = False
+    api.gm.store = api.gm.journal_path = None
+    api.terminal.opts.can_log = api.terminal.opts.can_debug = api.terminal.opts.can_warn = False
+    os.makedirs(f"{api.ROOT_PATH}/imgs", exist_ok=True)
+    app = api.app
+    name = api.GameName.CHAMPDUP.value
+    avatar = avatar_data_url()
+    async with api.lifespan(app):
+        ids: List[str] = []
+        async def create() -> int:
+            status, body = await request(app, "POST", f"/game/create/{name}", {"config": {}})
+            if status == 200:
+                ids.append(body["id"])
+            return status
+        def join(id: str, username: str, avatar_data_url: str) -> Callable[[], Awaitable[int]]:
+            async def job() -> int:
+                return (await request(app, "PUT", f"/game/join/{id}/{username}", {"avatar_data_url": avatar_data_url}))[0]
+            return job
+        def get(path: str) -> Callable[[], Awaitable[int]]:
+            async def job() -> int:
+                return (await request(app, "GET", path))[0]
+            return job
+
+        print(f"{'phase':>16}{'req/s':>10}{'slowest ms':>12}{'stall ms':>12}{'failed':>8}")
+        await run_phase("create", [create] * games, concurrency)
+        await run_phase("join", [join(id, f"p{i}", "") for id in ids for i in range(players)], concurrency)
+        await run_phase("join (avatar)", [join(id, "avatar", avatar) for id in ids], concurrency)
+        await run_phase("players", [get(f"/game/players/{id}") for id in ids for _ in range(players)], concurrency)
+        await run_phase("fields", [get(f"/game/fields/{name}")] * games, concurrency)
+    for id in ids:
+        try:
+            os.remove(f"{api.ROOT_PATH}/imgs/{id}-avatar.png")
+        except FileNotFoundError:
+            pass
+
+if __name__ == "__main__":
+    anyio.run(main)
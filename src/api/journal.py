@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import queue
+import atexit
+import struct
+import threading
+import traceback
+
+from typing import Any, Callable, Iterator, List
+from snapshot import BlobStore
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JOURNAL_FILE = "journal.bin"
+HEADER = struct.Struct(">I") # payload length
+
+def encode_record(record: dict[str, Any]) -> bytes:
+    if msgpack:
+        return msgpack.packb(record)
+    return json.dumps(record, separators=(",", ":")).encode("utf-8")
+
+def decode_record(payload: bytes) -> dict[str, Any]:
+    # Journals written without msgpack (or before it was used) are JSON
+    if payload[:1] == b"{":
+        return json.loads(payload)
+    return msgpack.unpackb(payload, strict_map_key=False)
+
+class JournalWriter:
+    '''Does the journals' disk work (blob writes, appends, fsyncs) in order on
+    a thread of its own, so games never wait on the disk. Every journal in
+    the process shares one.'''
+    def __init__(self) -> None:
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def post(self, fn: Callable[..., None], *args: Any) -> None:
+        with self._lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="journal-writer", daemon=True)
+                self.thread.start()
+                # Finish what's queued before the process exits
+                atexit.register(self.flush)
+        self.queue.put((fn, args))
+
+    def call(self, fn: Callable[..., None], *args: Any) -> None:
+        '''Like `post()` but waits for `fn` (and everything queued before it).'''
+        done = threading.Event()
+        error: list[BaseException] = []
+        def job() -> None:
+            try:
+                fn(*args)
+            except BaseException as e:
+                error.append(e)
+            finally:
+                done.set()
+        self.post(job)
+        done.wait()
+        if error:
+            raise error[0]
+
+    def flush(self) -> None:
+        self.call(lambda: None)
+
+    def run(self) -> None:
+        while True:
+            fn, args = self.queue.get()
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+
+journal_writer = JournalWriter()
+
+class Journal:
+    '''Append-only log of everything that changes a game's state: joins, leaves,
+    ws tickets, every inbound message and every timer fire.
+
+    Each record is a 4-byte big-endian length followed by a MessagePack
+    payload (`{"k": <kind>, "t": <clock timestamp>, ...}`). Data URIs are
+    stored out-of-line in a `BlobStore` next to the log. Records are encoded
+    by the caller and written by the `JournalWriter` thread, which flushes
+    and fsyncs at most once per `fsync_interval` seconds (or on `sync()`),
+    so a crash loses at most that much of the game.
+
+    Replaying a journal onto a fresh game (see `replay.py`) rebuilds the game
+    exactly, which is used for crash recovery and to benchmark real games.'''
+
+    def __init__(self, path: str, fsync_interval: float = 1) -> None:
+        self.path = path
+        self.fsync_interval = fsync_interval
+        os.makedirs(path, exist_ok=True)
+        self.blobs = BlobStore(os.path.join(path, "blobs"))
+        fp = os.path.join(path, JOURNAL_FILE)
+        if os.path.isfile(fp):
+            # Drop a record cut short by a crash before appending after it
+            os.truncate(fp, Journal._valid_length(fp))
+        self._f = open(fp, mode="ab")
+        self.closed = False
+        # Only touched by the writer thread
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def append(self, kind: str, t: float, **data: Any) -> None:
+        if self.closed:
+            return
+        blobs: dict[str, str] = {}
+        payload = encode_record({"k": kind, "t": t, **self.blobs.dehydrate(data, blobs)})
+        journal_writer.post(self._write, payload, blobs)
+
+    def _write(self, payload: bytes, blobs: dict[str, str]) -> None:
+        for h, blob in blobs.items():
+            self.blobs.put(h, blob)
+        self._f.write(HEADER.pack(len(payload)) + payload)
+        self._dirty = True
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._dirty and not self._f.closed:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _close(self) -> None:
+        self._sync()
+        self._f.close()
+
+    def sync(self) -> None:
+        '''Writes and fsyncs everything appended so far, blocks until done.'''
+        journal_writer.call(self._sync)
+
+    def close(self, wait: bool = False) -> None:
+        '''Ends the journal once what's already appended is written. Waits
+        for that if `wait`.'''
+        if not self.closed:
+            self.closed = True
+            journal_writer.post(self._close)
+        if wait:
+            journal_writer.flush()
+
+    @staticmethod
+    def _iter_payloads(fp: str) -> Iterator[bytes]:
+        with open(fp, mode="rb") as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                (size,) = HEADER.unpack(header)
+                payload = f.read(size)
+                if len(payload) < size:
+                    return
+                yield payload
+
+    @staticmethod
+    def _valid_length(fp: str) -> int:
+        return sum(HEADER.size + len(p) for p in Journal._iter_payloads(fp))
+
+    @staticmethod
+    def read(path: str, hydrate: bool = True) -> Iterator[dict[str, Any]]:
+        '''Yields every record in the journal at `path`. A record cut short by
+        a crash ends the journal. Blob references are left as-is if `hydrate`
+        is `False`.'''
+        blobs = BlobStore(os.path.join(path, "blobs"))
+        for payload in Journal._iter_payloads(os.path.join(path, JOURNAL_FILE)):
+            record = decode_record(payload)
+            yield blobs.hydrate(record) if hydrate else record
+
+    @staticmethod
+    def list_open(path: str) -> List[str]:
+        '''Returns the paths of every journal under `path` whose game never
+        ended (i.e. was still running when the server went down).'''
+        if not os.path.isdir(path):
+            return []
+        journals = []
+        for name in sorted(os.listdir(path)):
+            jpath = os.path.join(path, name)
+            if not os.path.isfile(os.path.join(jpath, JOURNAL_FILE)):
+                continue
+            last = None
+            for last in Journal.read(jpath, hydrate=False):
+                pass
+            if last is not None and last["k"] != "end":
+                journals.append(jpath)
+        return journals
@@ -6,24 +6,35 @@ import base64
 import hashlib
 import uvicorn
 import string
+import anyio
+import anyio.to_thread
 import json
 import time
 import os
 import io
 
 from typing import Dict, Any, Type, Callable
+from contextlib import asynccontextmanager
+from anyio.abc import TaskGroup
 from fastapi.types import DecoratedCallable
 from result import Result
-from game import Game, GameStatus
+from game import Game, GameStatus, ConfigField
 from player import create_player, DESCRIPTORS
 from utils import gen_rand_hex_color, gen_rand_str
 from authx import AuthX, AuthXConfig, RequestToken, TokenPayload
 from fastapi import FastAPI, Depends, Request, APIRouter as FastAPIRouter, HTTPException, WebSocket
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from config import Config
 from terminal import Terminal, TerminalOpts
-from globals import DEBUG, ROOT_PATH, ENV_PATH, CONFIG_PATH, MAX_USERNAME_LENGTH, SIMULATE_LAG_MAX, SIMULATE_LAG_MIN
+from globals import DEBUG, API_BASE_URL, ROOT_PATH, ENV_PATH, CONFIG_PATH, SNAPSHOT_PATH, JOURNAL_PATH, MAX_USERNAME_LENGTH, SIMULATE_LAG_MAX, SIMULATE_LAG_MIN
+from snapshot import SnapshotStore
+from journal import Journal
+from replay import restore_from_journal
+from assets import static_assets
+from codec import Codec, MSGPACK, negotiate_codec
+from workers import GameWorker, RemoteGame
+from gametypes import GameTypeRegistry
 from dotenv import load_dotenv
 from enum import Enum
 from metaenum import MetaEnum
@@ -67,7 +78,30 @@ class APIRouter(FastAPIRouter):
 
         return decorator
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    persist = config.snapshots_enabled or config.journals_enabled
+    async with anyio.create_task_group() as task_group:
+        # Games' actors and workers' pipes run in this task group
+        gm.task_group = task_group
+        gm.start_workers(config.game_workers)
+        if persist:
+            await gm.restore_games()
+            async def snapshot_periodically():
+                while True:
+                    await anyio.sleep(config.snapshot_interval)
+                    await gm.snapshot_games()
+            task_group.start_soon(snapshot_periodically)
+        yield
+        gm.task_group = None
+        task_group.cancel_scope.cancel()
+    await anyio.to_thread.run_sync(gm.stop_workers)
+    if not persist:
+        return
+    await gm.snapshot_games()
+    terminal.log(f"Snapshotted {len(gm.games)} games before shutting down.")
+
+app = FastAPI(lifespan=lifespan)
 broadcast = Broadcast("memory://")
 auth = AuthX(config=authConfig)
 auth.handle_errors(app)
@@ -94,6 +128,9 @@ game_name_map: dict[GameName, Type[Game]] = {
     GameName.CHAMPDUP: ChampdUp,
 }
 
+# What the lobby is told about each game, worked out once (see `gametypes.py`)
+game_types = GameTypeRegistry({name.value: game for name, game in game_name_map.items()})
+
 
 with open(f"{ROOT_PATH}/msgs.txt", mode='r') as f:
     msgs = f.readlines()
@@ -110,9 +147,9 @@ async def simulate_latency(request: Request, call_next):
         response = await call_next(request)
         return response
     lag = random.randint(SIMULATE_LAG_MIN, SIMULATE_LAG_MAX) # ms, both ways
-    time.sleep(lag/1000) # since sleep() takes seconds
+    await anyio.sleep(lag/1000) # since sleep() takes seconds
     response = await call_next(request)
-    time.sleep(lag/1000)
+    await anyio.sleep(lag/1000)
     return response
 
 @main_router.route("/test")
@@ -160,25 +197,37 @@ def resolve_ws_ticket(ticket: str, gameId: str) -> Result[str | int]:
 game_router = APIRouter(prefix="/game")
 
 class GameManager:
-    def __init__(self) -> None:
+    def __init__(self, store: SnapshotStore | None = None, journal_path: str | None = None) -> None:
         self.games: Dict[str, Game] = {}
+        self.names: Dict[str, GameName] = {}
+        self.store = store
+        self.journal_path = journal_path
+        self.closed: set[str] = set()
+        # id -> (actor jobs run, tickets) as of the game's last snapshot
+        self.snapshot_versions: Dict[str, tuple[int, dict]] = {}
+        self.task_group: TaskGroup | None = None
+        self.workers: list[GameWorker] = []
     
     def game_exists(self, game_id: str) -> bool:
         return game_id in self.games
 
-    def create_game(self, name: GameName, config: dict[str, Any]) -> Result[Game]:
+    def create_game(self, name: GameName, public_config: dict[str, Any]) -> Result[Game]:
         '''Creates a `Game` and binds it to its id.'''
         r = Result()
         if name not in game_name_map:
             r.Fail(f"Game with name '{name}' not found.")
             return r
         g = game_name_map[name](broadcast, terminal)
-        errs = g.load_public_config(config)
+        errs = g.load_public_config(public_config)
         if not len(errs):
             # Generate unique ID
             while g.id in self.games:
                 g._gen_id()
             self.games[g.id] = g
+            self.names[g.id] = GameName(name)
+            if self.journal_path:
+                g.journal = Journal(os.path.join(self.journal_path, f"{int(time.time())}-{g.id}"), config.journal_fsync_interval)
+                g.record("meta", id=g.id, name=GameName(name), config=public_config, seed=g.seed)
             r.Ok(g)
             return r
         r.Fail(json.dumps(errs))
@@ -194,20 +243,180 @@ class GameManager:
         r.Ok(self.games[game_id])
         return r
 
+    def pick_worker(self) -> GameWorker | None:
+        '''The live worker hosting the fewest games, if there are any.'''
+        workers = [w for w in self.workers if w.alive]
+        return min(workers, key=lambda w: len(w.games)) if workers else None
+
+    async def spawn_game(self, name: GameName, public_config: dict[str, Any]) -> Result[Game | RemoteGame]:
+        '''Creates a game and starts it, on the worker hosting the fewest
+        live games if there are any (see `workers.py`).'''
+        worker = self.pick_worker()
+        if not worker or name not in game_name_map:
+            r = self.create_game(name, public_config)
+            if r.success:
+                self.start_game(r.data)
+            return r
+        id = gen_rand_str(6, string.ascii_uppercase)
+        while id in self.games:
+            id = gen_rand_str(6, string.ascii_uppercase)
+        r = await worker.create_game(game_name_map[name], id, GameName(name).value, public_config)
+        if r.success:
+            self.games[id] = r.data
+            self.names[id] = GameName(name)
+        return r
+
+    def start_workers(self, count: int) -> None:
+        for i in range(count):
+            worker = GameWorker(i, terminal, config.game_worker_shm_size, on_ended=self.forget_game)
+            worker.start(self.task_group)
+            self.workers.append(worker)
+        if count:
+            terminal.log(f"Hosting games in {count} worker processes")
+        if count and self.store and not self.journal_path:
+            terminal.warn("Worker hosted games are only journaled, with journals disabled they won't survive a restart")
+
+    def stop_workers(self) -> None:
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def start_game(self, g: Game) -> None:
+        '''Starts the game's actor (see `actor.py`), games are only run on
+        one while the app is up.'''
+        if self.task_group:
+            self.task_group.start_soon(g.actor.run)
+
     def kill_game(self, id: str) -> Game:
         '''Kills a `Game` instance and removes it
         from the GAMEID->GAME bindings.'''
         self.games[id].kill()
+        self.close_game(self.games[id])
         del self.games[id]
-
-gm = GameManager()
+        del self.names[id]
+        self.snapshot_versions.pop(id, None)
+        if self.store:
+            self.store.remove(id)
+
+    def forget_game(self, id: str) -> None:
+        '''Drops a worker hosted game its worker ended and closed.'''
+        self.games.pop(id, None)
+        self.names.pop(id, None)
+        WS_TICKET_MAP.pop(id, None)
+
+    def close_game(self, g: Game) -> None:
+        '''Releases a stopped game's resources and ends its journal. Safe to
+        call more than once.'''
+        if g.id in self.closed:
+            return
+        self.closed.add(g.id)
+        g.actor.stop()
+        terminal.log(f"Game {g.id}: {g.actor.stats}")
+        g.close()
+        if g.journal:
+            g.record("end")
+            g.journal.close()
+            g.journal = None
+
+    async def snapshot_games(self) -> None:
+        '''Snapshots every live game to disk and syncs their journals. Game state
+        is dumped on the event loop, the (blocking) writes happen in a worker thread.
+        Games whose actor ran nothing since their last snapshot are skipped, blobs
+        only removed games referenced are pruned.'''
+        # Worker hosted games are only journaled, by their worker
+        games = {id: g for id, g in self.games.items() if not isinstance(g, RemoteGame)}
+        journals = [g.journal for g in games.values() if g.journal]
+        await anyio.to_thread.run_sync(lambda: [j.sync() for j in journals])
+        if not self.store:
+            return
+        snapshots: Dict[str, tuple[bytes, dict[str, str], set[str]]] = {}
+        stopped: list[str] = []
+        for id, g in games.items():
+            if g.status == GameStatus.STOPPED:
+                self.close_game(g)
+                self.snapshot_versions.pop(id, None)
+                stopped.append(id)
+                continue
+            tickets = dict(WS_TICKET_MAP.get(id, {}))
+            version = self.snapshot_versions.get(id)
+            if g.actor.running() and version == (g.actor.jobs_run, tickets):
+                continue
+            data, jobs_run = await g.actor.call(lambda: (g.snapshot(), g.actor.jobs_run))
+            self.snapshot_versions[id] = (jobs_run, tickets)
+            snapshots[id] = self.store.encode({
+                "name": self.names[id],
+                "tickets": tickets,
+                "game": data,
+            })
+        def write() -> None:
+            for id in stopped:
+                self.store.remove(id)
+            for id, (raw, blobs, refs) in snapshots.items():
+                self.store.write(id, raw, blobs, refs)
+            if self.store.needs_prune:
+                self.store.prune_blobs()
+        await anyio.to_thread.run_sync(write)
+
+    async def restore_from_journal(self, path: str) -> Game | RemoteGame:
+        '''Replays the journal at `path` (see `replay.restore_from_journal()`)
+        and resumes the game, on the worker hosting the fewest games if there
+        are any.'''
+        name = GameName(next(Journal.read(path, hydrate=False))["name"])
+        worker = self.pick_worker()
+        if worker:
+            g, tickets = await worker.restore_game(game_name_map[name], path)
+        else:
+            g, tickets = await restore_from_journal(game_name_map[name], broadcast, terminal, path, config.journal_fsync_interval)
+            self.start_game(g)
+            await g.actor.call(g.resume)
+        self.games[g.id] = g
+        self.names[g.id] = name
+        WS_TICKET_MAP[g.id] = tickets
+        return g
+
+    async def restore_games(self) -> None:
+        '''Restores every live game along with its websocket tickets so
+        clients can reconnect as if nothing happened. Games are replayed
+        from their journals where possible, otherwise restored from their
+        last snapshot.'''
+        if self.journal_path:
+            for path in Journal.list_open(self.journal_path):
+                try:
+                    g = await self.restore_from_journal(path)
+                    terminal.log(f"Replayed game {g.id} from {path}")
+                except Exception as e:
+                    terminal.error(f"Could not replay journal {path}: {e}")
+        if not self.store:
+            return
+        for id, data in self.store.load_all().items():
+            if id in self.games:
+                continue
+            try:
+                name = GameName(data["name"])
+                g = game_name_map[name](broadcast, terminal)
+                g.restore(data["game"])
+                self.games[g.id] = g
+                self.names[g.id] = name
+                WS_TICKET_MAP[g.id] = data["tickets"]
+                self.start_game(g)
+                await g.actor.call(g.resume)
+                terminal.log(f"Restored game {g.id} ({name})")
+            except Exception as e:
+                terminal.error(f"Could not restore game {id}: {e}")
+                self.store.remove(id)
+        self.store.prune_blobs()
+
+gm = GameManager(
+    SnapshotStore(SNAPSHOT_PATH) if config.snapshots_enabled else None,
+    JOURNAL_PATH if config.journals_enabled else None,
+)
 
 # TEST_MULTIDRAW_ID = ""
 
 # if DEBUG:
 #     TEST_MULTIDRAW_ID = gm.create_game(GameName.TESTMULTIDRAW, {}).data.id
 
-def get_game(id: str) -> Game:
+def get_game(id: str) -> Game | RemoteGame:
     res = gm.get_game(id)
     if not res.success:
         raise HTTPException(404, res.reason)
@@ -222,13 +431,14 @@ class GameCreateResponse(BaseModel):
     ticket: str
 
 @game_router.post("/create/{name}")
-def create_game(name: str, config: GameCreatePayload):
-    r: Result[Game] = gm.create_game(name, config.config)
+async def create_game(name: str, config: GameCreatePayload):
+    r: Result[Game | RemoteGame] = await gm.spawn_game(name, config.config)
     if not r.success:
         code = 404 if r.reason == f"Game with name '{name}' not found." else 400
         raise HTTPException(code, r.reason)
     token = auth.create_access_token(f"0_{r.data.id}")
     ticket = create_ws_ticket(0, r.data.id)
+    await r.data.actor.call(r.data.record, "ticket", ticket=ticket, username=0)
     return GameCreateResponse(
         id=r.data.id,
         access_token=token,
@@ -244,84 +454,109 @@ class GameJoinPayload(BaseModel):
     avatar_data_url: str
 
 IMAGE_COMPRESSION_QUALITY = 1
+# Avatars are processed a few at a time so a wave of joins can't keep the
+# event loop off the GIL
+avatar_limiter = anyio.CapacityLimiter(2)
+
+def save_avatar(data_url: str, path: str) -> bool:
+    '''Decodes an avatar's data URL and saves it at `path` scaled to 300x300,
+    returns `False` if it isn't an image. Blocking, run it in a worker thread.'''
+    response = urllib.request.urlopen(data_url)
+    with open(path, "wb") as f:
+        f.write(response.file.read())
+    try:
+        im = Image.open(path)
+    except Exception as e:
+        terminal.debug(str(e))
+        return False
+    im = im.resize((300, 300), Image.LANCZOS)
+    im.save(path, "png", quality=IMAGE_COMPRESSION_QUALITY)
+    return True
 
 @game_router.put("/join/{id}/{username}")
-def join_game(id: str, username: str, payload: GameJoinPayload):
+async def join_game(id: str, username: str, payload: GameJoinPayload):
     g = get_game(id)
     if len(username) == 0 or len(username) > MAX_USERNAME_LENGTH:
         raise HTTPException(403, "Username must be at least 1 character and at most 24 characters.")
     username = username.strip()
-    if g.has_player(username):
+    if await g.actor.call(g.has_player, username):
         raise HTTPException(409, "Username taken!")
     if payload.avatar_data_url:
-        file_name = f"{id}-{username}.png"
-        path = f"{ROOT_PATH}/imgs/{file_name}"
-        response = urllib.request.urlopen(payload.avatar_data_url)
-        with open(path, "wb") as f:
-            f.write(response.file.read())
-        try:
-            im = Image.open(path)
-        except Exception as e:
-            terminal.debug(str(e))
+        path = f"{ROOT_PATH}/imgs/{id}-{username}.png"
+        if not await anyio.to_thread.run_sync(save_avatar, payload.avatar_data_url, path, limiter=avatar_limiter):
             raise HTTPException(400, "Data URI is invalid, please ensure it is an encoded image")
-        im = im.resize((300, 300), Image.LANCZOS)
-        im.save(path, "png", quality=IMAGE_COMPRESSION_QUALITY)
-        im = Image.open(path)
-        base = "https://www.gaybaby.ca/api" # "http://localhost:8000"
-        payload.avatar_data_url = f"{base}/game/players/{id}/{username}/avatar"
+        payload.avatar_data_url = f"{API_BASE_URL}/game/players/{id}/{username}/avatar"
     p = create_player(username, 0, gen_rand_hex_color(), avatar_data_url=payload.avatar_data_url)
-    r = g.join(p)
+    r = await g.actor.call(g.join, p)
     if not r.success:
         raise HTTPException(409, r.reason)
     token = auth.create_access_token(username, True)
     ticket = create_ws_ticket(username, g.id)
+    await g.actor.call(g.record, "ticket", ticket=ticket, username=username)
     return {"access_token": token, "ticket": ticket}
 
 @game_router.get("/players/{id}/{username}/avatar", response_class=FileResponse)
-def get_player_avatar(id: str, username: str):
+async def get_player_avatar(id: str, username: str):
     fp = f"{ROOT_PATH}/imgs/{id}-{username}.png"
     if not os.path.isfile(fp):
         raise HTTPException(404, "Could not find avatar!")
     return FileResponse(fp, media_type="image/png")
 
+@game_router.get("/static/{name}")
+async def get_static_asset(name: str, request: Request):
+    asset = static_assets.get(name)
+    if not asset:
+        raise HTTPException(404, "Could not find asset!")
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{asset.etag}"',
+        "Vary": "Accept-Encoding",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    if asset.gzipped and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(asset.gzipped, media_type=asset.media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return Response(asset.data, media_type=asset.media_type, headers=headers)
+
 @game_router.get("/players/{id}")
-def get_players(id: str):
+async def get_players(id: str):
     g = get_game(id)
-    return list(g.players.values())
+    return await g.actor.call(g.get_player_list)
 
 @game_router.get("/leaderboard/{id}")
-def get_leaderboard(id: str):
+async def get_leaderboard(id: str):
     g = get_game(id)
-    return sorted(g.players.values(), key=lambda x: x.points, reverse=True)
+    return await g.actor.call(g.get_leaderboard)
 
-@game_router.get("/fields/{name}")
-def get_game_fields(name: GameName):
-    if name not in GameName:
-        raise HTTPException(404, f"Unknown game name '{name}'.")
-    g: Game = game_name_map[name](broadcast, terminal)
-    return g.get_public_config_fields()
+@game_router.get("/fields/{name}", response_model=list[ConfigField])
+async def get_game_fields(name: GameName):
+    game_type = game_types.get(name.value)
+    if not game_type:
+        raise HTTPException(404, f"Unknown game name '{name.value}'.")
+    return Response(game_type.fields_json, media_type="application/json")
 
-@game_router.get("/names")
-def get_game_names() -> list[str]:
-    return list(game_name_map.keys())
+@game_router.get("/names", response_model=list[str])
+async def get_game_names():
+    return Response(game_types.names_json, media_type="application/json")
 
 @game_router.get("/config/{id}")
-def get_game_public_config(id: str):
+async def get_game_public_config(id: str):
     # TODO (future RT): Should require host JWT token
     g = get_game(id)
-    return g.config.public
+    return await g.actor.call(g.get_public_config)
 
 class GameError(str, Enum, metaclass=MetaEnum):
     GAME_NOT_FOUND = "GAME NOT FOUND"
     GAME_NOT_OPEN = "GAME NOT OPEN"
     INVALID_TICKET = "INVALID TICKET"
     BAD_ROUTE = "BAD ROUTE"
+    AUDIENCE_FULL = "AUDIENCE FULL"
 
 async def check_websocket(ws: WebSocket, gameId: str, route_is_host: bool, ticket: str) -> bool:
     """Returns `True` if the client
     is trying to connect/host a valid
     game."""
-    await ws.accept()
+    await accept_websocket(ws)
     if not gm.game_exists(gameId):
         await ws.close(reason=GameError.GAME_NOT_FOUND)
         return False
@@ -334,15 +569,15 @@ async def check_websocket(ws: WebSocket, gameId: str, route_is_host: bool, ticke
         await ws.close(reason=GameError.BAD_ROUTE)
         return False
     game = gm.get_game(gameId).data
-    if is_host and not game.can_host() or not is_host and not game.can_play():
+    if is_host and not await game.actor.call(game.can_host) or not is_host and not await game.actor.call(game.can_play):
         await ws.close(reason=GameError.GAME_NOT_OPEN)
         return False
     return True
 
 @game_router.get("/can-reconnect/{gameId}/{ticket}")
-def can_play(gameId: str, ticket: str):
+async def can_play(gameId: str, ticket: str):
     g = get_game(gameId);
-    if g.status != GameStatus.RUNNING:
+    if await g.actor.call(g.get_status) != GameStatus.RUNNING:
         raise HTTPException(403, "Game is not running!")
     r = resolve_ws_ticket(ticket, gameId)
     if not r.success:
@@ -350,13 +585,21 @@ def can_play(gameId: str, ticket: str):
     return {"is_host": r.data == 0}
 
 
+async def accept_websocket(ws: WebSocket) -> None:
+    await ws.accept(subprotocol=MSGPACK if MSGPACK in ws.scope.get("subprotocols", []) and get_ws_codec(ws) else None)
+
+def get_ws_codec(ws: WebSocket) -> Codec | None:
+    '''Clients can opt into MessagePack with the `msgpack` subprotocol or
+    `?protocol=msgpack`, JSON is the default.'''
+    return negotiate_codec(ws.scope.get("subprotocols", []), ws.query_params.get("protocol"))
+
 @game_router.websocket("/host/{gameId}/{ticket}")
 async def host_game(ws: WebSocket, gameId: str, ticket: str):
     success = await check_websocket(ws, gameId, True, ticket)
     if not success:
         return
     game = get_game(gameId)
-    await game.host(ws)
+    await game.host(ws, get_ws_codec(ws))
 
 
 @game_router.websocket("/play/{gameId}/{ticket}")
@@ -365,7 +608,19 @@ async def join_game(ws: WebSocket, gameId: str, ticket: str):
     if not success:
         return
     game = get_game(gameId)
-    await game.play(ws, resolve_ws_ticket(ticket, gameId).data)
+    await game.play(ws, resolve_ws_ticket(ticket, gameId).data, get_ws_codec(ws))
+
+@game_router.websocket("/watch/{gameId}")
+async def watch_game(ws: WebSocket, gameId: str):
+    await accept_websocket(ws)
+    if not gm.game_exists(gameId):
+        await ws.close(reason=GameError.GAME_NOT_FOUND)
+        return
+    game = get_game(gameId)
+    if not await game.actor.call(game.can_watch):
+        await ws.close(reason=GameError.AUDIENCE_FULL if await game.actor.call(game.can_play) else GameError.GAME_NOT_OPEN)
+        return
+    await game.watch(ws, get_ws_codec(ws))
 
 tmd_ctr = 0
 
@@ -389,4 +644,4 @@ app.include_router(main_router)
 app.include_router(game_router)
 
 if __name__ == "__main__":
-    uvicorn.run(app)
\ No newline at end of file
+    uvicorn.run(app, **config.uvicorn_kwargs())
\ No newline at end of file
@@ -0,0 +1,42 @@
+'''Token buckets limiting how fast a connection can send each message type
+(see `Game.ws_receiver()`).'''
+import time
+
+from typing import Dict, List
+
+# message type -> [messages per second, burst], the "*" bucket is charged for
+# every frame (before it's decoded), types without their own limit only
+# count against it
+RateLimits = Dict[str, List[float]]
+ANY_FRAME = "*"
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        '''Takes a token if there's one, returns whether it did.'''
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class RateLimiter:
+    '''A connection's buckets, created the first time a type is sent.'''
+    def __init__(self, limits: RateLimits) -> None:
+        self.limits = limits
+        self.buckets: Dict[str, TokenBucket | None] = {}
+
+    def allow(self, type: str, now: float | None = None) -> bool:
+        '''Takes a token from `type`'s bucket, types without a limit are
+        always allowed.'''
+        if type not in self.buckets:
+            limit = self.limits.get(type)
+            self.buckets[type] = TokenBucket(*limit) if limit else None
+        bucket = self.buckets[type]
+        return bucket is None or bucket.take(time.monotonic() if now is None else now)
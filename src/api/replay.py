@@ -0,0 +1,113 @@
+'''Replays game journals (see `journal.py`).
+
+Used by `GameManager` to recover games after a crash, and offline to replay
+real games as benchmarks against the current code:
+
+    python replay.py journals/<journal dir> [repeat]
+'''
+import sys
+import time
+import anyio
+import datetime
+
+from typing import Any, Dict, Iterable, Tuple, Type
+from broadcaster import Broadcast
+from terminal import Terminal
+from game import Game, VirtualClock, MessageSchema
+from player import Player
+from journal import Journal
+
+class ReplayClock(VirtualClock):
+    '''Time jumps to each record's timestamp as it is replayed. Sleeps return
+    immediately since timer fires are replayed from the journal instead.'''
+
+    def set_time(self, t: float) -> None:
+        with self._lock:
+            self._now = max(self._now, t)
+
+    async def sleep(self, seconds: float) -> None:
+        await anyio.sleep(0)
+
+class NullWebSocket:
+    '''Stands in for the sender's websocket while replaying, replies are dropped.'''
+
+    async def send_text(self, data: str) -> None:
+        ...
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        ...
+
+def create_replay_clock(records: list[dict[str, Any]]) -> ReplayClock:
+    return ReplayClock(datetime.datetime.fromtimestamp(records[0]["t"]))
+
+async def replay(game: Game, records: Iterable[dict[str, Any]]) -> Dict[str, str | int]:
+    '''Applies `records` to `game` (which should be fresh, seeded with the
+    journal's seed and using a `ReplayClock`). Returns the ws tickets issued
+    during the game.'''
+    game.timers_armed = False
+    ws = NullWebSocket()
+    tickets: Dict[str, str | int] = {}
+    for r in records:
+        game.clock.set_time(r["t"])
+        kind = r["k"]
+        if kind == "meta":
+            game.id = r["id"]
+            game.gameId = r["id"]
+            game.load_public_config(r["config"])
+        elif kind == "join":
+            game.join(Player(**r["player"]))
+        elif kind == "leave":
+            game.leave(r["username"])
+        elif kind == "ticket":
+            tickets[r["ticket"]] = r["username"]
+        elif kind == "msg":
+            username = r["username"]
+            author = 0 if username == 0 else game.get_player(username).data
+            await game.process_message(ws, MessageSchema(type=r["type"], value=r["value"], author=author), username)
+        elif kind == "audience":
+            await game.process_audience_message(ws, MessageSchema.model_construct(type=r["type"], value=r["value"], author=None), r["member"])
+        elif kind == "timer":
+            await game.replay_timer(r["callback"], r["args"])
+        elif kind == "restart":
+            game.shift_deadlines(r["t"] - r["taken_at"])
+    return tickets
+
+async def restore_from_journal(cls: Type[Game], b: Broadcast, t: Terminal, path: str, fsync_interval: float) -> Tuple[Game, Dict[str, str | int]]:
+    '''Replays the journal at `path` onto a fresh `cls`, then moves the result
+    onto the real clock (paused for the downtime) and keeps journaling to
+    `path`. Returns the game, still to be started and resumed, and its tickets.'''
+    records = list(Journal.read(path))
+    meta = records[0]
+    replayed = cls(b, t, clock=create_replay_clock(records), seed=meta["seed"])
+    tickets = await replay(replayed, records)
+    # Spilled images in the snapshot are arena handles, their references
+    # are handed over to the restored game along with the state
+    data = replayed.snapshot()
+    g = cls(b, t, seed=meta["seed"])
+    g.restore(data)
+    g.journal = Journal(path, fsync_interval)
+    g.record("restart", taken_at=data["taken_at"])
+    return g, tickets
+
+async def main() -> None:
+    from main import game_name_map, GameName
+    from terminal import Terminal, TerminalOpts
+    from broadcaster import Broadcast
+
+    path = sys.argv[1]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    records = list(Journal.read(path))
+    name = GameName(records[0]["name"])
+    t = Terminal(TerminalOpts(can_log=False, can_info=False, can_debug=False, can_warn=False))
+    b = Broadcast("memory://")
+    start = time.perf_counter()
+    for _ in range(repeat):
+        g = game_name_map[name](b, t, clock=create_replay_clock(records), seed=records[0]["seed"])
+        await replay(g, records)
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {len(records)} records x{repeat} in {elapsed:.3f}s "
+          f"({repeat * len(records) / elapsed:.0f} records/s, {repeat / elapsed:.1f} games/s)")
+    print(f"Final standings: {[(p.username, p.points) for p in g.get_player_list()]}")
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -0,0 +1,167 @@
+'''Moves large frames between the API and game worker processes (see
+`workers.py`) through shared memory instead of pickling them down a pipe.
+
+Each direction has a `ShmRing`, the pipe only carries a reference to where
+a frame was written. Compare the two on frames of different sizes:
+
+    python shmring.py [frames]
+'''
+import sys
+import time
+import struct
+import multiprocessing
+
+from typing import Any, Tuple
+from multiprocessing.shared_memory import SharedMemory
+
+# Frames smaller than this are cheaper to send down the pipe
+SHM_MIN_SIZE = 64 * 1024 # bytes
+# Bytes the reader has consumed so far, the ring's data starts after it
+HEADER = struct.Struct("Q")
+DATA_OFFSET = 64
+
+# (position, length, is text) of a frame in a ring
+FrameRef = Tuple[int, int, bool]
+
+class ShmRing:
+    '''A byte ring in shared memory with one writer and one reader, who read
+    frames in the order they were written.
+
+    Positions only grow (they're taken modulo the ring's size), the reader
+    stores how far it has read in the header so the writer knows which
+    space it can reuse.'''
+    def __init__(self, shm: SharedMemory, owner: bool) -> None:
+        self.shm = shm
+        self.owner = owner
+        self.capacity = shm.size - DATA_OFFSET
+        self.written = 0
+
+    @classmethod
+    def create(cls, size: int) -> "ShmRing":
+        return cls(SharedMemory(create=True, size=size + DATA_OFFSET), True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ShmRing":
+        '''Only the creator unlinks the segment. Spawned processes share their
+        parent's resource tracker, so attaching doesn't track it twice.'''
+        return cls(SharedMemory(name), False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def consumed(self) -> int:
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def write(self, data: bytes) -> int | None:
+        '''Copies `data` into the ring and returns its position, `None` if
+        the reader hasn't freed up enough space.'''
+        n = len(data)
+        if n > self.capacity - (self.written - self.consumed()):
+            return None
+        pos = self.written
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        buf = self.shm.buf
+        buf[DATA_OFFSET + start:DATA_OFFSET + start + first] = data[:first]
+        if first < n:
+            buf[DATA_OFFSET:DATA_OFFSET + n - first] = data[first:]
+        self.written += n
+        return pos
+
+    def read(self, pos: int, n: int) -> bytes:
+        '''Copies a frame out of the ring and frees its space (and the space
+        of any frame before it).'''
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        buf = self.shm.buf
+        data = bytes(buf[DATA_OFFSET + start:DATA_OFFSET + start + first])
+        if first < n:
+            data += bytes(buf[DATA_OFFSET:DATA_OFFSET + n - first])
+        HEADER.pack_into(buf, 0, pos + n)
+        return data
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class FrameWriter:
+    '''Packs frames to send down the pipe: large ones are written to the ring
+    and sent as a `FrameRef`, the same frame sent again right after (one
+    message for several clients) only as `("again", position)`. Frames the
+    ring has no room for are pickled like small ones.'''
+    def __init__(self, ring: ShmRing) -> None:
+        self.ring = ring
+        # (frame, its ref) of the last frame written to the ring
+        self.last: Tuple[str | bytes, FrameRef] | None = None
+        # shm frames, shm bytes, repeated frames, large frames pickled
+        self.stats = [0, 0, 0, 0]
+
+    def pack(self, data: str | bytes) -> Any:
+        if len(data) < SHM_MIN_SIZE:
+            return data
+        if self.last and self.last[0] is data:
+            self.stats[2] += 1
+            return ("again", self.last[1][0])
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        pos = self.ring.write(raw)
+        if pos is None:
+            self.stats[3] += 1
+            return data
+        self.stats[0] += 1
+        self.stats[1] += len(raw)
+        self.last = (data, (pos, len(raw), isinstance(data, str)))
+        return self.last[1]
+
+class FrameReader:
+    '''Unpacks what a `FrameWriter` packed, every packed frame must be
+    unpacked (in order) even if it's then dropped.'''
+    def __init__(self, ring: ShmRing) -> None:
+        self.ring = ring
+        self.last: Tuple[int, str | bytes] | None = None
+
+    def unpack(self, packed: Any) -> str | bytes:
+        if not isinstance(packed, tuple):
+            return packed
+        if packed[0] == "again":
+            return self.last[1]
+        pos, n, text = packed
+        raw = self.ring.read(pos, n)
+        data = raw.decode("utf-8") if text else raw
+        self.last = (pos, data)
+        return data
+
+def echo(conn, name: str) -> None:
+    reader = FrameReader(ShmRing.attach(name))
+    while (packed := conn.recv()) is not None:
+        conn.send(len(reader.unpack(packed)))
+    reader.ring.close()
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ctx = multiprocessing.get_context("spawn")
+    ring = ShmRing.create(64 * 1024 * 1024)
+    conn, child = ctx.Pipe()
+    p = ctx.Process(target=echo, args=(child, ring.name))
+    p.start()
+    writer = FrameWriter(ring)
+    conn.send(b"") # wait for the child to start
+    conn.recv()
+    print(f"{'frame KB':>9}{'pipe us':>10}{'shm us':>10}")
+    for size in (64, 256, 1024, 4096):
+        data = "x" * (size * 1024)
+        row = []
+        for pack in (lambda d: d, writer.pack):
+            start = time.perf_counter()
+            for i in range(frames):
+                conn.send(pack(data[:-1] + str(i % 10))) # a new frame each time
+                conn.recv()
+            row.append((time.perf_counter() - start) / frames * 1e6)
+        print(f"{size:>9}" + "".join(f"{v:>10.0f}" for v in row))
+    conn.send(None)
+    p.join()
+    ring.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+
+from typing import Any, Dict, Iterable, Tuple
+from utils import file_exists
+from arena import image_arena, is_handle, HANDLE_PREFIX
+
+BLOB_KEY = "$blob"
+BLOB_PREFIX = "data:"
+
+def write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, mode="wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class BlobStore:
+    '''Content-addressed storage for data URIs (drawings, avatars, placeholders).
+
+    Each distinct data URI is written once, keyed by its hash, and referenced
+    from snapshots/journals as `{"$blob": <hash>}` (see `dehydrate()`/`hydrate()`).'''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._known: set[str] = set(n for n in os.listdir(path) if not n.endswith(".tmp"))
+
+    def put(self, h: str, data: str) -> None:
+        if h not in self._known:
+            write_atomic(os.path.join(self.path, h), data.encode("utf-8"))
+            self._known.add(h)
+
+    def get(self, h: str) -> str:
+        with open(os.path.join(self.path, h), mode="r") as f:
+            return f.read()
+
+    def dehydrate(self, obj: Any, blobs: Dict[str, str], refs: set[str] | None = None) -> Any:
+        '''Replaces every data URI (or image arena handle) in `obj` with a blob
+        reference. Blobs that aren't on disk yet are added to `blobs`, every
+        referenced blob to `refs` (if given).'''
+        if is_handle(obj):
+            # Arena handles are already keyed by the data's hash, only page
+            # the image in if it has never been written
+            h = obj.removeprefix(HANDLE_PREFIX)
+            if h not in self._known:
+                blobs[h] = image_arena.get(obj)
+            if refs is not None:
+                refs.add(h)
+            return {BLOB_KEY: h}
+        if isinstance(obj, str) and obj.startswith(BLOB_PREFIX):
+            h = hashlib.sha256(obj.encode("utf-8")).hexdigest()
+            if h not in self._known:
+                blobs[h] = obj
+            if refs is not None:
+                refs.add(h)
+            return {BLOB_KEY: h}
+        if isinstance(obj, dict):
+            return {k: self.dehydrate(v, blobs, refs) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple, set)):
+            return [self.dehydrate(v, blobs, refs) for v in obj]
+        return obj
+
+    def hydrate(self, obj: Any) -> Any:
+        '''Inverse of `dehydrate()`.'''
+        if isinstance(obj, dict):
+            if len(obj) == 1 and BLOB_KEY in obj:
+                return self.get(obj[BLOB_KEY])
+            return {k: self.hydrate(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self.hydrate(v) for v in obj]
+        return obj
+
+    def prune(self, keep: Iterable[str]) -> None:
+        '''Deletes every blob not in `keep`.'''
+        keep = set(keep)
+        for h in list(self._known):
+            if h not in keep:
+                os.remove(os.path.join(self.path, h))
+                self._known.remove(h)
+
+
+def collect_blob_refs(obj: Any, refs: set[str]) -> None:
+    '''Adds the hash of every blob referenced in `obj` to `refs`.'''
+    if isinstance(obj, dict):
+        if len(obj) == 1 and BLOB_KEY in obj:
+            refs.add(obj[BLOB_KEY])
+            return
+        for v in obj.values():
+            collect_blob_refs(v, refs)
+    elif isinstance(obj, list):
+        for v in obj:
+            collect_blob_refs(v, refs)
+
+
+class SnapshotStore:
+    '''Persists game snapshots on local disk so live games survive a restart.
+
+    Every game is a single JSON file which is only rewritten when its contents
+    changed since the last write. Data URIs are kept out-of-line in a `BlobStore`,
+    blobs no stored snapshot references any more are deleted by `prune_blobs()`.
+
+    `encode()` should be called wherever the game state lives (it reads the
+    live objects), `write()` only touches the disk and can be offloaded.'''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.blobs = BlobStore(os.path.join(path, "blobs"))
+        self._written: Dict[str, str] = {}
+        # key -> blobs the stored snapshot references
+        self._refs: Dict[str, set[str]] = {}
+        # Set when a snapshot was removed and its blobs may be orphaned
+        self.needs_prune = False
+
+    def _game_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def encode(self, data: Dict[str, Any]) -> Tuple[bytes, Dict[str, str], set[str]]:
+        '''Returns the encoded snapshot, the blobs it needs written and every
+        blob it references.'''
+        blobs: Dict[str, str] = {}
+        refs: set[str] = set()
+        raw = json.dumps(self.blobs.dehydrate(data, blobs, refs)).encode("utf-8")
+        return raw, blobs, refs
+
+    def write(self, key: str, raw: bytes, blobs: Dict[str, str], refs: set[str]) -> bool:
+        '''Writes an `encode()`d snapshot under `key` if it changed since the
+        last write. Returns `True` if the file was written.'''
+        digest = hashlib.sha256(raw).hexdigest()
+        self._refs[key] = refs
+        if self._written.get(key) == digest:
+            return False
+        for h, data in blobs.items():
+            self.blobs.put(h, data)
+        write_atomic(self._game_path(key), raw)
+        self._written[key] = digest
+        return True
+
+    def remove(self, key: str) -> None:
+        self._written.pop(key, None)
+        self._refs.pop(key, None)
+        self.needs_prune = True
+        if file_exists(self._game_path(key)):
+            os.remove(self._game_path(key))
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        '''Returns every stored snapshot (hydrated), keyed by its key.'''
+        snapshots = {}
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self.path, name), mode="r") as f:
+                raw = f.read()
+            key = name.removesuffix(".json")
+            self._written[key] = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+            data = json.loads(raw)
+            self._refs[key] = set()
+            collect_blob_refs(data, self._refs[key])
+            snapshots[key] = self.blobs.hydrate(data)
+        return snapshots
+
+    def prune_blobs(self) -> None:
+        '''Deletes every blob no stored snapshot references. Snapshots are
+        known by their last `load_all()`/`write()`, so this is only
+        accurate once stored snapshots have been loaded.'''
+        self.needs_prune = False
+        refs: set[str] = set()
+        for key_refs in list(self._refs.values()):
+            refs |= key_refs
+        self.blobs.prune(refs)
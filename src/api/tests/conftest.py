@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from broadcaster import Broadcast
+from terminal import Terminal, TerminalOpts
+from player import create_player
+from game import VirtualClock
+
+class FakeSocket:
+    '''Records the (JSON) frames a game sends it.'''
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data: bytes) -> None:
+        raise AssertionError("expected text frames")
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def terminal() -> Terminal:
+    return Terminal(TerminalOpts(can_log=False, can_info=False, can_debug=False, can_warn=False))
+
+@pytest.fixture
+def clock() -> VirtualClock:
+    return VirtualClock()
+
+@pytest.fixture
+def make_champdup(terminal, clock):
+    '''Creates a ChampdUp on the virtual clock (or `game_clock`) with `players` joined.'''
+    from games.champdup import ChampdUp
+    def make(players: int = 4, game_clock: VirtualClock | None = None, **public):
+        g = ChampdUp(Broadcast("memory://"), terminal, clock=game_clock or clock, seed=1)
+        g.config.public = {**g.config.public, "max_players": max(players, 3), **public}
+        g.config.private = {**g.config.private, "rate_limits": {}}
+        g.max_players = g.config.public["max_players"]
+        for i in range(players):
+            g.join(create_player(f"p{i}", 0, "#fff"))
+        return g
+    return make
@@ -0,0 +1,106 @@
+import pytest
+
+from player import create_player
+from game import MessageSchema
+from games.champdup import Image, MessageType, PlayerImageStore
+from conftest import FakeSocket
+
+def make_image(title: str, artist, dUri: str = "data:image/png;base64,AAAA") -> Image:
+    return Image(title=title, dUri=dUri, artists=[artist], prompt="a prompt")
+
+def test_identical_images_resolve_to_their_own_player():
+    store = PlayerImageStore()
+    alice, bob = create_player("alice", 0, "#fff"), create_player("bob", 0, "#fff")
+    alices, bobs = make_image("alice's", alice), make_image("bob's", bob)
+    store.add_plr_img(alice, alices, "D1")
+    store.add_plr_img(bob, bobs, "D1")
+    h = alices.data_hash()
+    assert h == bobs.data_hash()
+    assert store.get_plr_image_from_hash("alice", h) is alices
+    assert store.get_plr_image_from_hash("bob", h) is bobs
+    assert store.get_plr_image_from_hash("carol", h) is None
+
+def test_swap_lookup_forgets_resubmitted_images():
+    store = PlayerImageStore()
+    alice = create_player("alice", 0, "#fff")
+    first = make_image("first", alice, "data:image/png;base64,AAAA")
+    second = make_image("second", alice, "data:image/png;base64,BBBB")
+    store.add_plr_img(alice, first, "D1")
+    store.add_plr_img(alice, second, "D1")
+    assert store.get_plr_image_from_hash("alice", first.data_hash()) is None
+    assert store.get_plr_image_from_hash("alice", second.data_hash()) is second
+
+def test_swap_candidates_are_references_until_resubmitted():
+    store = PlayerImageStore()
+    alice = create_player("alice", 0, "#fff")
+    first = make_image("first", alice, "data:image/png;base64,AAAA")
+    store.add_plr_img(alice, first, "D1")
+    store.add_plr_img(alice, make_image("drawn later", alice, "data:image/png;base64,CCCC"), "D2")
+    assert store.get_swap_candidates(alice, ["D2"]) == [(first.data_hash(), "first")]
+    second = make_image("second", alice, "data:image/png;base64,BBBB")
+    store.add_plr_img(alice, second, "D1")
+    assert store.get_swap_candidates(alice, ["D2"]) == [(second.data_hash(), "second")]
+
+def start_batch(g, width: int):
+    '''Pairs up the players' drawings into matchups and opens voting on the
+    first `width` of them.'''
+    mm = g.matchup_manager
+    artists = [g.players[u] for u in sorted(g.players)]
+    for left, right in zip(artists[::2], artists[1::2]):
+        mm.add_matchup(make_image(left.username, left), make_image(right.username, right))
+    mm.width = width
+    mm.next_matchup()
+    mm.assign_voters(list(g.players))
+    mm.enable_voting()
+    return mm
+
+@pytest.mark.anyio
+async def test_audience_votes_go_to_the_matchup_they_name(make_champdup, clock):
+    g = make_champdup(8)
+    mm = start_batch(g, 2)
+    ws = FakeSocket()
+    async def vote(value, member: str) -> None:
+        # Past the last tally, so it's broadcast without waiting
+        clock.advance(1)
+        await g.process_audience_message(ws, MessageSchema(type=MessageType.MATCHUP_VOTE, value=value, author=0), member)
+    await vote("left", "a1")
+    await vote({"vote": "right", "idx": 1}, "a2")
+    # Matchups outside the batch can't be voted on
+    await vote({"vote": "right", "idx": 2}, "a3")
+    assert mm.matchups[0]._audience.count("left") == 1
+    assert mm.matchups[1]._audience.count("right") == 1
+    assert mm.matchups[2]._audience.count("right") == 0
+    acks = [m["value"] for m in ws.sent if m["type"] == "VOTE_ACK"]
+    assert [(a["vote"], a["idx"]) for a in acks] == [("left", 0), ("right", 1)]
+
+def vote(mm, idx: int, target: str, *usernames: str) -> None:
+    for username in usernames:
+        mm.matchups[idx].add_vote(username, target)
+
+def test_parallel_matchups_score_as_if_the_whole_room_voted(make_champdup):
+    parallel = make_champdup(8)
+    mm = start_batch(parallel, 2)
+    # Each matchup's artists see it, the 4 other players are split between them
+    assert [mm.assignments[u] for u in sorted(mm.assignments)] == [0, 0, 1, 1, 0, 1, 0, 1]
+    assert mm.vote_scale(0, 8) == mm.vote_scale(1, 8) == 3
+    vote(mm, 0, "left", "p4", "p6")
+    vote(mm, 1, "left", "p5")
+    vote(mm, 1, "right", "p7")
+    parallel.event_idx = 2 # V1
+    parallel.score_matchup(0)
+    parallel.score_matchup(1)
+
+    # The same votes, scaled up to everyone but the artists voting on one matchup at a time
+    whole_room = make_champdup(8)
+    mm = start_batch(whole_room, 1)
+    assert mm.vote_scale(0, 8) == 1
+    vote(mm, 0, "left", "p2", "p3", "p4", "p5", "p6", "p7")
+    vote(mm, 1, "left", "p0", "p1", "p4")
+    vote(mm, 1, "right", "p5", "p6", "p7")
+    whole_room.event_idx = 2
+    whole_room.score_matchup(0)
+    whole_room.score_matchup(1)
+
+    points = lambda g: {u: p.points for u, p in g.players.items()}
+    assert points(parallel) == points(whole_room)
+    assert points(parallel)["p0"] > points(parallel)["p2"] > points(parallel)["p3"] > 0
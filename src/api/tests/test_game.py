@@ -0,0 +1,158 @@
+import anyio
+import pytest
+
+from broadcaster import Broadcast
+from game import MessageSchema, ProcessedMessage, AUDIENCE_QUEUE_SIZE
+from games.test import MyCustomGame
+from conftest import FakeSocket
+
+class TickGame(MyCustomGame):
+    '''VOTE replies and broadcasts a tally, NEXT moves to the next phase and
+    publishes it straight away.'''
+    coalesced_types = {"TALLY"}
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.phase = 0
+        self.votes = 0
+
+    def get_phase(self):
+        return self.phase
+
+    async def process_host_message(self, ws, msg, username) -> ProcessedMessage:
+        pm = ProcessedMessage()
+        if msg.type == "VOTE":
+            self.votes += 1
+            pm.add_msg("ACK", self.votes, 0)
+            pm.add_broadcast("TALLY", self.votes, 0)
+        elif msg.type == "NEXT":
+            self.phase += 1
+            await self.publish("STATE", self.phase, 0)
+        elif msg.type == "LATER":
+            # Two broadcasts, then moves on a second later
+            pm.add_broadcast("TALLY", self.votes, 0)
+            pm.add_broadcast("TALLY", self.votes + 1, 0)
+            pm.set_action(lambda: setattr(self, "phase", self.phase + 1))
+            pm.set_action_delay(1)
+        return pm
+
+def frames(ws: FakeSocket) -> list[tuple]:
+    return [(m["type"], m["value"]) for m in ws.sent]
+
+@pytest.fixture
+def tick_game(terminal, clock):
+    g = TickGame(Broadcast("memory://"), terminal, clock=clock, seed=1)
+    g.ws_map = {0: FakeSocket(), "p": FakeSocket()}
+    return g
+
+@pytest.mark.anyio
+async def test_tick_frames_keep_their_order_across_a_phase_change(tick_game):
+    host, player = tick_game.ws_map[0], tick_game.ws_map["p"]
+    batch = [
+        (host, MessageSchema(type=t, value=None, author=0), 0, tick_game.process_message)
+        for t in ("VOTE", "NEXT", "VOTE")
+    ]
+    await tick_game.process_tick(batch)
+    # The first tally is superseded by the second, everything else is in order
+    assert frames(host) == [("ACK", 1), ("STATE", 1), ("ACK", 2), ("TALLY", 2)]
+    assert frames(player) == [("STATE", 1), ("TALLY", 2)]
+
+@pytest.mark.anyio
+async def test_tick_drops_coalesced_broadcasts_of_a_past_phase(tick_game):
+    host, player = tick_game.ws_map[0], tick_game.ws_map["p"]
+    batch = [
+        (host, MessageSchema(type=t, value=None, author=0), 0, tick_game.process_message)
+        for t in ("VOTE", "VOTE", "NEXT")
+    ]
+    await tick_game.process_tick(batch)
+    assert frames(host) == [("ACK", 1), ("ACK", 2), ("STATE", 1)]
+    assert frames(player) == [("STATE", 1)]
+
+@pytest.mark.anyio
+async def test_mailbox_processes_a_tick_in_arrival_order(tick_game, clock):
+    tick_game.config.private = {**tick_game.config.private, "mailbox_tick": 0.5}
+    host, player = tick_game.ws_map[0], tick_game.ws_map["p"]
+    async with anyio.create_task_group() as tg:
+        for t in ("VOTE", "NEXT", "VOTE", "VOTE"):
+            tg.start_soon(tick_game.enqueue_message, host, MessageSchema(type=t, value=None, author=0), 0, tick_game.process_message)
+            await anyio.sleep(0)
+        # Everything waits for the tick
+        await anyio.sleep(0.01)
+        assert host.sent == [] and len(tick_game.mailbox) == 4
+        clock.advance(0.5)
+    assert frames(host) == [("ACK", 1), ("STATE", 1), ("ACK", 2), ("ACK", 3), ("TALLY", 3)]
+    assert frames(player) == [("STATE", 1), ("TALLY", 3)]
+    assert tick_game.mailbox == [] and not tick_game.mailbox_draining
+
+class StuckSocket(FakeSocket):
+    '''A connection that never takes a frame.'''
+    async def send_text(self, data: str) -> None:
+        await anyio.sleep_forever()
+
+@pytest.mark.anyio
+async def test_slow_audience_members_have_frames_dropped(tick_game):
+    fast, slow = FakeSocket(), StuckSocket()
+    async with anyio.create_task_group() as tg:
+        for member, ws in (("fast", fast), ("slow", slow)):
+            queue, outgoing = anyio.create_memory_object_stream(AUDIENCE_QUEUE_SIZE)
+            tick_game.connect_audience(ws, member, None, queue)
+            tg.start_soon(tick_game.audience_sender, ws, outgoing)
+        with anyio.fail_after(1):
+            for i in range(2 * AUDIENCE_QUEUE_SIZE):
+                await tick_game.publish_to_audience(MessageSchema(type="TALLY", value=i, author=0))
+                await anyio.sleep(0)
+        await anyio.sleep(0.01)
+        assert frames(fast) == [("STATE", frames(fast)[0][1])] + [("TALLY", i) for i in range(2 * AUDIENCE_QUEUE_SIZE)]
+        # The slow member's sender is stuck on its first frame (the state)
+        # and its queue is full, the rest was dropped
+        assert tick_game.audience_dropped == 2 * AUDIENCE_QUEUE_SIZE - AUDIENCE_QUEUE_SIZE
+        for member, ws in (("fast", fast), ("slow", slow)):
+            tick_game.close_audience(ws, member)
+        tg.cancel_scope.cancel()
+    assert tick_game.audience == {} and tick_game.audience_queues == {}
+
+class FloodSocket(FakeSocket):
+    '''Receives `frames`, then disconnects.'''
+    def __init__(self, frames: list[str]) -> None:
+        super().__init__()
+        self.frames = frames
+
+    async def receive(self) -> dict:
+        if not self.frames:
+            return {"type": "websocket.disconnect"}
+        return {"type": "websocket.receive", "text": self.frames.pop(0)}
+
+@pytest.mark.anyio
+async def test_frames_are_rate_limited_before_they_are_decoded(tick_game):
+    tick_game.config.private = {**tick_game.config.private, "rate_limits": {"*": [0, 3], "VOTE": [0, 1]}}
+    decoded, processed = [], []
+    parse_message = tick_game.parse_message
+    tick_game.parse_message = lambda data, *args: decoded.append(data) or parse_message(data, *args)
+    async def process(ws, msg, username) -> None:
+        processed.append(msg.type)
+    vote, nxt = '{"type": "VOTE", "value": null, "author": 0}', '{"type": "NEXT", "value": null, "author": 0}'
+    ws = FloodSocket([vote, vote, nxt, nxt, vote])
+    await tick_game.ws_receiver(ws, "ws", 0, process)
+    # Past the "*" burst nothing is decoded, the second VOTE is decoded but over its own limit
+    assert len(decoded) == 3
+    assert processed == ["VOTE", "NEXT"]
+    assert tick_game.drop_stats == {"*": 2, "VOTE": 1}
+
+@pytest.mark.anyio
+async def test_delayed_broadcasts_and_actions_leave_the_actor_free(tick_game, clock):
+    host = tick_game.ws_map[0]
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(tick_game.actor.run)
+        await anyio.sleep(0.01)
+        with anyio.fail_after(1):
+            await tick_game.actor.call(tick_game.process_message, host, MessageSchema(type="LATER", value=None, author=0), 0)
+            # Processed while the second broadcast and the action wait
+            await tick_game.actor.call(tick_game.process_message, host, MessageSchema(type="VOTE", value=None, author=0), 0)
+        assert frames(host) == [("TALLY", 0), ("ACK", 1), ("TALLY", 1)]
+        clock.advance(0.05)
+        await anyio.sleep(0.01)
+        assert frames(host)[-1] == ("TALLY", 1) and len(host.sent) == 4 and tick_game.phase == 0
+        clock.advance(1)
+        await anyio.sleep(0.01)
+        assert tick_game.phase == 1
+        tick_game.actor.stop()
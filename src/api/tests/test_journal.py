@@ -0,0 +1,91 @@
+import os
+import json
+
+import pytest
+
+from journal import Journal, JOURNAL_FILE, HEADER
+from replay import replay, create_replay_clock, NullWebSocket
+from game import MessageSchema
+from games.champdup import Image, MessageType
+
+AVATAR = "data:image/png;base64,AAAA"
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path / "j")
+    j = Journal(path)
+    j.append("join", 0.5, player={"username": "alice", "avatar_data_url": AVATAR})
+    j.append("join", 1.0, player={"username": "bob", "avatar_data_url": AVATAR})
+    j.append("msg", 2.0, username=0, type="CHAT", value={"1": [1, 2]})
+    j.close(wait=True)
+    records = list(Journal.read(path))
+    assert [r["k"] for r in records] == ["join", "join", "msg"]
+    assert records[1]["player"]["avatar_data_url"] == AVATAR
+    assert records[2] == {"k": "msg", "t": 2.0, "username": 0, "type": "CHAT", "value": {"1": [1, 2]}}
+    # Both avatars are the same blob
+    assert len(os.listdir(os.path.join(path, "blobs"))) == 1
+    assert Journal.list_open(str(tmp_path)) == [path]
+
+def test_appends_after_close_are_dropped(tmp_path):
+    path = str(tmp_path / "j")
+    j = Journal(path)
+    j.append("end", 1.0)
+    j.close()
+    j.append("msg", 2.0)
+    j.close(wait=True)
+    assert [r["k"] for r in Journal.read(path)] == ["end"]
+    assert Journal.list_open(str(tmp_path)) == []
+
+def test_torn_record_is_dropped_on_reopen(tmp_path):
+    path = str(tmp_path / "j")
+    j = Journal(path)
+    j.append("join", 1.0, username="alice")
+    j.close(wait=True)
+    with open(os.path.join(path, JOURNAL_FILE), mode="ab") as f:
+        f.write(HEADER.pack(100) + b"\x81")
+    j = Journal(path)
+    j.append("leave", 2.0, username="alice")
+    j.close(wait=True)
+    assert [r["k"] for r in Journal.read(path)] == ["join", "leave"]
+
+def test_reads_json_journals(tmp_path):
+    path = tmp_path / "j"
+    path.mkdir()
+    payload = json.dumps({"k": "end", "t": 1.0}).encode("utf-8")
+    (path / JOURNAL_FILE).write_bytes(HEADER.pack(len(payload)) + payload)
+    assert list(Journal.read(str(path))) == [{"k": "end", "t": 1.0}]
+
+def test_path_strokes_are_journaled_without_the_canvas(make_champdup):
+    g = make_champdup()
+    msg = MessageSchema(type=MessageType.PATH, value={"path": [[0, 0], [1, 1]], "dUri": AVATAR}, author=0)
+    assert g.journaled_value(msg) == {"path": [[0, 0], [1, 1]], "dUri": ""}
+    assert msg.value["dUri"] == AVATAR
+
+def open_matchup(g) -> None:
+    '''Opens voting on p0's drawing against p1's.'''
+    mm = g.matchup_manager
+    mm.add_matchup(*(Image(title=u, dUri=AVATAR, artists=[g.players[u]], prompt="a prompt") for u in ("p0", "p1")))
+    mm.next_matchup()
+    mm.enable_voting()
+    g.event_idx = 2 # V1
+
+@pytest.mark.anyio
+async def test_replaying_a_journal_brings_back_the_votes(tmp_path, make_champdup, clock):
+    path = str(tmp_path / "j")
+    g = make_champdup()
+    open_matchup(g)
+    g.journal = Journal(path)
+    ws = NullWebSocket()
+    for username, value in (("p2", "left"), ("p3", "right"), ("p2", "right")):
+        # Past the last tally, so it's broadcast without waiting
+        clock.advance(1)
+        await g.process_message(ws, MessageSchema(type=MessageType.MATCHUP_VOTE, value=value, author=g.players[username]), username)
+    clock.advance(1)
+    await g.process_audience_message(ws, MessageSchema(type=MessageType.MATCHUP_VOTE, value="left", author=0), "a1")
+    g.journal.close(wait=True)
+
+    records = list(Journal.read(path))
+    replayed = make_champdup(game_clock=create_replay_clock(records))
+    open_matchup(replayed)
+    await replay(replayed, records)
+    state = lambda g: [(m.leftVotes, m.rightVotes, m._audience.count("left")) for m in g.matchup_manager.matchups]
+    assert state(replayed) == state(g) == [(set(), {"p2", "p3"}, 1)]
@@ -0,0 +1,76 @@
+import os
+
+import anyio
+import pytest
+
+from snapshot import SnapshotStore
+from player import create_player
+
+AVATAR = "data:image/png;base64,AAAA"
+
+def blob_count(store: SnapshotStore) -> int:
+    return len(os.listdir(store.blobs.path))
+
+def test_blobs_of_removed_snapshots_are_pruned(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.write("a", *store.encode({"avatar": AVATAR, "shared": "data:,shared"}))
+    store.write("b", *store.encode({"shared": "data:,shared"}))
+    assert blob_count(store) == 2
+    store.remove("a")
+    assert store.needs_prune
+    store.prune_blobs()
+    assert blob_count(store) == 1
+    assert store.load_all() == {"b": {"shared": "data:,shared"}}
+
+def test_pruning_after_a_restart_keeps_stored_snapshots_blobs(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.write("a", *store.encode({"avatar": AVATAR}))
+    store = SnapshotStore(str(tmp_path))
+    store.load_all()
+    store.prune_blobs()
+    assert store.load_all() == {"a": {"avatar": AVATAR}}
+
+@pytest.mark.anyio
+async def test_unchanged_games_are_not_snapshotted_again(tmp_path, make_champdup):
+    from main import GameManager, GameName
+    gm = GameManager(SnapshotStore(str(tmp_path)))
+    g = make_champdup(max_players=8)
+    gm.games[g.id] = g
+    gm.names[g.id] = GameName.CHAMPDUP
+    encoded = []
+    encode = gm.store.encode
+    gm.store.encode = lambda data: encoded.append(data) or encode(data)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(g.actor.run)
+        await anyio.sleep(0.01)
+        await gm.snapshot_games()
+        await gm.snapshot_games()
+        assert len(encoded) == 1
+        await g.actor.call(g.join, create_player("p9", 0, "#fff"))
+        await gm.snapshot_games()
+        assert len(encoded) == 2
+        assert "p9" in [p["username"] for p in encoded[1]["game"]["players"]]
+        g.actor.stop()
+
+def test_champdup_scores_the_same_after_a_snapshot_round_trip(tmp_path, make_champdup, terminal, clock):
+    from broadcaster import Broadcast
+    from games.champdup import ChampdUp
+    from test_champdup import start_batch, vote
+    g = make_champdup(8)
+    mm = start_batch(g, 2)
+    vote(mm, 0, "left", "p4")
+    vote(mm, 1, "right", "p5", "p7")
+    g.event_idx = 2 # V1
+    store = SnapshotStore(str(tmp_path))
+    store.write(g.id, *store.encode(g.snapshot()))
+
+    restored = ChampdUp(Broadcast("memory://"), terminal, clock=clock)
+    restored.restore(SnapshotStore(str(tmp_path)).load_all()[g.id])
+    rmm = restored.matchup_manager
+    assert rmm.get_batch() == [0, 1] and rmm.assignments == mm.assignments
+    assert rmm.vote_scale(0, 8) == mm.vote_scale(0, 8)
+    assert [(m.leftVotes, m.rightVotes) for m in rmm.matchups] == [(m.leftVotes, m.rightVotes) for m in mm.matchups]
+    for game in (g, restored):
+        game.score_matchup(0)
+        game.score_matchup(1)
+    assert {u: p.points for u, p in restored.players.items()} == {u: p.points for u, p in g.players.items()}
@@ -0,0 +1,81 @@
+import anyio
+import pytest
+
+import game
+from actor import GameActor
+from games.champdup import Timer
+
+async def settle(clock, seconds: float) -> None:
+    '''Advances the clock and lets woken sleepers and their jobs run.'''
+    clock.advance(seconds)
+    for _ in range(20):
+        await anyio.sleep(0.005)
+
+@pytest.mark.anyio
+async def test_restarting_a_killed_timer_only_fires_the_new_one(terminal, clock):
+    fired = []
+    actor = GameActor("test", terminal)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(actor.run)
+        await anyio.sleep(0.01)
+        timer = Timer("test", terminal, lambda arg: fired.append((arg, clock.time())), clock, actor)
+        start = clock.time()
+        await actor.call(timer.start, start + 0.2, "old")
+        await actor.call(timer.kill)
+        await actor.call(timer.start, start + 1.0, "new")
+        await settle(clock, 0.5)
+        assert fired == []
+        await settle(clock, 0.5)
+        assert fired == [("new", start + 1.0)]
+        assert timer.finished
+        # The killed wait was cancelled, not left sleeping
+        assert not clock.advance_to_next_deadline()
+        actor.stop()
+
+@pytest.mark.anyio
+async def test_killed_timer_never_fires(terminal, clock):
+    fired = []
+    actor = GameActor("test", terminal)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(actor.run)
+        await anyio.sleep(0.01)
+        timer = Timer("test", terminal, lambda: fired.append(True), clock, actor)
+        await actor.call(timer.start, clock.time() + 1)
+        await actor.call(timer.kill)
+        await settle(clock, 2)
+        assert fired == [] and timer.finished
+        actor.stop()
+
+@pytest.mark.anyio
+async def test_threaded_timer_restart_drops_the_old_wait(terminal, clock):
+    fired = []
+    timer = Timer("test", terminal, lambda arg: fired.append(arg), clock)
+    start = clock.time()
+    await timer.start(start + 0.2, "old")
+    timer.kill()
+    await timer.start(start + 1.0, "new")
+    while len(clock._sleepers) < 2:
+        await anyio.sleep(0.005)
+    clock.advance(1)
+    for t in game.task_threads:
+        t.join(5)
+    assert fired == ["new"]
+
+@pytest.mark.anyio
+async def test_virtual_sleepers_wake_in_order_without_threads(clock):
+    woke = []
+    async def sleeper(i: int) -> None:
+        await clock.sleep(1 + i % 3)
+        woke.append(i)
+    async with anyio.create_task_group() as tg:
+        # More than the default thread limiter has tokens for
+        for i in range(300):
+            tg.start_soon(sleeper, i)
+        await anyio.sleep(0.01)
+        assert anyio.to_thread.current_default_thread_limiter().borrowed_tokens == 0
+        clock.advance(1)
+        await anyio.sleep(0.01)
+        assert sorted(woke) == list(range(0, 300, 3))
+        while clock.advance_to_next_deadline():
+            await anyio.sleep(0.01)
+    assert len(woke) == 300 and woke[100:200] == list(range(1, 300, 3))
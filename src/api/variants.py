@@ -0,0 +1,76 @@
+'''Smaller renditions ("variants") of submitted drawings.
+
+Drawings are submitted as full resolution canvas exports, but phones only
+ever show them at thumbnail size and the host's screen well below full
+size. Variants are WebP encoded in a process pool so submissions never wait
+on them, until they're ready images are sent with their full data.'''
+import io
+import base64
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Any, Callable, Dict
+from PIL import Image
+
+VARIANT_SIZES = {
+    "thumb": 256, # phones
+    "display": 800, # the host's screen
+}
+HOST_VARIANT = "display"
+PLAYER_VARIANT = "thumb"
+WEBP_QUALITY = 80
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+def variant_for(context: Dict[str, Any] | None) -> str | None:
+    '''Returns the variant to send given a serialization context (see
+    `Game.get_serialization_context()`), `None` means the full image.'''
+    if not context or "is_host" not in context:
+        return None
+    return HOST_VARIANT if context["is_host"] else PLAYER_VARIANT
+
+def make_variants(dUri: str) -> Dict[str, str]:
+    '''Returns every variant of the image in `dUri` that is smaller than it.
+    Runs in the variant pool.'''
+    header, _, data = dUri.partition(",")
+    if not header.endswith(";base64"):
+        return {}
+    variants = {}
+    with Image.open(io.BytesIO(base64.b64decode(data))) as im:
+        im.load()
+        for name, size in VARIANT_SIZES.items():
+            v = im.copy()
+            v.thumbnail((size, size), Image.LANCZOS)
+            buffered = io.BytesIO()
+            v.save(buffered, format="WEBP", quality=WEBP_QUALITY)
+            encoded = f"data:image/webp;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
+            if len(encoded) < len(dUri):
+                variants[name] = encoded
+    return variants
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a process with live threads (timers, anyio workers) isn't safe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_pool() -> None:
+    '''Waits for the pool's processes to exit, pending renders are dropped.'''
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+def request_variants(dUri: str, callback: Callable[[Dict[str, str]], Any], workers: int = 2) -> None:
+    '''Renders the variants of `dUri` in the background and calls `callback`
+    with them (from a pool thread). Images that fail to render simply keep
+    being sent in full.'''
+    def done(f: Future) -> None:
+        if not f.cancelled() and f.exception() is None:
+            callback(f.result())
+    get_pool(workers).submit(make_variants, dUri).add_done_callback(done)
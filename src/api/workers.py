@@ -0,0 +1,429 @@
+'''Hosts games in worker processes (`game_workers` in `config.json`), so a
+game busy with large images doesn't hold up every other game on the API's
+event loop and GIL.
+
+The API process keeps tickets and terminates websockets. Each worker runs
+its games (on their actors) and is sent their connections' frames and the
+routes' calls over a pipe. Large frames go through shared memory (see
+`shmring.py`). Pipes are written to by a thread on each side, so neither
+process blocks on the other.
+
+Messages to a worker:
+    ("create", request id, game class, game id, game name, public config)
+    ("restore", request id, game class, journal path)
+    ("call", request id, game id, method, args, kwargs)
+    ("open", connection id, game id, "host" | "play" | "watch", username, codec name)
+    ("frame", connection id, packed frame)
+    ("close", connection id)
+    ("stop",)
+and from a worker:
+    ("reply", request id, error, result)
+    ("send", connection id, packed frame)
+    ("close", connection id, code, reason)
+    ("asset", name, asset | None)
+    ("ended", game id)
+'''
+import os
+import json
+import math
+import time
+import queue
+import itertools
+import threading
+import multiprocessing
+import anyio
+import anyio.to_thread
+
+from typing import Any, Callable, Dict, List, Tuple, Type
+from anyio.abc import TaskGroup
+from starlette.websockets import WebSocketDisconnect
+from broadcaster import Broadcast
+from terminal import Terminal, TerminalOpts
+from config import Config
+from globals import CONFIG_PATH, JOURNAL_PATH
+from journal import Journal
+from replay import restore_from_journal
+from player import Player
+from result import Result
+from game import Game, GameStatus
+from codec import Codec, negotiate_codec
+from shmring import ShmRing, FrameWriter, FrameReader
+from variants import shutdown_pool
+import assets
+
+class WorkerError(Exception):
+    '''A call failed in (or couldn't reach) a game worker.'''
+
+class PipeWriter:
+    '''Sends messages down a pipe from a thread of its own, in order.'''
+    def __init__(self, conn, name: str) -> None:
+        self.conn = conn
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def post(self, msg: tuple) -> None:
+        self.queue.put(msg)
+
+    def run(self) -> None:
+        while (msg := self.queue.get()) is not None:
+            try:
+                self.conn.send(msg)
+            except (OSError, EOFError):
+                return
+
+    def close(self) -> None:
+        self.queue.put(None)
+
+async def read_pipe(conn) -> Any:
+    '''Waits for the next message without blocking the event loop.'''
+    await anyio.wait_readable(conn)
+    return conn.recv()
+
+# :: API process
+
+class RemoteActor:
+    '''`GameActor`'s interface for a `RemoteGame`, whose methods already run
+    on the game's actor in its worker.'''
+    async def call(self, fn, *args: Any, **kwargs: Any) -> Any:
+        return await fn(*args, **kwargs)
+
+class RemoteGame:
+    '''Stands in for a game hosted by a worker in the API process, with the
+    methods the routes use.'''
+    journal = None
+
+    def __init__(self, worker: "GameWorker", id: str) -> None:
+        self.worker = worker
+        self.id = id
+        self.actor = RemoteActor()
+
+    async def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        return await self.worker.request("call", self.id, method, args, kwargs)
+
+    async def has_player(self, username: str) -> bool:
+        return await self.call("has_player", username)
+
+    async def join(self, p: Player) -> Result[Player]:
+        return await self.call("join", p)
+
+    async def record(self, kind: str, **data: Any) -> None:
+        await self.call("record", kind, **data)
+
+    async def get_player_list(self) -> List[Player]:
+        return await self.call("get_player_list")
+
+    async def get_leaderboard(self) -> List[Player]:
+        return await self.call("get_leaderboard")
+
+    async def get_status(self) -> GameStatus:
+        return await self.call("get_status")
+
+    async def get_public_config(self) -> Dict[str, Any]:
+        return await self.call("get_public_config")
+
+    async def can_host(self) -> bool:
+        return await self.call("can_host")
+
+    async def can_play(self) -> bool:
+        return await self.call("can_play")
+
+    async def can_watch(self) -> bool:
+        return await self.call("can_watch")
+
+    async def host(self, ws, codec: Codec | None = None) -> None:
+        await self.worker.serve(self.id, "host", ws, 0, codec)
+
+    async def play(self, ws, username: str, codec: Codec | None = None) -> None:
+        await self.worker.serve(self.id, "play", ws, username, codec)
+
+    async def watch(self, ws, codec: Codec | None = None) -> None:
+        await self.worker.serve(self.id, "watch", ws, None, codec)
+
+class GameWorker:
+    '''A worker process (see `WorkerRuntime`) as seen from the API process.'''
+    def __init__(self, index: int, t: Terminal, shm_size: int, on_ended: Callable[[str], None] | None = None) -> None:
+        self.name = f"Game worker {index}"
+        self.t = t
+        # Called with the id of each game that ended and was closed by the worker
+        self.on_ended = on_ended
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child = ctx.Pipe()
+        self.to_worker = ShmRing.create(shm_size)
+        self.from_worker = ShmRing.create(shm_size)
+        # Not a daemon, workers start their own image variant pools
+        self.process = ctx.Process(target=run_worker, args=(child, self.to_worker.name, self.from_worker.name), name=self.name)
+        self.writer = PipeWriter(self.conn, self.name)
+        self.frames = FrameWriter(self.to_worker)
+        self.received = FrameReader(self.from_worker)
+        self.ids = itertools.count()
+        # request id -> [done, error, result]
+        self.requests: Dict[int, list] = {}
+        self.connections: Dict[int, Any] = {}
+        # Ids of the worker's live games
+        self.games: set[str] = set()
+        self.alive = False
+
+    def start(self, task_group: TaskGroup) -> None:
+        self.process.start()
+        self.alive = True
+        task_group.start_soon(self.run)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                msg = await read_pipe(self.conn)
+                if msg[0] == "send":
+                    data = self.received.unpack(msg[2])
+                    ws = self.connections.get(msg[1])
+                    if ws:
+                        try:
+                            await (ws.send_bytes(data) if isinstance(data, bytes) else ws.send_text(data))
+                        except (RuntimeError, WebSocketDisconnect):
+                            pass
+                elif msg[0] == "reply":
+                    request = self.requests.pop(msg[1], None)
+                    if request:
+                        request[1:] = msg[2:]
+                        request[0].set()
+                elif msg[0] == "close":
+                    ws = self.connections.pop(msg[1], None)
+                    if ws:
+                        try:
+                            await ws.close(msg[2], msg[3])
+                        except RuntimeError:
+                            pass
+                elif msg[0] == "ended":
+                    self.games.discard(msg[1])
+                    if self.on_ended:
+                        self.on_ended(msg[1])
+                elif msg[0] == "asset":
+                    if msg[2]:
+                        assets.register_asset(msg[1], msg[2])
+                    else:
+                        assets.unregister_asset(msg[1])
+        except (OSError, EOFError):
+            self.t.error(f"{self.name} exited, its {len(self.games)} games are gone")
+        finally:
+            self.alive = False
+            for request in self.requests.values():
+                request[1] = "worker exited"
+                request[0].set()
+            self.requests.clear()
+
+    async def request(self, *msg: Any) -> Any:
+        if not self.alive:
+            raise WorkerError(f"{self.name} isn't running")
+        id = next(self.ids)
+        request = [anyio.Event(), None, None]
+        self.requests[id] = request
+        self.writer.post((msg[0], id, *msg[1:]))
+        await request[0].wait()
+        if request[1]:
+            raise WorkerError(request[1])
+        return request[2]
+
+    async def create_game(self, cls: Type[Game], id: str, name: str, public_config: Dict[str, Any]) -> Result[RemoteGame]:
+        r = Result()
+        errs = await self.request("create", cls, id, name, public_config)
+        if errs:
+            r.Fail(errs)
+            return r
+        self.games.add(id)
+        r.Ok(RemoteGame(self, id))
+        return r
+
+    async def restore_game(self, cls: Type[Game], path: str) -> Tuple[RemoteGame, Dict[str, str | int]]:
+        '''Has the worker replay and resume the game journaled at `path`,
+        returns it and its tickets.'''
+        id, tickets = await self.request("restore", cls, path)
+        self.games.add(id)
+        return RemoteGame(self, id), tickets
+
+    async def serve(self, game_id: str, kind: str, ws, username: str | int | None, codec: Codec | None) -> None:
+        '''Forwards a client's frames to the game until they disconnect.'''
+        conn_id = next(self.ids)
+        self.connections[conn_id] = ws
+        self.writer.post(("open", conn_id, game_id, kind, username, codec.name if codec else None))
+        try:
+            while True:
+                frame = await ws.receive()
+                if frame["type"] == "websocket.disconnect":
+                    break
+                data = frame["bytes"] if frame.get("bytes") is not None else frame["text"]
+                self.writer.post(("frame", conn_id, self.frames.pack(data)))
+        except (RuntimeError, WebSocketDisconnect):
+            pass
+        finally:
+            self.connections.pop(conn_id, None)
+            self.writer.post(("close", conn_id))
+
+    def stop(self) -> None:
+        '''Lets the worker sync its journals and exit. Its games aren't ended,
+        they're replayed from their journals on the next start.'''
+        self.writer.post(("stop",))
+        self.writer.close()
+        self.process.join(10)
+        if self.process.is_alive():
+            self.process.terminate()
+        shm, repeated, pickled = self.frames.stats[0], self.frames.stats[2], self.frames.stats[3]
+        self.t.log(f"{self.name}: sent {shm} frames through shared memory ({repeated} repeated, {pickled} pickled for lack of room)")
+        self.to_worker.close()
+        self.from_worker.close()
+
+# :: Worker process
+
+class PipeWebSocket:
+    '''A worker's end of a client connection, what `Game` sees as the websocket.'''
+    def __init__(self, runtime: "WorkerRuntime", conn_id: int) -> None:
+        self.runtime = runtime
+        self.conn_id = conn_id
+        self.send_frames, self.receive_frames = anyio.create_memory_object_stream(math.inf)
+        self.closed = False
+
+    async def receive(self) -> Dict[str, Any]:
+        try:
+            data = await self.receive_frames.receive()
+        except anyio.EndOfStream:
+            return {"type": "websocket.disconnect"}
+        if isinstance(data, bytes):
+            return {"type": "websocket.receive", "bytes": data}
+        return {"type": "websocket.receive", "text": data}
+
+    async def send_text(self, data: str) -> None:
+        if self.closed:
+            raise RuntimeError("Connection is closed")
+        self.runtime.writer.post(("send", self.conn_id, self.runtime.frames.pack(data)))
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.send_text(data)
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        if not self.closed:
+            self.closed = True
+            self.runtime.writer.post(("close", self.conn_id, code, reason))
+
+class WorkerRuntime:
+    def __init__(self, conn, to_worker: str, from_worker: str) -> None:
+        self.conn = conn
+        self.config = Config.load_config(CONFIG_PATH)
+        self.t = Terminal(TerminalOpts())
+        self.broadcast = Broadcast("memory://")
+        self.writer = PipeWriter(conn, "API pipe")
+        self.received = FrameReader(ShmRing.attach(to_worker))
+        self.frames = FrameWriter(ShmRing.attach(from_worker))
+        self.games: Dict[str, Game] = {}
+        self.connections: Dict[int, PipeWebSocket] = {}
+        self.task_group: TaskGroup | None = None
+        assets.asset_listener = lambda name, asset: self.writer.post(("asset", name, asset))
+
+    async def run(self) -> None:
+        async with anyio.create_task_group() as task_group:
+            self.task_group = task_group
+            task_group.start_soon(self.housekeep)
+            try:
+                while (msg := await read_pipe(self.conn))[0] != "stop":
+                    self.dispatch(msg)
+            except (OSError, EOFError):
+                self.t.error("Lost the API process, exiting")
+            task_group.cancel_scope.cancel()
+        journals = [g.journal for g in self.games.values() if g.journal]
+        await anyio.to_thread.run_sync(lambda: [j.sync() for j in journals])
+        await anyio.to_thread.run_sync(shutdown_pool)
+        self.writer.close()
+
+    def dispatch(self, msg: tuple) -> None:
+        if msg[0] == "frame":
+            data = self.received.unpack(msg[2])
+            ws = self.connections.get(msg[1])
+            if ws:
+                ws.send_frames.send_nowait(data)
+        elif msg[0] == "close":
+            ws = self.connections.pop(msg[1], None)
+            if ws:
+                ws.closed = True
+                ws.send_frames.close()
+        elif msg[0] == "open":
+            self.task_group.start_soon(self.serve, *msg[1:])
+        elif msg[0] == "call":
+            self.task_group.start_soon(self.reply, msg[1], self.call, *msg[2:])
+        elif msg[0] == "create":
+            self.task_group.start_soon(self.reply, msg[1], self.create_game, *msg[2:])
+        elif msg[0] == "restore":
+            self.task_group.start_soon(self.reply, msg[1], self.restore_game, *msg[2:])
+
+    async def reply(self, id: int, fn, *args: Any) -> None:
+        try:
+            result = await fn(*args)
+        except Exception as e:
+            self.writer.post(("reply", id, repr(e), None))
+            return
+        self.writer.post(("reply", id, None, result))
+
+    async def call(self, game_id: str, method: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        g = self.games[game_id]
+        return await g.actor.call(getattr(g, method), *args, **kwargs)
+
+    async def create_game(self, cls: Type[Game], id: str, name: str, public_config: Dict[str, Any]) -> str | None:
+        '''Same as `GameManager.create_game()`, returns the config's errors.'''
+        g = cls(self.broadcast, self.t)
+        errs = g.load_public_config(public_config)
+        if len(errs):
+            return json.dumps(errs)
+        g.id = id
+        g.gameId = id
+        if self.config.journals_enabled:
+            g.journal = Journal(os.path.join(JOURNAL_PATH, f"{int(time.time())}-{id}"), self.config.journal_fsync_interval)
+            g.record("meta", id=id, name=name, config=public_config, seed=g.seed)
+        self.games[id] = g
+        self.task_group.start_soon(g.actor.run)
+        return None
+
+    async def restore_game(self, cls: Type[Game], path: str) -> Tuple[str, Dict[str, str | int]]:
+        '''Same as `GameManager.restore_from_journal()`, returns the game's id
+        and tickets.'''
+        g, tickets = await restore_from_journal(cls, self.broadcast, self.t, path, self.config.journal_fsync_interval)
+        self.games[g.id] = g
+        self.task_group.start_soon(g.actor.run)
+        await g.actor.call(g.resume)
+        return g.id, tickets
+
+    async def serve(self, conn_id: int, game_id: str, kind: str, username: str | int | None, codec_name: str | None) -> None:
+        ws = PipeWebSocket(self, conn_id)
+        self.connections[conn_id] = ws
+        codec = negotiate_codec([codec_name], None) if codec_name else None
+        g = self.games.get(game_id)
+        try:
+            if g is None: # ended meanwhile
+                return
+            if kind == "host":
+                await g.host(ws, codec)
+            elif kind == "play":
+                await g.play(ws, username, codec)
+            else:
+                await g.watch(ws, codec)
+        finally:
+            self.connections.pop(conn_id, None)
+            await ws.close()
+
+    async def housekeep(self) -> None:
+        '''Syncs journals and closes stopped games, like `GameManager.snapshot_games()`.
+        Closed games are dropped and the API process is told they ended.'''
+        while True:
+            await anyio.sleep(self.config.snapshot_interval)
+            journals = [g.journal for g in self.games.values() if g.journal]
+            await anyio.to_thread.run_sync(lambda: [j.sync() for j in journals])
+            for g in list(self.games.values()):
+                if g.status == GameStatus.STOPPED:
+                    del self.games[g.id]
+                    g.actor.stop()
+                    self.t.log(f"Game {g.id}: {g.actor.stats}")
+                    g.close()
+                    if g.journal:
+                        g.record("end")
+                        g.journal.close()
+                        g.journal = None
+                    self.writer.post(("ended", g.id))
+
+def run_worker(conn, to_worker: str, from_worker: str) -> None:
+    anyio.run(WorkerRuntime(conn, to_worker, from_worker).run)
@@ -0,0 +1,92 @@
+'''Measures what permessage-deflate costs and saves on a recorded game:
+
+    python wsstats.py journals/<journal dir>
+
+Replays the journal (see `replay.py`) with a recording websocket for the
+host and every player, then deflates each connection's frames the way the
+permessage-deflate extension does (one compressor per connection, context
+kept between frames). Prints bytes and CPU time per message type, for
+compressing every frame (what the server does) and for only compressing the
+frames `Game.is_compressible()` deems worth it.
+'''
+import sys
+import time
+import zlib
+import json
+import anyio
+
+from typing import Dict, List, Tuple
+from journal import Journal
+from replay import replay, create_replay_clock
+from game import Game
+from codec import Codec
+
+class RecordingWebSocket:
+    def __init__(self) -> None:
+        self.frames: List[str] = []
+
+    async def send_text(self, data: str) -> None:
+        self.frames.append(data)
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        ...
+
+def deflate_frame(compressor, data: bytes) -> int:
+    '''Returns the size of `data` as a permessage-deflate frame payload.'''
+    out = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return len(out) - 4 # the trailing 0x00 0x00 0xff 0xff isn't sent
+
+async def replay_connected(path: str, codec: Codec | None = None) -> Tuple[Game, Dict[str | int, RecordingWebSocket]]:
+    '''Replays the journal at `path` with a recording websocket connected
+    for the host and every player.'''
+    from main import game_name_map, GameName
+    from terminal import Terminal, TerminalOpts
+    from broadcaster import Broadcast
+
+    records = list(Journal.read(path))
+    name = GameName(records[0]["name"])
+    t = Terminal(TerminalOpts(can_log=False, can_info=False, can_debug=False, can_warn=False))
+    g = game_name_map[name](Broadcast("memory://"), t, clock=create_replay_clock(records), seed=records[0]["seed"])
+    if codec:
+        g.codec = codec
+    # Everyone is connected from the start, so lobby messages are slightly overcounted
+    usernames = [0] + [r["player"]["username"] for r in records if r["k"] == "join"]
+    sockets = {u: RecordingWebSocket() for u in usernames}
+    g.ws_map.update(sockets)
+    await replay(g, records)
+    return g, sockets
+
+async def main() -> None:
+    g, sockets = await replay_connected(sys.argv[1])
+
+    # type -> [frames, raw bytes, deflated bytes, deflate seconds, compressible raw bytes, selective sent bytes, selective seconds]
+    stats: Dict[str, List[float]] = {}
+    for ws in sockets.values():
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        for frame in ws.frames:
+            data = frame.encode("utf-8")
+            type = json.loads(frame)["type"]
+            start = time.perf_counter()
+            size = deflate_frame(compressor, data)
+            elapsed = time.perf_counter() - start
+            s = stats.setdefault(type, [0] * 7)
+            s[0] += 1
+            s[1] += len(data)
+            s[2] += size
+            s[3] += elapsed
+            if g.is_compressible(type, len(data)):
+                s[4] += len(data)
+                s[5] += size
+                s[6] += elapsed
+            else:
+                s[5] += len(data)
+
+    print(f"{'type':<16}{'frames':>8}{'raw KB':>10}{'deflated KB':>13}{'ratio':>7}{'deflate ms':>12}{'select KB':>11}{'select ms':>11}")
+    totals = [0] * 7
+    for type, s in sorted(stats.items(), key=lambda kv: -kv[1][1]):
+        totals = [a + b for a, b in zip(totals, s)]
+        print(f"{type:<16}{s[0]:>8}{s[1] / 1024:>10.1f}{s[2] / 1024:>13.1f}{s[2] / s[1]:>7.2f}{s[3] * 1000:>12.2f}{s[5] / 1024:>11.1f}{s[6] * 1000:>11.2f}")
+    print(f"{'total':<16}{totals[0]:>8}{totals[1] / 1024:>10.1f}{totals[2] / 1024:>13.1f}{totals[2] / max(totals[1], 1):>7.2f}{totals[3] * 1000:>12.2f}{totals[5] / 1024:>11.1f}{totals[6] * 1000:>11.2f}")
+
+if __name__ == "__main__":
+    anyio.run(main)
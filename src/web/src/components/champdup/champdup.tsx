@@ -33,6 +33,7 @@ import {
   SwapImage,
   LeaderboardImage,
   MatchupContext,
+  MatchupResult,
   MessageType,
 } from "@lib/champdup";
 import { useEffect, useRef, useState } from "react";
@@ -394,6 +395,17 @@ const LeaderboardCard = ({
   );
 };
 
+// Downloads the next matchups' images into the browser's cache (see PREFETCH)
+const prefetchImages = (urls: string[]) => {
+  for (const url of urls) {
+    const img = new window.Image();
+    img.setAttribute("fetchpriority", "low");
+    img.src = url;
+  }
+};
+
+const BATCH_CYCLE_INTERVAL = 3000; // ms each matchup of a batch is shown on the host screen
+
 const RUNNING_HOST_TEXTS = [
   "Don't forget to submit",
   "No gay drawings",
@@ -419,8 +431,8 @@ const RunningComponent = () => {
   const { lastJsonMessage } = useMessenger<MessageType>();
   const [matchup, setMatchup] = useState<MatchupContext | null>(null);
   const [matchupEnds, setMatchupEnds] = useState<Date | null>(null);
-  const [leftVotes, setLeftVotes] = useState<string[]>([]);
-  const [rightVotes, setRightVotes] = useState<string[]>([]);
+  const [leftVotes, setLeftVotes] = useState<number>(0);
+  const [rightVotes, setRightVotes] = useState<number>(0);
   const [leaderboard, setLeaderboard] = useState<Player[]>([]);
   const [leaderboardImgs, setLeaderboardImgs] = useState<LeaderboardImage[]>(
     []
@@ -431,6 +443,13 @@ const RunningComponent = () => {
   const [eventEnds, setEventEnds] = useState<Date>(new Date());
   const [swapImages, setSwapImages] = useState<SwapImage[]>([]);
   const [inGrace, setInGrace] = useState(false);
+  // Matchups voted on at once (when they run in parallel), cycled through on the host screen
+  // with their votes, then with their results
+  const [batch, setBatch] = useState<{ matchup: MatchupContext; idx: number }[]>([]);
+  const batchShown = useRef(0);
+  const batchVotes = useRef<{ [idx: number]: { left: number; right: number } }>({});
+  const batchResults = useRef<{ [idx: number]: MatchupResult }>({});
+  const [resultPoints, setResultPoints] = useState<{ left?: number; right?: number }>({});
   const { setBg, setClassName } = useGameStyleContext();
   const autoplay = useRef(Autoplay({ delay: 4000 }));
   const voteSfxSounds = getSounds(
@@ -493,6 +512,19 @@ const RunningComponent = () => {
     );
   }, []);
 
+  const showBatchMatchup = (shown: number) => {
+    batchShown.current = shown;
+    const { matchup, idx } = batch[shown];
+    const votes = batchVotes.current[idx];
+    const result = batchResults.current[idx];
+    setMatchup(matchup);
+    setCurrentMatchup(matchup);
+    setCurrentMatchupIdx(idx);
+    setLeftVotes(votes ? votes.left : 0);
+    setRightVotes(votes ? votes.right : 0);
+    setResultPoints(result ? { left: result.left_points, right: result.right_points } : {});
+  };
+
   useEffect(() => {
     console.info(lastJsonMessage);
     if (lastJsonMessage.type == MessageType.STATE) {
@@ -512,6 +544,10 @@ const RunningComponent = () => {
       }
     }
 
+    if (lastJsonMessage.type === MessageType.PREFETCH) {
+      prefetchImages(lastJsonMessage.value);
+    }
+
     if (lastJsonMessage.type === MessageType.IMAGE_SWAP) {
       setMatchup(lastJsonMessage.value.matchup);
     }
@@ -520,12 +556,31 @@ const RunningComponent = () => {
       setPlayersReady(lastJsonMessage.value);
     }
 
+    if (lastJsonMessage.type == MessageType.MATCHUP) {
+      batchResults.current = {};
+      setResultPoints({});
+      setBatch([]);
+    }
+
+    if (lastJsonMessage.type == MessageType.MATCHUP_RESULT) {
+      if (lastJsonMessage.value.batch && batch.length > 1) {
+        for (const r of lastJsonMessage.value.batch as MatchupResult[]) {
+          batchResults.current[r.idx] = r;
+          batchVotes.current[r.idx] = { left: r.leftVotes.length, right: r.rightVotes.length };
+        }
+        // Start over from the first result, the one the message leads with
+        showBatchMatchup(0);
+      } else {
+        setBatch([]);
+      }
+    }
+
     if (lastJsonMessage.type == MessageType.MATCHUP) {
       setMatchupEnds(new Date(lastJsonMessage.value.ends));
       setMatchup(lastJsonMessage.value.matchup);
       setPMounted(false);
-      setLeftVotes([]);
-      setRightVotes([]);
+      setLeftVotes(0);
+      setRightVotes(0);
       setInGrace(lastJsonMessage.value.matchup.started);
     }
 
@@ -540,11 +595,23 @@ const RunningComponent = () => {
       setCurrentMatchupIdx(lastJsonMessage.value.idx);
       setInGrace(false);
       setFMounted(true);
+      batchShown.current = 0;
+      batchVotes.current = {};
+      batchResults.current = {};
+      setResultPoints({});
+      setBatch(lastJsonMessage.value.batch ?? []);
     }
 
     if (lastJsonMessage.type == MessageType.MATCHUP_VOTE) {
-      setLeftVotes(lastJsonMessage.value.left);
-      setRightVotes(lastJsonMessage.value.right);
+      let votes = lastJsonMessage.value;
+      if (lastJsonMessage.value.batch) {
+        for (const v of lastJsonMessage.value.batch) {
+          batchVotes.current[v.idx] = v;
+        }
+        votes = lastJsonMessage.value.batch[batchShown.current] ?? votes;
+      }
+      setLeftVotes(votes.left);
+      setRightVotes(votes.right);
       const [voteSfxPlay] =
         voteSfxSounds[randomIntFromInterval(0, voteSfxSounds.length - 1)];
       if (isHost) {
@@ -553,6 +620,14 @@ const RunningComponent = () => {
     }
   }, [lastJsonMessage]);
 
+  useEffect(() => {
+    if (!isHost || batch.length < 2) return;
+    const interval = setInterval(() => {
+      showBatchMatchup((batchShown.current + 1) % batch.length);
+    }, BATCH_CYCLE_INTERVAL);
+    return () => clearInterval(interval);
+  }, [batch, isHost]);
+
   useEffect(() => {
     if (currentEventData === null || currentEventData === undefined) return;
     if (currentEventData.leaderboard && currentEventData.leaderboard_images) {
@@ -688,12 +763,14 @@ const RunningComponent = () => {
               left={{
                 image: matchup.left,
                 votes: leftVotes,
-                totalVotes: leftVotes.length + rightVotes.length,
+                totalVotes: leftVotes + rightVotes,
+                resultPoints: resultPoints.left,
               }}
               right={{
                 image: matchup.right,
                 votes: rightVotes,
-                totalVotes: leftVotes.length + rightVotes.length,
+                totalVotes: leftVotes + rightVotes,
+                resultPoints: resultPoints.right,
               }}
             />
           )}
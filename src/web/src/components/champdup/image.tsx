@@ -49,8 +49,9 @@ const DURATION = 1000; //ms
 
 export interface ImageCandidateProps {
   image?: ImageData;
-  votes: string[];
+  votes: number;
   totalVotes: number;
+  resultPoints?: number; // when set, the points shown instead of the MATCHUP_RESULT's
 }
 
 export interface HostImageCandidateProps extends ImageCandidateProps {
@@ -165,6 +166,7 @@ export const HostMatchupController = ({
                 image={leftImg}
                 votes={left.votes}
                 totalVotes={left.totalVotes}
+                resultPoints={left.resultPoints}
               />
             </Box>
           )}
@@ -184,6 +186,7 @@ export const HostMatchupController = ({
                 image={rightImg}
                 votes={right.votes}
                 totalVotes={right.totalVotes}
+                resultPoints={right.resultPoints}
               />
             </Box>
           )}
@@ -266,6 +269,7 @@ export const HostImageCandidate = ({
   votes,
   totalVotes,
   isLeft,
+  resultPoints,
 }: HostImageCandidateProps) => {
   if (!image) return <></>;
   const [fireCache, setFireCache] = useState(false);
@@ -297,7 +301,7 @@ export const HostImageCandidate = ({
   const [fireStop, setFireStop] = useState<null | (() => void)>(null);
 
   const skew = isLeft ? "-10deg" : "10deg";
-  const votesPct = (votes.length / totalVotes) * 100;
+  const votesPct = (votes / totalVotes) * 100;
 
   const titleBg = `linear-gradient(90deg, ${getColorRepresentation(
     votesPct
@@ -345,6 +349,11 @@ export const HostImageCandidate = ({
     }
   }, [lastJsonMessage]);
 
+  // The host screen cycling through a batch's results shows each one's points
+  useEffect(() => {
+    if (resultPoints !== undefined) setPoints(resultPoints);
+  }, [resultPoints]);
+
   return (
     <Stack align="center" w={300} gap="lg">
       <Box p={20} bg="black" style={{ transform: `skewX(${skew})` }}>
@@ -511,9 +520,9 @@ export const PlayerVoteController = ({
                   }
                 >
                   <Card.Section>
-                    <Image src={swap_img.image.dUri} w={100} />
+                    <Image src={swap_img.src ?? undefined} w={100} />
                   </Card.Section>
-                  <Title order={5}>{swap_img.image.title}</Title>
+                  <Title order={5}>{swap_img.title}</Title>
                 </Card>
               ))}
           </Group>
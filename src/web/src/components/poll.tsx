@@ -42,9 +42,9 @@ export const Poll = (props: PollProps) => {
   const { lastJsonMessage, sendJsonMessage } = useMessenger();
   const { isHost } = useUserContext();
   const total =
-    pollData !== null ? pollData.yes.length + pollData.no.length : 0;
-  const yesPct = pollData !== null ? pollData.yes.length / total : 0;
-  const noPct = pollData !== null ? pollData.no.length / total : 0;
+    pollData !== null ? pollData.yes + pollData.no : 0;
+  const yesPct = pollData !== null ? pollData.yes / total : 0;
+  const noPct = pollData !== null ? pollData.no / total : 0;
   const im = isMobile();
   const pollSounds = getSounds([amogus, fnaf2hallway], VOLUME);
   const [sponsorPlay] = useSound(sponsor, { volume: 0.8 });
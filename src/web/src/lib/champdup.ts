@@ -23,6 +23,8 @@ export enum MessageType {
   MATCHUP_START = "MATCHUP_START",
   MATCHUP_VOTE = "MATCHUP_VOTE",
   MATCHUP_RESULT = "MATCHUP_RESULT",
+  VOTE_ACK = "VOTE_ACK",
+  PREFETCH = "PREFETCH",
 
   FORCE_NEXT_MATCHUP = "FORCE_NEXT_MATCHUP",
 }
@@ -56,8 +58,9 @@ export type ImageData = {
 };
 
 export type SwapImage = {
-  image: ImageData;
   image_hash: string;
+  title: string;
+  src: string | null;
 };
 
 export enum AwardNames {
@@ -81,13 +84,22 @@ export type LeaderboardImage = {
 
 export type MatchupContext = {
   left: ImageData;
-  leftVotes: string[];
+  leftVotes: number; // voters are only sent in MATCHUP_RESULT
   right: ImageData;
-  rightVotes: string[];
+  rightVotes: number;
   initial_leader: "left" | "right";
   started: boolean;
 };
 
+// A matchup's MATCHUP_RESULT (only what the host screen reads)
+export type MatchupResult = {
+  idx: number;
+  left_points: number;
+  right_points: number;
+  leftVotes: string[];
+  rightVotes: string[];
+};
+
 export enum NotifyType {
   SUCCESS = "SUCCESS",
   FAIL = "FAIL",
@@ -3,9 +3,9 @@ import { create } from "zustand";
 export type PollData = {
   ends: string;
   prompt: string;
-  // Backend guarantees that yes and no are distinct (no usernames in yes appear in no, and vice versa)
-  yes: string[];
-  no: string[];
+  // Vote counts, voters aren't sent
+  yes: number;
+  no: number;
 }
 
 interface PlayerPrefs {